@@ -0,0 +1,271 @@
+from typing import List, Mapping, Tuple
+import os
+import bisect
+import itertools
+import numpy as np
+from index.structure import Index, FileIndex, TermFilePosition, TermOccurrence, PostingCursor
+from index.postings_codec import (POSTINGS_CODECS, encode_postings, decode_postings,
+                                  num_blocks, read_skip_table, skip_table_size)
+
+
+class CompressedTermPosition(TermFilePosition):
+    def __init__(self, term_id: int, term_file_start_pos: int = None, doc_count_with_term: int = None,
+                 max_term_freq: int = None, term_byte_size: int = None):
+        super().__init__(term_id, term_file_start_pos, doc_count_with_term, max_term_freq)
+        # tamanho, em bytes, das ocorrencias comprimidas do termo
+        self.term_byte_size = term_byte_size
+
+
+class BlockPostingCursor(PostingCursor):
+    """
+    Cursor sobre as ocorrencias comprimidas de um termo. Apenas o bloco atual fica decodificado:
+    next_geq procura na skip table (ultimo doc_id de cada bloco) o bloco em que o doc_id pode estar
+    e salta os blocos anteriores sem decodificá-los
+    """
+    def __init__(self, data: bytes, term_id: int, doc_count_with_term: int, codec):
+        self.data = data
+        self.term_id = term_id
+        self.doc_count_with_term = doc_count_with_term
+        self.codec = codec
+
+        arr_skip = read_skip_table(data, doc_count_with_term)
+        self.lst_last_doc_ids = arr_skip["last_doc_id"].tolist()
+        self.lst_block_max_freqs = arr_skip["max_term_freq"].tolist()
+        self.lst_block_offsets = arr_skip["block_offset"].tolist() or [0]
+        self.int_blocks_start = skip_table_size(doc_count_with_term)
+        self.int_num_blocks = num_blocks(doc_count_with_term)
+        # quantidade de blocos decodificados (para comparação de desempenho)
+        self.num_decoded_blocks = 0
+
+        self.block = -1
+        self.load_block(0)
+
+    def load_block(self, block: int):
+        """
+        Decodifica o bloco `block` e posiciona o cursor em sua primeira ocorrencia
+        """
+        self.block = block
+        self.position = 0
+        if block >= self.int_num_blocks:
+            self.lst_block_doc_ids, self.lst_block_freqs = [], []
+            return
+        arr_gaps, arr_freqs, _ = self.codec.decode_block(self.data, self.int_blocks_start+self.lst_block_offsets[block])
+        int_base = self.lst_last_doc_ids[block-1] if block > 0 else 0
+        self.lst_block_doc_ids = (np.cumsum(arr_gaps, dtype=np.uint64)+np.uint64(int_base)).tolist()
+        self.lst_block_freqs = (arr_freqs+np.uint64(1)).tolist()
+        self.num_decoded_blocks += 1
+
+    @property
+    def current(self) -> TermOccurrence:
+        if self.position >= len(self.lst_block_doc_ids):
+            return None
+        return TermOccurrence(self.lst_block_doc_ids[self.position], self.term_id, self.lst_block_freqs[self.position])
+
+    @property
+    def doc_id(self) -> int:
+        return self.lst_block_doc_ids[self.position] if self.position < len(self.lst_block_doc_ids) else None
+
+    def next(self) -> TermOccurrence:
+        self.position += 1
+        if self.position >= len(self.lst_block_doc_ids) and self.block < self.int_num_blocks:
+            self.load_block(self.block+1)
+        return self.current
+
+    def next_geq(self, doc_id: int) -> TermOccurrence:
+        current_doc_id = self.doc_id
+        if current_doc_id is None or current_doc_id >= doc_id:
+            return self.current
+        if self.block+1 < self.int_num_blocks and doc_id > self.lst_last_doc_ids[self.block]:
+            self.load_block(bisect.bisect_left(self.lst_last_doc_ids, doc_id, self.block+1))
+        self.position = bisect.bisect_left(self.lst_block_doc_ids, doc_id, self.position)
+        if self.position >= len(self.lst_block_doc_ids) and self.block < self.int_num_blocks:
+            self.load_block(self.block+1)
+        return self.current
+
+    def iter_doc_ids(self):
+        while self.position < len(self.lst_block_doc_ids):
+            yield from self.lst_block_doc_ids[self.position:]
+            self.load_block(self.block+1)
+
+    def to_list(self) -> List[TermOccurrence]:
+        lst_occurrences = []
+        while self.position < len(self.lst_block_doc_ids):
+            lst_occurrences += [TermOccurrence(doc_id, self.term_id, term_freq)
+                                    for doc_id, term_freq in zip(self.lst_block_doc_ids[self.position:], self.lst_block_freqs[self.position:])]
+            self.load_block(self.block+1)
+        return lst_occurrences
+
+    def clone(self) -> "BlockPostingCursor":
+        return BlockPostingCursor(self.data, self.term_id, self.doc_count_with_term, self.codec)
+
+    def __len__(self):
+        return self.doc_count_with_term
+
+
+class CompressedFileIndex(FileIndex):
+    """
+    FileIndex cujo arquivo final de ocorrencias é comprimido. As runs e os merges continuam
+    com ocorrencias de tamanho fixo (FileIndex.OCCURRENCE_STRUCT); em finish_indexing, o arquivo
+    intercalado é convertido em um arquivo de postings em que:
+        - o term_id não é gravado, pois está no dicionario (assim como a posição e o tamanho das ocorrencias do termo);
+        - as ocorrencias de cada termo são gravadas em blocos de postings_codec.BLOCK_SIZE,
+          com os doc_ids como gaps e as frequencias codificados por `codec` (ver postings_codec.POSTINGS_CODECS)
+    """
+    def __init__(self, codec: str = "bitpack", merge_fan_in: int = None):
+        super().__init__(merge_fan_in)
+        if codec not in POSTINGS_CODECS:
+            raise ValueError(f"Codec desconhecido: {codec} (opções: {list(POSTINGS_CODECS)})")
+        self.codec = codec
+        self.postings_file_counter = 0
+        self.str_postings_file_name = None
+
+    def create_index_entry(self, term_id: int) -> CompressedTermPosition:
+        return CompressedTermPosition(term_id)
+
+    def new_postings_file_name(self) -> str:
+        # como em new_idx_file_name, o nome inclui o identificador dos arquivos do indice
+        # e nomes já existentes são evitados
+        str_file_name = f"postings_index_{self.str_file_id}_{self.postings_file_counter}"
+        while os.path.exists(str_file_name):
+            self.postings_file_counter += 1
+            str_file_name = f"postings_index_{self.str_file_id}_{self.postings_file_counter}"
+        self.postings_file_counter += 1
+        return str_file_name
+
+    def iter_postings_file(self):
+        """
+        Gera as tuplas (doc_id, term_id, term_freq) do arquivo de postings, ordenadas por (term_id, doc_id)
+        """
+        for obj_term in sorted(self.dic_index.values(), key=lambda obj_term: obj_term.term_id):
+            if obj_term.term_file_start_pos is None:
+                continue
+            arr_doc_ids, arr_freqs = self.read_postings(obj_term)
+            for doc_id, term_freq in zip(arr_doc_ids.tolist(), arr_freqs.tolist()):
+                yield doc_id, obj_term.term_id, term_freq
+
+    def finish_indexing(self):
+        if self.get_tmp_occur_size() > 0:
+            self.save_tmp_occurrences()
+        if len(self.lst_run_files) == 0:
+            return
+        self.generation += 1
+        self.thaw_lexicon()
+        if self.str_postings_file_name is not None:
+            # novas ocorrencias após uma finalização: as já comprimidas voltam a ser uma run
+            self.lst_run_files.insert(0, self.write_run(self.iter_postings_file(), self.get_phase_io_stats("decompression")))
+        self.merge_runs()
+        self.compress_postings()
+        self.freeze_lexicon()
+
+    def compress_postings(self):
+        """
+        Converte o arquivo intercalado (str_idx_file_name) no arquivo de postings comprimido
+        e atualiza a posição, o tamanho e as estatisticas de cada termo no dicionario
+        """
+        dic_ids_por_termo = {}
+        for obj_term in self.dic_index.values():
+            obj_term.term_file_start_pos = None
+            obj_term.term_byte_size = None
+            obj_term.doc_count_with_term = None
+            obj_term.max_term_freq = 0
+            dic_ids_por_termo[obj_term.term_id] = obj_term
+
+        codec = POSTINGS_CODECS[self.codec]
+        dic_phase_stats = self.get_phase_io_stats("compression")
+        str_postings_file_name = self.new_postings_file_name()
+        with open(str_postings_file_name, 'wb') as postings_file:
+            it_occurrences = self.read_run(self.str_idx_file_name, dic_phase_stats)
+            for term_id, it_term_occurrences in itertools.groupby(it_occurrences, key=lambda occur: occur[1]):
+                arr_occurrences = np.array([(doc_id, term_freq) for doc_id, _, term_freq in it_term_occurrences],
+                                           dtype=np.uint64)
+                obj_term = dic_ids_por_termo[term_id]
+                obj_term.term_file_start_pos = postings_file.tell()
+                obj_term.doc_count_with_term = len(arr_occurrences)
+                obj_term.max_term_freq = int(arr_occurrences[:, 1].max())
+                postings_file.write(encode_postings(arr_occurrences[:, 0], arr_occurrences[:, 1], codec))
+                obj_term.term_byte_size = postings_file.tell()-obj_term.term_file_start_pos
+            dic_phase_stats["bytes_written"] += postings_file.tell()
+
+        # a run intercalada e o arquivo de postings anterior não são mais necessários
+        os.remove(self.str_idx_file_name)
+        if self.str_postings_file_name is not None and os.path.exists(self.str_postings_file_name):
+            os.remove(self.str_postings_file_name)
+        self.str_idx_file_name = None
+        self.lst_run_files = []
+        self.str_postings_file_name = str_postings_file_name
+
+    def read_postings(self, obj_term: CompressedTermPosition, postings_file=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lê e decodifica as ocorrencias do termo, retornando os arrays (doc_ids, frequencias)
+        """
+        if postings_file is None:
+            with open(self.str_postings_file_name, 'rb') as postings_file:
+                return self.read_postings(obj_term, postings_file)
+        postings_file.seek(obj_term.term_file_start_pos)
+        return decode_postings(postings_file.read(obj_term.term_byte_size), obj_term.doc_count_with_term, POSTINGS_CODECS[self.codec])
+
+    def get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        obj_term = self.dic_index.get(term)
+        if obj_term is None or obj_term.term_file_start_pos is None:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+        return self.read_postings(obj_term)
+
+    def get_posting_cursor(self, term: str) -> PostingCursor:
+        obj_term = self.dic_index.get(term)
+        if obj_term is None or obj_term.term_file_start_pos is None:
+            return PostingCursor([])
+        with open(self.str_postings_file_name, 'rb') as postings_file:
+            postings_file.seek(obj_term.term_file_start_pos)
+            data = postings_file.read(obj_term.term_byte_size)
+        return BlockPostingCursor(data, obj_term.term_id, obj_term.doc_count_with_term, POSTINGS_CODECS[self.codec])
+
+    def get_occurrence_list(self, term: str) -> List:
+        arr_doc_ids, arr_freqs = self.get_postings(term)
+        if len(arr_doc_ids) == 0:
+            return []
+        term_id = self.dic_index[term].term_id
+        return [TermOccurrence(doc_id, term_id, term_freq)
+                    for doc_id, term_freq in zip(arr_doc_ids.tolist(), arr_freqs.tolist())]
+
+    def get_occurrence_lists(self, terms: List[str]) -> Mapping[str, List]:
+        dic_occurrences = {term: [] for term in terms}
+        lst_terms = [(self.dic_index.get(term), term) for term in dic_occurrences]
+        lst_terms = [(obj_term.term_file_start_pos, term, obj_term) for obj_term, term in lst_terms
+                        if obj_term is not None and obj_term.term_file_start_pos is not None]
+        if len(lst_terms) == 0:
+            return dic_occurrences
+        with open(self.str_postings_file_name, 'rb') as postings_file:
+            for _, term, obj_term in sorted(lst_terms):
+                arr_doc_ids, arr_freqs = self.read_postings(obj_term, postings_file)
+                dic_occurrences[term] = [TermOccurrence(doc_id, obj_term.term_id, term_freq)
+                                            for doc_id, term_freq in zip(arr_doc_ids.tolist(), arr_freqs.tolist())]
+        return dic_occurrences
+
+    def get_occurrence_list_full_scan(self, term: str) -> List:
+        # não há um arquivo de ocorrencias de tamanho fixo a ser percorrido
+        return self.get_occurrence_list(term)
+
+    def remove_files(self):
+        super().remove_files()
+        if self.str_postings_file_name is not None and os.path.exists(self.str_postings_file_name):
+            os.remove(self.str_postings_file_name)
+        self.str_postings_file_name = None
+
+    def write_checkpoint(self, arq_index: str):
+        """
+        O checkpoint possui o seu próprio arquivo de postings (`arq_index`.postings)
+        """
+        str_postings_file_name = self.str_postings_file_name
+        if str_postings_file_name is not None:
+            FileIndex.link_file(str_postings_file_name, f"{arq_index}.postings")
+            self.str_postings_file_name = f"{arq_index}.postings"
+        try:
+            Index.write_checkpoint(self, arq_index)
+        finally:
+            self.str_postings_file_name = str_postings_file_name
+
+    def restore_checkpoint(self):
+        if self.str_postings_file_name is not None:
+            str_work_file = self.new_postings_file_name()
+            FileIndex.link_file(self.str_postings_file_name, str_work_file)
+            self.str_postings_file_name = str_work_file
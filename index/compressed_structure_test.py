@@ -0,0 +1,157 @@
+from index.compressed_structure import *
+from index.postings_codec import *
+from index.index_structure_test import StructureTest
+import os
+import random
+import unittest
+
+
+class CompressedStructureTest(StructureTest):
+    def setUp(self):
+        self.index = CompressedFileIndex()
+        self.create_terms()
+
+    def test_postings_file(self):
+        self.assertIsNone(self.index.str_idx_file_name, "A run intercalada deveria ser removida após a compressão")
+        self.assertEqual(self.index.lst_run_files, [])
+        int_total_bytes = sum(obj_term.term_byte_size for obj_term in self.index.dic_index.values())
+        self.assertEqual(os.path.getsize(self.index.str_postings_file_name), int_total_bytes)
+        self.assertLess(int_total_bytes, 6*FileIndex.OCCURRENCE_SIZE)
+
+    def test_index_after_finish(self):
+        self.index.index("verde", 4, 2)
+        self.index.index("azul", 5, 300)
+        self.index.finish_indexing()
+        self.assertListEqual([(occur.doc_id, occur.term_freq) for occur in self.index.get_occurrence_list("verde")], [(1, 1), (4, 2)])
+        self.assertListEqual([(occur.doc_id, occur.term_freq) for occur in self.index.get_occurrence_list("azul")], [(5, 300)])
+        self.assertEqual(self.index.document_count, 5)
+        self.assertEqual(self.index.max_term_freq("azul"), 300)
+
+    def test_checkpoint(self):
+        self.index.write_checkpoint("teste_checkpoint.idx")
+        for str_file in ["teste_checkpoint.idx", "teste_checkpoint.idx.postings"]:
+            self.addCleanup(os.remove, str_file)
+        self.index.index("verde", 4, 2)
+        self.index.finish_indexing()
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("verde")], [1, 4])
+
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.addCleanup(idx_checkpoint.remove_files)
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("verde")], [1])
+        self.assertNotEqual(self.index.str_postings_file_name, idx_checkpoint.str_postings_file_name)
+        idx_checkpoint.index("verde", 5, 1)
+        idx_checkpoint.finish_indexing()
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("verde")], [1, 5])
+        #o indice original e o checkpoint não são alterados
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("verde")], [1, 4])
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.addCleanup(idx_checkpoint.remove_files)
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("verde")], [1])
+
+
+class CompressedVByteStructureTest(CompressedStructureTest):
+    def setUp(self):
+        self.index = CompressedFileIndex(codec="vbyte")
+        self.create_terms()
+
+
+class BlockPostingCursorTest(unittest.TestCase):
+    CODEC = "bitpack"
+
+    def setUp(self):
+        self.index = CompressedFileIndex(codec=self.CODEC)
+        self.lst_doc_ids = list(range(5, 3000, 3))
+        for doc_id in self.lst_doc_ids:
+            self.index.index("frequente", doc_id, doc_id % 7+1)
+        for doc_id in [10, 1400, 2999]:
+            self.index.index("raro", doc_id, 2)
+        self.index.finish_indexing()
+
+    def tearDown(self):
+        self.index.remove_files()
+
+    def test_skip_table(self):
+        data = self.index.get_posting_cursor("frequente").data
+        arr_skip = read_skip_table(data, len(self.lst_doc_ids))
+        self.assertEqual(len(arr_skip), num_blocks(len(self.lst_doc_ids)))
+        self.assertListEqual(arr_skip["last_doc_id"].tolist(),
+                             [self.lst_doc_ids[min(i+BLOCK_SIZE, len(self.lst_doc_ids))-1] for i in range(0, len(self.lst_doc_ids), BLOCK_SIZE)])
+        self.assertListEqual(arr_skip["max_term_freq"].tolist(),
+                             [max(doc_id % 7+1 for doc_id in self.lst_doc_ids[i:i+BLOCK_SIZE]) for i in range(0, len(self.lst_doc_ids), BLOCK_SIZE)])
+        self.assertEqual(len(read_skip_table(self.index.get_posting_cursor("raro").data, 3)), 0, "Termos com um único bloco não possuem skip table")
+
+    def test_next_geq(self):
+        cursor = self.index.get_posting_cursor("frequente")
+        self.assertEqual(len(cursor), len(self.lst_doc_ids))
+        self.assertEqual(cursor.doc_id, 5)
+        self.assertEqual(cursor.num_decoded_blocks, 1)
+        self.assertEqual(cursor.next_geq(2900).doc_id, 2900)
+        self.assertEqual(cursor.current.term_freq, 2900 % 7+1)
+        self.assertEqual(cursor.num_decoded_blocks, 2, "Os blocos intermediarios deveriam ser saltados")
+        self.assertEqual(cursor.next().doc_id, 2903)
+        self.assertIsNone(cursor.next_geq(3000))
+        self.assertIsNone(cursor.doc_id)
+
+        #confere com a busca linear a partir de diferentes posições
+        rnd = random.Random(5)
+        for _ in range(200):
+            cursor = self.index.get_posting_cursor("frequente")
+            int_start = rnd.randrange(0, 3090)
+            lst_targets = sorted(rnd.sample(range(int_start, 3100), 5))
+            for target in lst_targets:
+                expected = next((doc_id for doc_id in self.lst_doc_ids if doc_id >= target), None)
+                cursor.next_geq(target)
+                self.assertEqual(cursor.doc_id, expected, f"Alvo {target}")
+
+    def test_iteration(self):
+        cursor = self.index.get_posting_cursor("frequente")
+        self.assertListEqual(list(cursor.iter_doc_ids()), self.lst_doc_ids)
+        cursor = self.index.get_posting_cursor("frequente")
+        cursor.next_geq(1000)
+        lst_occurrences = cursor.clone().to_list()
+        self.assertListEqual([occur.doc_id for occur in lst_occurrences], self.lst_doc_ids)
+        self.assertListEqual([occur.doc_id for occur in cursor.to_list()], [doc_id for doc_id in self.lst_doc_ids if doc_id >= 1000])
+
+        lst_doc_ids = []
+        cursor = self.index.get_posting_cursor("raro")
+        while cursor.doc_id is not None:
+            lst_doc_ids.append(cursor.doc_id)
+            cursor.next()
+        self.assertListEqual(lst_doc_ids, [10, 1400, 2999])
+        self.assertIsNone(self.index.get_posting_cursor("crocodilo").doc_id)
+
+
+class VByteBlockPostingCursorTest(BlockPostingCursorTest):
+    CODEC = "vbyte"
+
+
+class PostingsCodecTest(unittest.TestCase):
+    def test_vbyte(self):
+        lst_values = [0, 1, 127, 128, 16383, 16384, 2**21, 2**28-1, 2**32-1, 2**35+7]
+        self.assertEqual(len(vbyte_encode(lst_values)), 1+1+1+2+2+3+4+4+5+6)
+        self.assertListEqual(vbyte_decode(vbyte_encode(lst_values)).tolist(), lst_values)
+        self.assertListEqual(vbyte_decode(vbyte_encode([])).tolist(), [])
+
+    def test_bitpack(self):
+        rnd = random.Random(1)
+        for int_bits in [0, 1, 3, 7, 8, 13, 32]:
+            lst_values = [rnd.randrange(2**int_bits) for _ in range(rnd.randint(1, 200))]
+            data = bitpack_encode(lst_values, int_bits)
+            self.assertEqual(len(data), bitpack_size(len(lst_values), int_bits))
+            self.assertListEqual(bitpack_decode(data, len(lst_values), int_bits).tolist(), lst_values)
+
+    def test_encode_postings(self):
+        rnd = random.Random(2)
+        for codec in POSTINGS_CODECS.values():
+            for int_size in [1, 2, SMALL_LIST_SIZE, SMALL_LIST_SIZE+1, BLOCK_SIZE-1, BLOCK_SIZE, BLOCK_SIZE+1, 1000]:
+                lst_doc_ids = sorted(rnd.sample(range(2**32-1), int_size))
+                lst_freqs = [rnd.choice([1, 1, 2, 5, 1000]) for _ in range(int_size)]
+                arr_doc_ids, arr_freqs = decode_postings(encode_postings(lst_doc_ids, lst_freqs, codec), int_size, codec)
+                self.assertListEqual(arr_doc_ids.tolist(), lst_doc_ids, f"doc_ids diferentes ({codec.__name__}, {int_size})")
+                self.assertListEqual(arr_freqs.tolist(), lst_freqs, f"frequencias diferentes ({codec.__name__}, {int_size})")
+            arr_doc_ids, arr_freqs = decode_postings(b"", 0, codec)
+            self.assertEqual(len(arr_doc_ids), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import mmap
+import struct
+
+
+class DocumentTable:
+    """
+    Tabela de documentos usada na indexação: cada documento recebe, ao ser ingerido, um doc_id
+    interno denso (0, 1, 2, ...), que é o usado no indice. A tabela mapeia o id externo
+    (ex. o nome do arquivo html) ao doc_id interno e guarda o título de cada documento.
+
+    Após a indexação, a tabela é compilada (`compile`) em um arquivo somente leitura aberto por
+    mmap (MmapDocumentTable), em que o id externo e o título de um doc_id são obtidos em O(1).
+    """
+    def __init__(self):
+        self.dic_doc_ids = {}
+        self.lst_external_ids = []
+        self.lst_titles = []
+
+    def add_document(self, external_id: str, title: str = "") -> int:
+        """
+        Retorna o doc_id interno do documento, atribuindo o próximo doc_id caso ele ainda não esteja na tabela
+        """
+        external_id = str(external_id)
+        if external_id not in self.dic_doc_ids:
+            self.dic_doc_ids[external_id] = len(self.lst_external_ids)
+            self.lst_external_ids.append(external_id)
+            self.lst_titles.append(title)
+        return self.dic_doc_ids[external_id]
+
+    def get_doc_id(self, external_id: str) -> int:
+        return self.dic_doc_ids.get(str(external_id))
+
+    def get_external_id(self, doc_id: int) -> str:
+        return self.lst_external_ids[doc_id]
+
+    def get_title(self, doc_id: int) -> str:
+        return self.lst_titles[doc_id]
+
+    def set_title(self, doc_id: int, title: str):
+        self.lst_titles[doc_id] = title
+
+    def load_titles(self, str_file: str, separator: str = ";") -> int:
+        """
+        Lê os títulos de um arquivo com uma linha `id externo;título` por documento (ex. titlePerDoc.dat),
+        linha a linha, e os atribui aos documentos da tabela. Retorna a quantidade de títulos atribuidos
+        """
+        int_count = 0
+        with open(str_file, encoding='utf-8') as titles_file:
+            for line in titles_file:
+                external_id, _, title = line.rstrip("\n").partition(separator)
+                doc_id = self.get_doc_id(external_id.strip())
+                if doc_id is not None:
+                    self.set_title(doc_id, title)
+                    int_count += 1
+        return int_count
+
+    def compile(self, str_file_name: str) -> "MmapDocumentTable":
+        return MmapDocumentTable.compile(self, str_file_name)
+
+    def __contains__(self, external_id: str) -> bool:
+        return str(external_id) in self.dic_doc_ids
+
+    def __len__(self):
+        return len(self.lst_external_ids)
+
+
+class MmapDocumentTable:
+    """
+    Tabela de documentos compilada, somente leitura, aberta por meio de `mmap`.
+
+    Layout do arquivo (inteiros little-endian):
+        cabeçalho (HEADER_STRUCT)
+        offsets: 2*num_docs+1 posições (uint64) em blob; o id externo do doc_id `d` é a string 2*d e o seu título, a 2*d+1
+        blob: strings (utf-8)
+        sorted_doc_ids: num_docs doc_ids (uint32) ordenados pelo id externo, usados na busca binária de get_doc_id
+    """
+    MAGIC = b"RIDOCS01"
+    HEADER_STRUCT = struct.Struct("<8sIQQQ")
+    OFFSET_STRUCT = struct.Struct("<Q")
+    DOC_ID_STRUCT = struct.Struct("<I")
+
+    def __init__(self, str_file_name: str):
+        self.str_file_name = str_file_name
+        self.open()
+
+    def open(self):
+        with open(self.str_file_name, 'rb') as table_file:
+            self.mm_table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.num_docs, self.offsets_pos,
+            self.blob_pos, self.sorted_doc_ids_pos) = MmapDocumentTable.HEADER_STRUCT.unpack_from(self.mm_table, 0)
+        if magic != MmapDocumentTable.MAGIC:
+            self.mm_table.close()
+            raise ValueError(f"O arquivo {self.str_file_name} não é uma tabela de documentos compilada (MmapDocumentTable)")
+
+    def close(self):
+        self.mm_table.close()
+
+    def __getstate__(self):
+        return {"str_file_name": self.str_file_name}
+
+    def __setstate__(self, state):
+        self.str_file_name = state["str_file_name"]
+        self.open()
+
+    @staticmethod
+    def compile(document_table: DocumentTable, str_file_name: str) -> "MmapDocumentTable":
+        """
+        Grava `document_table` no formato compilado e retorna a MmapDocumentTable correspondente
+        """
+        offsets = bytearray()
+        blob = bytearray()
+        for external_id, title in zip(document_table.lst_external_ids, document_table.lst_titles):
+            for str_value in [external_id, title or ""]:
+                offsets += MmapDocumentTable.OFFSET_STRUCT.pack(len(blob))
+                blob += str_value.encode('utf-8')
+        offsets += MmapDocumentTable.OFFSET_STRUCT.pack(len(blob))
+        lst_sorted_doc_ids = sorted(range(len(document_table)),
+                                    key=lambda doc_id: document_table.lst_external_ids[doc_id].encode('utf-8'))
+        sorted_doc_ids = b"".join(MmapDocumentTable.DOC_ID_STRUCT.pack(doc_id) for doc_id in lst_sorted_doc_ids)
+
+        offsets_pos = MmapDocumentTable.HEADER_STRUCT.size
+        blob_pos = offsets_pos+len(offsets)
+        sorted_doc_ids_pos = blob_pos+len(blob)
+        with open(str_file_name, 'wb') as table_file:
+            table_file.write(MmapDocumentTable.HEADER_STRUCT.pack(MmapDocumentTable.MAGIC, len(document_table),
+                                                                  offsets_pos, blob_pos, sorted_doc_ids_pos))
+            for section in [offsets, blob, sorted_doc_ids]:
+                table_file.write(section)
+        return MmapDocumentTable(str_file_name)
+
+    @staticmethod
+    def read(str_file_name: str) -> "MmapDocumentTable":
+        return MmapDocumentTable(str_file_name)
+
+    def get_string_bytes(self, string_position: int) -> bytes:
+        start, end = struct.unpack_from("<QQ", self.mm_table, self.offsets_pos+string_position*MmapDocumentTable.OFFSET_STRUCT.size)
+        return self.mm_table[self.blob_pos+start:self.blob_pos+end]
+
+    def get_external_id(self, doc_id: int) -> str:
+        if not 0 <= doc_id < self.num_docs:
+            raise IndexError(f"doc_id {doc_id} fora da tabela de documentos")
+        return self.get_string_bytes(2*doc_id).decode('utf-8')
+
+    def get_title(self, doc_id: int) -> str:
+        if not 0 <= doc_id < self.num_docs:
+            raise IndexError(f"doc_id {doc_id} fora da tabela de documentos")
+        return self.get_string_bytes(2*doc_id+1).decode('utf-8')
+
+    def get_doc_id(self, external_id: str) -> int:
+        """
+        Busca binária do id externo. Retorna o doc_id interno ou None caso o documento não exista
+        """
+        bytes_external_id = str(external_id).encode('utf-8')
+        low, high = 0, self.num_docs-1
+        while low <= high:
+            middle = (low+high)//2
+            doc_id, = MmapDocumentTable.DOC_ID_STRUCT.unpack_from(self.mm_table, self.sorted_doc_ids_pos+middle*MmapDocumentTable.DOC_ID_STRUCT.size)
+            bytes_middle = self.get_string_bytes(2*doc_id)
+            if bytes_middle == bytes_external_id:
+                return doc_id
+            elif bytes_middle < bytes_external_id:
+                low = middle+1
+            else:
+                high = middle-1
+        return None
+
+    def __contains__(self, external_id: str) -> bool:
+        return self.get_doc_id(external_id) is not None
+
+    def __len__(self):
+        return self.num_docs
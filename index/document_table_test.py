@@ -0,0 +1,57 @@
+from index.document_table import *
+import os
+import pickle
+import unittest
+
+
+class DocumentTableTest(unittest.TestCase):
+    def setUp(self):
+        self.document_table = DocumentTable()
+        for external_id in ["220", "1034", "9", "abacate", "99"]:
+            self.document_table.add_document(external_id)
+
+    def test_add_document(self):
+        self.assertEqual(len(self.document_table), 5)
+        #os doc_ids são densos, na ordem de ingestão, e um documento já existente mantém o seu
+        self.assertEqual(self.document_table.add_document("9"), 2)
+        self.assertEqual(self.document_table.add_document(42), 5)
+        self.assertEqual(self.document_table.get_doc_id("42"), 5)
+        self.assertEqual(self.document_table.get_external_id(1), "1034")
+        self.assertIn("abacate", self.document_table)
+        self.assertNotIn("xuxu", self.document_table)
+
+    def test_load_titles(self):
+        with open("teste_titles.dat", "w", encoding="utf-8") as titles_file:
+            titles_file.write("220;Astronomia\n99;Afonso, Príncipe de Portugal (1475-1491)\n7;Não indexado\n")
+        self.addCleanup(os.remove, "teste_titles.dat")
+        self.assertEqual(self.document_table.load_titles("teste_titles.dat"), 2)
+        self.assertEqual(self.document_table.get_title(0), "Astronomia")
+        self.assertEqual(self.document_table.get_title(4), "Afonso, Príncipe de Portugal (1475-1491)")
+        self.assertEqual(self.document_table.get_title(1), "")
+
+    def test_compile(self):
+        self.document_table.set_title(3, "Abacate (fruta)")
+        mmap_table = self.document_table.compile("teste_docs.dat")
+        self.addCleanup(os.remove, "teste_docs.dat")
+        self.assertEqual(len(mmap_table), 5)
+        for doc_id, external_id in enumerate(self.document_table.lst_external_ids):
+            self.assertEqual(mmap_table.get_external_id(doc_id), external_id)
+            self.assertEqual(mmap_table.get_doc_id(external_id), doc_id)
+            self.assertEqual(mmap_table.get_title(doc_id), self.document_table.get_title(doc_id))
+        self.assertIsNone(mmap_table.get_doc_id("100"))
+        self.assertNotIn("xuxu", mmap_table)
+        with self.assertRaises(IndexError):
+            mmap_table.get_title(5)
+
+        #ao ser serializada, a tabela é reaberta a partir do arquivo
+        mmap_pickle = pickle.loads(pickle.dumps(mmap_table))
+        self.assertEqual(mmap_pickle.get_title(3), "Abacate (fruta)")
+        mmap_pickle.close()
+        mmap_table.close()
+
+        with self.assertRaises(ValueError):
+            MmapDocumentTable(__file__)
+
+
+if __name__ == "__main__":
+    unittest.main()
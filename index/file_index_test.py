@@ -7,11 +7,20 @@ from .performance_test import PerformanceTest
 
 class FileIndexTest(unittest.TestCase):
 
+    def tearDown(self):
+        #arquivos de ocorrencias do indice e os gravados diretamente pelos testes
+        self.index.remove_files()
+        for str_file in ["term_test","teste_file.idx","teste_checkpoint.idx","teste_checkpoint.idx.occur"]:
+            if os.path.exists(str_file):
+                os.remove(str_file)
+
     def check_idx_file(self, obj_index, set_occurrences):
         #verifica a ordem das ocorrencias
         list_size = obj_index.idx_tmp_occur_last_element - obj_index.idx_tmp_occur_first_element + 1
         self.assertEqual(list_size,0,"A lista de ocorrencias deve ser zerada após chamar o método save_tmp_occurrences")
-        last_occur = TermOccurrence(float('-inf'),float('-inf'),10)
+        #intercala as runs geradas até agora no arquivo de indice
+        obj_index.merge_runs()
+        last_occur = TermOccurrence(-1,-1,10)
         set_file_occurrences = set()
         with open(obj_index.str_idx_file_name,"rb") as idx_file:
             occur = obj_index.next_from_file(idx_file)
@@ -111,6 +120,112 @@ class FileIndexTest(unittest.TestCase):
         self.check_idx_file(self.index, set_occurrences)
         print("Inserção de alguns itens - teste 2/2 [ok]")
 
+    def test_merge_runs(self):
+        self.index = FileIndex(merge_fan_in=2)
+        set_occurrences = set()
+        int_num_runs = 5
+        for run in range(int_num_runs):
+            self.index.lst_occurrences_tmp = [TermOccurrence(doc_id,term_id,doc_id+term_id)
+                                                for doc_id in range(run+1,20,int_num_runs)
+                                                for term_id in range(1,4)]
+            self.index.idx_tmp_occur_first_element = 0
+            self.index.idx_tmp_occur_last_element = len(self.index.lst_occurrences_tmp)-1
+            set_occurrences = set_occurrences | set(self.index.lst_occurrences_tmp)
+            self.index.save_tmp_occurrences()
+        self.assertEqual(len(self.index.lst_run_files),int_num_runs,"Cada chamada de save_tmp_occurrences deveria gerar uma run")
+        lst_run_files = list(self.index.lst_run_files)
+
+        self.check_idx_file(self.index, set_occurrences)
+        self.assertListEqual(self.index.lst_run_files,[self.index.str_idx_file_name],"Após o merge deveria restar apenas o arquivo de indice")
+        for str_file in lst_run_files:
+            self.assertFalse(os.path.exists(str_file), f"A run {str_file} deveria ter sido removida após o merge")
+
+        #5 runs com fan-in 2: 3 passadas (5 -> 3 -> 2 -> 1), cada uma lendo e gravando no máximo todo o indice
+        int_total_bytes = len(set_occurrences)*FileIndex.OCCURRENCE_SIZE
+        print(f"Estatísticas de E/S: {self.index.dic_io_stats}")
+        self.assertEqual(self.index.dic_io_stats["run_generation"]["bytes_written"],int_total_bytes)
+        self.assertEqual(self.index.dic_io_stats["run_generation"]["bytes_read"],0)
+        self.assertListEqual(sorted(self.index.dic_io_stats.keys()),["merge_pass_1","merge_pass_2","merge_pass_3","run_generation"])
+        for int_pass in range(1,4):
+            dic_stats = self.index.dic_io_stats[f"merge_pass_{int_pass}"]
+            self.assertEqual(dic_stats["bytes_read"],dic_stats["bytes_written"])
+            self.assertLessEqual(dic_stats["bytes_written"],int_total_bytes)
+        self.assertEqual(self.index.dic_io_stats["merge_pass_3"]["bytes_written"],int_total_bytes)
+
+    def test_checkpoint(self):
+        self.index = FileIndex()
+        self.index.index("casa",1,2)
+        self.index.index("verde",1,1)
+        self.index.index("casa",2,1)
+        self.index.finish_indexing()
+        self.index.write_checkpoint("teste_checkpoint.idx")
+        #o mesmo checkpoint gravado novamente não deixa arquivos temporários
+        self.index.write_checkpoint("teste_checkpoint.idx")
+        self.assertFalse(os.path.exists("teste_checkpoint.idx.occur.tmp"))
+
+        #indexa e finaliza novamente: o arquivo de ocorrencias anterior é removido pelo merge
+        self.index.index("verde",3,4)
+        self.index.finish_indexing()
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("verde")],[1,3])
+
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.addCleanup(idx_checkpoint.remove_files)
+        self.assertEqual(idx_checkpoint.document_count,2)
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("casa")],[1,2])
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("verde")],[1])
+
+        #o indice restaurado pode continuar a indexação sem alterar o checkpoint
+        idx_checkpoint.index("verde",4,1)
+        idx_checkpoint.finish_indexing()
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("verde")],[1,4])
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.addCleanup(idx_checkpoint.remove_files)
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("verde")],[1])
+        #o indice original continua válido: o restaurado não usa (nem remove) os arquivos dele
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("verde")],[1,3])
+
+    def test_restored_file_names(self):
+        #o indice original e o restaurado continuam a indexação ao mesmo tempo
+        self.index = FileIndex()
+        self.index.index("casa",1,2)
+        self.index.finish_indexing()
+        self.index.write_checkpoint("teste_checkpoint.idx")
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.addCleanup(idx_checkpoint.remove_files)
+        idx_checkpoint.index("casa",2,1)
+        idx_checkpoint.finish_indexing()
+        self.index.index("casa",3,1)
+        self.index.finish_indexing()
+        self.assertNotEqual(self.index.str_idx_file_name, idx_checkpoint.str_idx_file_name)
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("casa")],[1,3])
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("casa")],[1,2])
+        #um arquivo existente (que não foi criado pelo indice) não é sobrescrito
+        str_next_file = f"{self.index.str_file_prefix}_{self.index.str_file_id}_{self.index.idx_file_counter}"
+        with open(str_next_file, 'wb') as file:
+            file.write(b"outro")
+        try:
+            self.assertNotEqual(self.index.new_idx_file_name(), str_next_file)
+            with open(str_next_file, 'rb') as file:
+                self.assertEqual(file.read(), b"outro")
+        finally:
+            os.remove(str_next_file)
+
+    def test_remove_files(self):
+        self.index = FileIndex()
+        self.index.index("casa",1,2)
+        self.index.finish_indexing()
+        self.index.write_checkpoint("teste_checkpoint.idx")
+        self.index.index("verde",2,1)
+        self.index.save_tmp_occurrences()
+        lst_files = self.index.lst_run_files+[self.index.str_idx_file_name]
+        self.assertTrue(all(os.path.exists(str_file) for str_file in lst_files))
+        #remove o arquivo de ocorrencias e as runs pendentes, mas não o checkpoint
+        self.index.remove_files()
+        self.assertFalse(any(os.path.exists(str_file) for str_file in lst_files))
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.assertListEqual([occur.doc_id for occur in idx_checkpoint.get_occurrence_list("casa")],[1])
+        idx_checkpoint.remove_files()
+
     def test_finish_indexing(self):
         self.index = FileIndex()
         self.index.idx_tmp_occur_last_element  = 8
@@ -155,16 +270,22 @@ class FileIndexTest(unittest.TestCase):
         [self.assertEqual(self.index.dic_index[arr_termos[i]].term_id,i+1,f"O id do termo {i+1} mudou para {self.index.dic_index[arr_termos[i]].term_id}") for i in range(4)]
 
 
-        # TODO: Acho que este teste nao faz sentido, tem algo errado nele
-        #testa se a quantidade de documentos que possuem um determinado termo está correto
-        #arr_pos_por_termo = [0,int_size_of_occur*3,int_size_of_occur*6,int_size_of_occur*7]
-        #arr_pos = [1,4,7,8]
-        #[self.assertEqual(self.index.dic_index[arr_termos[i]].term_file_start_pos,arr_pos_por_termo[i],f"A posição inicial do termo de id {i+1} no arquivo seria {arr_pos_por_termo[i]} (ou seja, antes da {arr_pos[i]}ª ocorrencia) e não {self.index.dic_index[arr_termos[i]].term_file_start_pos}") for i in range(4)]
+        #testa a posição inicial de cada termo no arquivo (ordenado por term_id, doc_id)
+        arr_pos_por_termo = [0,int_size_of_occur*3,int_size_of_occur*6,int_size_of_occur*7]
+        arr_pos = [1,4,7,8]
+        [self.assertEqual(self.index.dic_index[arr_termos[i]].term_file_start_pos,arr_pos_por_termo[i],f"A posição inicial do termo de id {i+1} no arquivo seria {arr_pos_por_termo[i]} (ou seja, antes da {arr_pos[i]}ª ocorrencia) e não {self.index.dic_index[arr_termos[i]].term_file_start_pos}") for i in range(4)]
 
         #testa se a quantidade de documentos que possuem um determinado termo está correto
         arr_doc_por_termo = [3,3,1,2]
         [self.assertEqual(self.index.dic_index[arr_termos[i]].doc_count_with_term,arr_doc_por_termo[i],f"A quantidade de documentos que possuem o termo de id {self.index.dic_index[arr_termos[i]].term_id} seria {arr_doc_por_termo[i]} e não {self.index.dic_index[arr_termos[i]].doc_count_with_term}") for i in range(4)]
 
+        #testa a leitura por posição (seek) de cada termo
+        arr_doc_ids_por_termo = [[1,2,3],[1,2,3],[1],[1,2]]
+        for i,term in enumerate(arr_termos):
+            lst_occur = self.index.get_occurrence_list(term)
+            self.assertListEqual([occur.doc_id for occur in lst_occur], arr_doc_ids_por_termo[i], f"Ocorrencias inesperadas do termo {term}: {lst_occur}")
+            self.assertListEqual(lst_occur, self.index.get_occurrence_list_full_scan(term), f"A leitura por posição do termo {term} difere da leitura completa do arquivo")
+
 
 
 
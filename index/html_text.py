@@ -0,0 +1,101 @@
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# o conteúdo destas tags não faz parte do texto do documento
+SKIPPED_TAGS = {"script", "style"}
+# tags em que os espaços em branco são preservados
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+
+
+def normalize_whitespace(data: str) -> str:
+    # assim como o BeautifulSoup, trechos formados apenas por espaços em branco
+    # são reduzidos a uma quebra de linha (caso possuam uma) ou a um espaço
+    if data.isspace():
+        return "\n" if "\n" in data else " "
+    return data
+
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Extrai o texto de um html por meio dos eventos do HTMLParser da biblioteca padrão,
+    sem construir a árvore do documento
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lst_text = []
+        self.int_skipped_depth = 0
+        self.int_preserve_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.int_skipped_depth += 1
+        elif tag in PRESERVE_WHITESPACE_TAGS:
+            self.int_preserve_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self.int_skipped_depth > 0:
+            self.int_skipped_depth -= 1
+        elif tag in PRESERVE_WHITESPACE_TAGS and self.int_preserve_depth > 0:
+            self.int_preserve_depth -= 1
+
+    def handle_data(self, data):
+        if self.int_skipped_depth == 0:
+            self.lst_text.append(data if self.int_preserve_depth > 0 else normalize_whitespace(data))
+
+    def extract(self, html_doc: str) -> str:
+        self.feed(html_doc)
+        self.close()
+        return "".join(self.lst_text)
+
+
+class LxmlTextTarget:
+    """
+    Alvo (target) do parser html do lxml: recebe os eventos do parser (também sem construir a árvore)
+    """
+    def __init__(self):
+        self.lst_text = []
+        self.int_skipped_depth = 0
+        self.int_preserve_depth = 0
+
+    def start(self, tag, attrib):
+        if tag in SKIPPED_TAGS:
+            self.int_skipped_depth += 1
+        elif tag in PRESERVE_WHITESPACE_TAGS:
+            self.int_preserve_depth += 1
+
+    def end(self, tag):
+        if tag in SKIPPED_TAGS and self.int_skipped_depth > 0:
+            self.int_skipped_depth -= 1
+        elif tag in PRESERVE_WHITESPACE_TAGS and self.int_preserve_depth > 0:
+            self.int_preserve_depth -= 1
+
+    def data(self, data):
+        if self.int_skipped_depth == 0:
+            self.lst_text.append(data if self.int_preserve_depth > 0 else normalize_whitespace(data))
+
+    def close(self):
+        return "".join(self.lst_text)
+
+
+def stream_html_to_text(html_doc: str) -> str:
+    return HTMLTextExtractor().extract(html_doc)
+
+def lxml_html_to_text(html_doc: str) -> str:
+    if not html_doc:
+        return ""
+    parser = etree.HTMLParser(target=LxmlTextTarget())
+    return etree.fromstring(html_doc, parser)
+
+def bs4_html_to_text(html_doc: str) -> str:
+    soup = BeautifulSoup(html_doc, 'html.parser')
+    return soup.get_text()
+
+HTML_TO_TEXT_BACKENDS = {"stream": stream_html_to_text,
+                         "bs4": bs4_html_to_text}
+if etree is not None:
+    HTML_TO_TEXT_BACKENDS["lxml"] = lxml_html_to_text
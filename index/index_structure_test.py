@@ -1,4 +1,5 @@
 from index.structure import *
+import os
 
 import unittest
 
@@ -26,6 +27,12 @@ class StructureTest(unittest.TestCase):
         self.index = HashIndex()
         self.create_terms()
 
+    def tearDown(self):
+        #arquivos de trabalho do indice (ex. ocorrencias de um FileIndex) e o indice gravado em test_read_write
+        self.index.remove_files()
+        if os.path.exists("teste_idx.idx"):
+            os.remove("teste_idx.idx")
+
     def test_read_write(self):
         self.index.write("teste_idx.idx")
         
@@ -41,6 +48,9 @@ class StructureTest(unittest.TestCase):
     def test_document_count(self):
         self.assertEqual(3,self.index.document_count)
 
+    def test_all_doc_ids(self):
+        self.assertListEqual([1,2,3],[int(doc_id) for doc_id in self.index.all_doc_ids()])
+
     def test_vocabulary(self):
         set_expected_vocab = {"casa","vermelho","verde"}
         set_vocab = self.index.vocabulary
@@ -73,6 +83,41 @@ class StructureTest(unittest.TestCase):
     def test_get_occurrence_list(self):
         self.occur_list_test(self.index)
 
+    def test_max_term_freq(self):
+        self.assertEqual(10,self.index.max_term_freq("casa"))
+        self.assertEqual(3,self.index.max_term_freq("vermelho"))
+        self.assertEqual(1,self.index.max_term_freq("verde"))
+        self.assertEqual(0,self.index.max_term_freq("cinza"), f"Cinza não está indexado, deveria retornar zero")
+
+    def test_get_occurrence_lists(self):
+        dic_occurrences = self.index.get_occurrence_lists(["verde", "casa", "cinza", "vermelho"])
+        self.assertListEqual(list(dic_occurrences.keys()), ["verde", "casa", "cinza", "vermelho"])
+        for term, lst_occurrences in dic_occurrences.items():
+            self.assertListEqual(sorted(lst_occurrences), sorted(self.index.get_occurrence_list(term)), f"Ocorrencias do termo {term}")
+
+class PostingCursorTest(unittest.TestCase):
+    def test_next_geq(self):
+        lst_doc_ids = [2,3,5,8,13,21,34,55,89]
+        cursor = PostingCursor([TermOccurrence(doc_id,1,1) for doc_id in lst_doc_ids])
+        self.assertEqual(len(cursor),9)
+        self.assertEqual(cursor.doc_id,2)
+        self.assertEqual(cursor.next_geq(1).doc_id,2, "O cursor não deve retroceder nem avançar caso já esteja em um doc_id maior")
+        self.assertEqual(cursor.next().doc_id,3)
+        self.assertEqual(cursor.next_geq(13).doc_id,13)
+        self.assertEqual(cursor.next_geq(14).doc_id,21)
+        self.assertEqual(cursor.next_geq(56).doc_id,89)
+        self.assertIsNone(cursor.next_geq(90))
+        self.assertIsNone(cursor.doc_id)
+        self.assertIsNone(cursor.next_geq(100))
+
+        #confere com a busca linear para todos os pontos de partida e alvos
+        for start in range(len(lst_doc_ids)):
+            for target in range(0,92):
+                cursor = PostingCursor([TermOccurrence(doc_id,1,1) for doc_id in lst_doc_ids])
+                cursor.position = start
+                expected = next((doc_id for doc_id in lst_doc_ids[start:] if doc_id >= target), None)
+                self.assertEqual(cursor.next_geq(target) and cursor.doc_id, expected, f"Posição {start} alvo {target}")
+
 class FileStructureTest(StructureTest):
     def setUp(self):
         self.index = FileIndex()
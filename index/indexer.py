@@ -1,18 +1,38 @@
+from typing import List, Mapping
 from nltk.stem.snowball import SnowballStemmer
-from bs4 import BeautifulSoup
 import string
+from collections import Counter
 from tqdm import tqdm
 from nltk.tokenize import word_tokenize
 import os
-from multiprocessing import Process
+import pickle
+import shutil
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from util.cache import LRUCache
+from index.html_text import HTML_TO_TEXT_BACKENDS
+from index.document_table import DocumentTable
+from index.sharded_structure import ShardedIndex
 
 
 class Cleaner:
+    CACHE_SIZE = 200000
+
     def __init__(self, stop_words_file: str, language: str,
                  perform_stop_words_removal: bool, perform_accents_removal: bool,
-                 perform_stemming: bool):
+                 perform_stemming: bool, cache_size: int = None, cache_file: str = None,
+                 html_backend: str = "stream"):
         self.set_stop_words = self.read_stop_words(stop_words_file)
 
+        # extração do texto do html: "stream" (HTMLParser da biblioteca padrão),
+        # "lxml" (caso instalado) ou "bs4" (BeautifulSoup)
+        if html_backend not in HTML_TO_TEXT_BACKENDS:
+            raise ValueError(f"Backend de html desconhecido ou não instalado: {html_backend}. Disponíveis: {list(HTML_TO_TEXT_BACKENDS.keys())}")
+        self.html_to_text = HTML_TO_TEXT_BACKENDS[html_backend]
+
+        self.language = language
         self.stemmer = SnowballStemmer(language)
         in_table = "áéíóúâêôçãẽõü"
         out_table = "aeiouaeocaeou"
@@ -25,9 +45,54 @@ class Cleaner:
         self.perform_accents_removal = perform_accents_removal
         self.perform_stemming = perform_stemming
 
+        # caches (LRU) dos resultados por palavra: como o vocabulario segue a lei de Zipf,
+        # poucas palavras correspondem à maioria das ocorrencias. A remoção de acentos não possui cache,
+        # pois é feita no texto inteiro (preprocess_text) com uma única tradução
+        cache_size = cache_size if cache_size is not None else Cleaner.CACHE_SIZE
+        self.dic_caches = {"preprocess_word": LRUCache(cache_size),
+                           "word_stem": LRUCache(cache_size)}
+        self.cache_file = cache_file
+        if cache_file is not None and os.path.exists(cache_file):
+            self.load_cache(cache_file)
+
+    def cache_signature(self):
+        # os valores em cache só são válidos para a mesma configuração do Cleaner
+        return (self.language, self.perform_stop_words_removal, self.perform_accents_removal,
+                self.perform_stemming, frozenset(self.set_stop_words))
+
+    def cache_stats(self):
+        return {str_name: cache.stats() for str_name, cache in self.dic_caches.items()}
+
+    def save_cache(self, cache_file: str = None):
+        """
+        Grava o conteúdo dos caches para que, ao reiniciar, as palavras mais comuns não precisem ser preprocessadas novamente
+        """
+        cache_file = cache_file if cache_file is not None else self.cache_file
+        with open(cache_file, 'wb') as f:
+            pickle.dump({"signature": self.cache_signature(),
+                         "caches": {str_name: list(cache.dic_cache.items()) for str_name, cache in self.dic_caches.items()}}, f)
+
+    def load_cache(self, cache_file: str = None) -> bool:
+        """
+        Carrega os caches gravados por save_cache, unindo-os aos caches atuais (ex. os caches dos processos
+        de HTMLIndexer.ingestion_pool). Retorna False (e ignora o arquivo) caso ele tenha sido gerado
+        por um Cleaner com outra configuração
+        """
+        cache_file = cache_file if cache_file is not None else self.cache_file
+        with open(cache_file, 'rb') as f:
+            dic_saved = pickle.load(f)
+        if dic_saved["signature"] != self.cache_signature():
+            return False
+        for str_name, lst_items in dic_saved["caches"].items():
+            # caches de versões anteriores (ex. remove_accents) são ignorados
+            if str_name not in self.dic_caches:
+                continue
+            for key, value in lst_items:
+                self.dic_caches[str_name].put(key, value)
+        return True
+
     def html_to_plain_text(self, html_doc: str) -> str:
-        soup = BeautifulSoup(html_doc, 'html.parser')
-        return soup.get_text()
+        return self.html_to_text(html_doc)
 
     @staticmethod
     def read_stop_words(str_file) -> set:
@@ -42,21 +107,28 @@ class Cleaner:
         return term in self.set_stop_words 
 
     def word_stem(self, term: str):
-        return self.stemmer.stem(term)
+        return self.dic_caches["word_stem"].get_or_compute(term, self.stemmer.stem)
 
     def remove_accents(self, term: str) -> str:
         return term.translate(self.accents_translation_table)
 
     def preprocess_word(self, term: str) -> str or None:
+        return self.dic_caches["preprocess_word"].get_or_compute(term, self.preprocess_word_uncached)
+
+    def preprocess_word_uncached(self, term: str) -> str or None:
         if term in self.set_punctuation:
             return None
         if self.perform_stop_words_removal and self.is_stop_word(term):
             return None
-        return self.word_stem(term)
+        if self.perform_stemming:
+            return self.word_stem(term)
+        return term
     
     def preprocess_text(self, text: str) -> str or None:
         text = text.lower()
-        return text.translate(self.accents_translation_table)
+        if self.perform_accents_removal:
+            return text.translate(self.accents_translation_table)
+        return text
 
 class HTMLIndexer:
     cleaner = Cleaner(stop_words_file="stopwords.txt",
@@ -67,30 +139,225 @@ class HTMLIndexer:
 
     def __init__(self, index):
         self.index = index
+        # as posições dos termos só são obtidas caso o indice possua a camada de posições (Index.positions)
+        self.bol_positions = index is not None and index.positions is not None
 
-    def text_word_count(self, plain_text: str):
-        dic_word_count = {}
+    def text_word_count(self, plain_text: str, dic_positions: Mapping[str, List[int]] = None):
+        """
+        Retorna a frequencia de cada termo. Caso `dic_positions` seja informado, ele recebe as posições de cada termo:
+        a posição é a ordem do token no texto, contando os tokens descartados (ex. stop words), exceto a pontuação
+        """
         cleanText = self.cleaner.preprocess_text(plain_text)
-        tokens = word_tokenize(cleanText)
-        for token in tokens:
+        if dic_positions is not None:
+            return self.text_word_positions(cleanText, dic_positions)
+        dic_word_count = {}
+        # os tokens são contados em uma única passada e cada forma distinta é preprocessada
+        # (stemming) uma única vez. Formas que resultam no mesmo termo têm suas frequencias somadas
+        for token, int_count in Counter(word_tokenize(cleanText)).items():
             checkedToken = self.cleaner.preprocess_word(token)
             if checkedToken:
-                dic_word_count[checkedToken] = tokens.count(token)
+                dic_word_count[checkedToken] = dic_word_count.get(checkedToken, 0) + int_count
         return dic_word_count
 
-    def index_text(self, doc_id: int, text_html: str):
+    def text_word_positions(self, cleanText: str, dic_positions: Mapping[str, List[int]]):
+        position = 0
+        for token in word_tokenize(cleanText):
+            if token in self.cleaner.set_punctuation:
+                continue
+            checkedToken = self.cleaner.preprocess_word(token)
+            if checkedToken:
+                dic_positions.setdefault(checkedToken, []).append(position)
+            position += 1
+        return {term: len(lst_positions) for term, lst_positions in dic_positions.items()}
+
+    def html_word_count(self, text_html: str, dic_positions: Mapping[str, List[int]] = None):
         cleanText = self.cleaner.html_to_plain_text(text_html)
-        dict_count = self.text_word_count(cleanText)
+        return self.text_word_count(cleanText, dic_positions)
+
+    def index_word_count(self, doc_id: int, dict_count, dic_positions: Mapping[str, List[int]] = None):
         for term in dict_count:
             self.index.index(term,doc_id,dict_count[term])
+        if dic_positions is not None and self.index.positions is not None:
+            self.index.positions.add_document(doc_id, dic_positions)
+
+    def index_text(self, doc_id: int, text_html: str):
+        """
+        Indexa o documento sem finalizar o indice: use `batch` (ou `commit`) após indexar
+        os documentos para finalizá-lo
+        """
+        dic_positions = {} if self.bol_positions else None
+        self.index_word_count(doc_id, self.html_word_count(text_html, dic_positions), dic_positions)
+
+    def commit(self):
         self.index.finish_indexing()
+        if self.index.positions is not None:
+            self.index.positions.finish_indexing()
 
+    def checkpoint(self, checkpoint_file: str):
+        """
+        Finaliza o indice e grava um checkpoint dele, que pode ser restaurado por meio de Index.read_checkpoint
+        """
+        self.commit()
+        self.index.write_checkpoint(checkpoint_file)
 
-    def index_text_dir(self, path: str):
-        for str_sub_dir in tqdm(os.listdir(path)):
+    @contextmanager
+    def batch(self):
+        """
+        Lote de indexação: o indice é finalizado uma única vez, ao final do bloco `with`
+        """
+        yield self
+        self.commit()
+
+    @staticmethod
+    def list_html_files(path: str):
+        lst_files = []
+        for str_sub_dir in os.listdir(path):
             path_sub_dir = f"{path}/{str_sub_dir}"
             for file in os.listdir(path_sub_dir):
-                with open(f"{path_sub_dir}/{file}",'r',encoding='utf-8') as f:
-                    pureHtml = f.read()
-                    doc_id = file.replace(".html","")
-                    self.index_text(doc_id,pureHtml)
\ No newline at end of file
+                lst_files.append(f"{path_sub_dir}/{file}")
+        return lst_files
+
+    @contextmanager
+    def ingestion_pool(self, num_workers: int, bol_positions: bool = False):
+        """
+        Pool de processos de leitura e contagem de termos, cada um com uma cópia do cleaner. Caso o cleaner
+        persista os seus caches (cache_file), cada processo grava o seu cache ao sair do pool e eles são unidos
+        ao cache deste processo (que é o gravado por save_cache)
+        """
+        str_cache_dir = tempfile.mkdtemp(prefix="cleaner_cache_") if self.cleaner.cache_file is not None else None
+        try:
+            with Pool(processes=num_workers, initializer=init_ingestion_worker,
+                      initargs=(self.cleaner, bol_positions, str_cache_dir)) as pool:
+                yield pool
+                # o pool é fechado (e não terminado) para que os processos executem as suas finalizações
+                pool.close()
+                pool.join()
+            if str_cache_dir is not None:
+                for str_file in sorted(os.listdir(str_cache_dir)):
+                    self.cleaner.load_cache(os.path.join(str_cache_dir, str_file))
+        finally:
+            if str_cache_dir is not None:
+                shutil.rmtree(str_cache_dir, ignore_errors=True)
+
+    def iter_word_counts(self, lst_files, num_workers: int, chunk_size: int):
+        if num_workers <= 1:
+            for str_file in lst_files:
+                yield count_file_words(str_file, self)
+            return
+
+        with self.ingestion_pool(num_workers, self.bol_positions) as pool:
+            yield from pool.imap(count_file_words, lst_files, chunksize=chunk_size)
+
+    def index_text_dir(self, path: str, num_workers: int = 1, chunk_size: int = 64,
+                       checkpoint_file: str = None, checkpoint_interval: int = 10000):
+        """
+        Indexa todos os arquivos html dos subdiretórios de `path` em um único lote. Com `num_workers` > 1,
+        a leitura, limpeza e contagem de termos de cada documento é feita por um pool de processos
+        que envia, em lotes de `chunk_size` documentos, os pares (doc_id, {termo: frequencia})
+        para este processo, o unico que escreve no indice.
+
+        Cada documento recebe, nesta ordem, um doc_id interno denso da tabela de documentos do indice
+        (index.document_table), que mapeia o id externo (nome do arquivo) ao doc_id.
+
+        Caso `checkpoint_file` seja informado, a cada `checkpoint_interval` documentos (e ao final)
+        é gravado um checkpoint. Documentos que já estão no indice (ex. restaurado de um checkpoint
+        por Index.read_checkpoint) não são indexados novamente.
+
+        Caso o indice seja um ShardedIndex e `num_workers` > 1, os shards são construidos concorrentemente
+        (ver index_shards) e o checkpoint é gravado apenas ao final.
+        """
+        if self.index.document_table is None:
+            self.index.document_table = DocumentTable()
+        document_table = self.index.document_table
+        lst_files = [str_file for str_file in HTMLIndexer.list_html_files(path)
+                        if file_doc_id(str_file) not in document_table]
+        if isinstance(self.index, ShardedIndex) and num_workers > 1:
+            self.index_shards(lst_files, num_workers)
+            if checkpoint_file is not None:
+                self.index.write_checkpoint(checkpoint_file)
+            return
+        with self.batch():
+            it_word_counts = self.iter_word_counts(lst_files, num_workers, chunk_size)
+            for int_count, (external_id, dict_count, dic_positions) in enumerate(tqdm(it_word_counts, total=len(lst_files)), 1):
+                self.index_word_count(document_table.add_document(external_id), dict_count, dic_positions)
+                if checkpoint_file is not None and int_count % checkpoint_interval == 0:
+                    self.checkpoint(checkpoint_file)
+        if checkpoint_file is not None:
+            self.index.write_checkpoint(checkpoint_file)
+
+    def index_shards(self, lst_files: List[str], num_workers: int):
+        """
+        Construção concorrente de um ShardedIndex: os doc_ids são atribuidos por este processo (na ordem de `lst_files`)
+        e cada documento vai para o shard ShardedIndex.shard_of(doc_id). Cada shard é construido por completo (leitura,
+        contagem dos termos, indexação e finish_indexing, nos seus próprios arquivos) por um processo do pool,
+        que retorna o shard finalizado
+        """
+        document_table = self.index.document_table
+        lst_shard_docs = [[] for _ in range(self.index.num_shards)]
+        for str_file in lst_files:
+            doc_id = document_table.add_document(file_doc_id(str_file))
+            lst_shard_docs[self.index.shard_of(doc_id)].append((doc_id, str_file))
+        with self.ingestion_pool(min(num_workers, self.index.num_shards)) as pool:
+            lst_built = pool.starmap(build_shard, zip(self.index.lst_shards, lst_shard_docs))
+        for shard_number, (shard_index, total_document_length) in enumerate(lst_built):
+            self.index.set_shard(shard_number, shard_index, total_document_length)
+        self.commit()
+
+    def update_files(self, lst_files: List[str]):
+        """
+        Indexa os arquivos novos e reindexa os alterados (ex. atualização diária das páginas): um documento
+        que já está na tabela de documentos é removido do indice (ver Index.delete_document) e indexado
+        novamente com o mesmo doc_id. Requer um indice incremental, como o SegmentedIndex
+        """
+        if self.index.document_table is None:
+            self.index.document_table = DocumentTable()
+        document_table = self.index.document_table
+        with self.batch():
+            for external_id, dict_count, dic_positions in self.iter_word_counts(lst_files, 1, 1):
+                doc_id = document_table.get_doc_id(external_id)
+                if doc_id is not None:
+                    self.index.delete_document(doc_id)
+                self.index_word_count(document_table.add_document(external_id), dict_count, dic_positions)
+
+
+# indexador (sem indice) usado por cada processo do pool de index_text_dir
+ingestion_worker_indexer = None
+
+def init_ingestion_worker(cleaner: Cleaner, bol_positions: bool = False, str_cache_dir: str = None):
+    global ingestion_worker_indexer
+    ingestion_worker_indexer = HTMLIndexer(None)
+    ingestion_worker_indexer.cleaner = cleaner
+    ingestion_worker_indexer.bol_positions = bol_positions
+    if str_cache_dir is not None:
+        # executado quando o processo sai do pool (ver HTMLIndexer.ingestion_pool)
+        Finalize(None, cleaner.save_cache, args=(os.path.join(str_cache_dir, f"{os.getpid()}.pkl"),), exitpriority=10)
+
+def count_file_words(str_file: str, html_indexer: HTMLIndexer = None):
+    """
+    Lê o arquivo html e retorna (id externo, {termo: frequencia}, {termo: posições}) do documento.
+    As posições são None caso o indexador não as obtenha (HTMLIndexer.bol_positions)
+    """
+    if html_indexer is None:
+        html_indexer = ingestion_worker_indexer
+    with open(str_file,'r',encoding='utf-8') as f:
+        pureHtml = f.read()
+    dic_positions = {} if html_indexer.bol_positions else None
+    return file_doc_id(str_file), html_indexer.html_word_count(pureHtml, dic_positions), dic_positions
+
+def build_shard(shard_index, lst_doc_files):
+    """
+    Indexa os documentos (doc_id, arquivo) de um shard e o finaliza. Retorna o shard e a soma dos tamanhos dos documentos
+    """
+    html_indexer = HTMLIndexer(shard_index)
+    html_indexer.cleaner = ingestion_worker_indexer.cleaner
+    int_total_length = 0
+    with html_indexer.batch():
+        for doc_id, str_file in lst_doc_files:
+            _, dict_count, dic_positions = count_file_words(str_file, html_indexer)
+            html_indexer.index_word_count(doc_id, dict_count, dic_positions)
+            int_total_length += sum(dict_count.values())
+    return shard_index, int_total_length
+
+def file_doc_id(str_file: str) -> str:
+    # id externo do documento: o nome do arquivo sem a extensão
+    return os.path.basename(str_file).replace(".html","")
@@ -1,10 +1,13 @@
 from index.indexer import *
 from index.structure import *
+from index.html_text import HTML_TO_TEXT_BACKENDS
+from util.performance import CheckPerformance
 import unittest
 
 class IndexerTest(unittest.TestCase):
     def test_indexer(self):
         obj_index = FileIndex()
+        self.addCleanup(obj_index.remove_files)
         html_indexer = HTMLIndexer(obj_index)
         html_indexer.index_text_dir("index/docs_test")
         set_vocab = set(obj_index.vocabulary)
@@ -15,13 +18,239 @@ class IndexerTest(unittest.TestCase):
 
         self.assertTrue(len(sobra_expected) == 0 and len(sobra_vocab)==0, f"O Vocabulário indexado não é o esperado!\nVocabulario indexado: {set_vocab}\nVocabulário esperado: {set_expected_vocab}")
         lst_occur = obj_index.get_occurrence_list("cas")
-        dic_expected = {111:TermOccurrence(111,2,1),
-                        100102:TermOccurrence(100102,2,2)}
+        #os doc_ids são densos e atribuidos pela tabela de documentos a partir do nome do arquivo
+        document_table = obj_index.document_table
+        self.assertSetEqual(obj_index.set_documents, {0, 1, 2})
+        doc_111, doc_100102 = document_table.get_doc_id("111"), document_table.get_doc_id("100102")
+        dic_expected = {doc_111:TermOccurrence(doc_111,2,1),
+                        doc_100102:TermOccurrence(doc_100102,2,2)}
         for occur in lst_occur:
                 self.assertTrue(type(occur.doc_id) == int,f"O tipo do documento deveria ser inteiro")
                 self.assertTrue(occur.doc_id in dic_expected,f"O docid número {occur.doc_id} não deveria existir ou não deveria indexar o termo 'cas'")
                 self.assertEqual(dic_expected[occur.doc_id].term_freq,occur.term_freq, f"A frequencia do termo 'cas' no documento {occur.doc_id} deveria ser {occur.term_freq}")
     
+    def test_parallel_indexer(self):
+        serial_index = HashIndex()
+        HTMLIndexer(serial_index).index_text_dir("index/docs_test")
+        parallel_index = HashIndex()
+        HTMLIndexer(parallel_index).index_text_dir("index/docs_test", num_workers=2, chunk_size=1)
+
+        self.assertSetEqual(set(serial_index.vocabulary), set(parallel_index.vocabulary))
+        self.assertEqual(serial_index.document_count, parallel_index.document_count)
+        for term in serial_index.vocabulary:
+            dic_serial = {occur.doc_id:occur.term_freq for occur in serial_index.get_occurrence_list(term)}
+            dic_parallel = {occur.doc_id:occur.term_freq for occur in parallel_index.get_occurrence_list(term)}
+            self.assertDictEqual(dic_serial, dic_parallel, f"Ocorrencias diferentes do termo {term} na indexação paralela")
+
+    def test_sharded_indexer(self):
+        from index.sharded_structure import ShardedIndex
+        import shutil
+        serial_index = HashIndex()
+        HTMLIndexer(serial_index).index_text_dir("index/docs_test")
+        try:
+            #os 2 shards são construidos concorrentemente, cada um por um processo
+            sharded_index = ShardedIndex(2, "teste_shards")
+            HTMLIndexer(sharded_index).index_text_dir("index/docs_test", num_workers=2)
+            self.assertEqual(sharded_index.document_count, serial_index.document_count)
+            self.assertSetEqual(set(sharded_index.vocabulary), set(serial_index.vocabulary))
+            for term in serial_index.vocabulary:
+                self.assertListEqual([(occur.doc_id, occur.term_freq) for occur in sharded_index.get_occurrence_list(term)],
+                                     [(occur.doc_id, occur.term_freq) for occur in serial_index.get_occurrence_list(term)],
+                                     f"Ocorrencias diferentes do termo {term} no indice particionado")
+            for doc_id in sharded_index.set_documents:
+                self.assertIn(doc_id, sharded_index.lst_shards[sharded_index.shard_of(doc_id)].set_documents)
+            self.assertEqual(sharded_index.total_document_length,
+                             sum(occur.term_freq for term in serial_index.vocabulary for occur in serial_index.get_occurrence_list(term)))
+        finally:
+            shutil.rmtree("teste_shards", ignore_errors=True)
+
+    def test_checkpoint(self):
+        obj_index = FileIndex()
+        self.addCleanup(obj_index.remove_files)
+        html_indexer = HTMLIndexer(obj_index)
+        html_indexer.index_text_dir("index/docs_test", checkpoint_file="teste_checkpoint.idx", checkpoint_interval=1)
+        for str_file in ["teste_checkpoint.idx", "teste_checkpoint.idx.occur"]:
+            self.addCleanup(os.remove, str_file)
+        idx_checkpoint = Index.read_checkpoint("teste_checkpoint.idx")
+        self.addCleanup(idx_checkpoint.remove_files)
+        self.assertSetEqual(set(idx_checkpoint.vocabulary), set(obj_index.vocabulary))
+        self.assertEqual(idx_checkpoint.document_count, 3)
+
+        #ao retomar a partir do checkpoint, os documentos já indexados são ignorados
+        html_indexer = HTMLIndexer(idx_checkpoint)
+        html_indexer.index_text_dir("index/docs_test")
+        self.assertEqual(len(idx_checkpoint.get_occurrence_list("cas")), 2)
+
+    def test_index_text_batch(self):
+        obj_index = FileIndex()
+        self.addCleanup(obj_index.remove_files)
+        html_indexer = HTMLIndexer(obj_index)
+        with html_indexer.batch():
+            html_indexer.index_text(1, "<p>casa verde</p>")
+            html_indexer.index_text(2, "<p>casa</p>")
+            self.assertIsNone(obj_index.str_idx_file_name, "O indice não deveria ser finalizado antes do fim do lote")
+        self.assertEqual(obj_index.document_count_with_term("cas"), 2)
+
+    def test_update_files(self):
+        from index.segmented_structure import SegmentedIndex
+        import shutil
+        obj_index = SegmentedIndex("teste_segments", background_merge=False)
+        html_indexer = HTMLIndexer(obj_index)
+        html_indexer.index_text_dir("index/docs_test")
+        lst_files = HTMLIndexer.list_html_files("index/docs_test")
+        doc_111 = obj_index.document_table.get_doc_id("111")
+        os.makedirs("teste_update/111", exist_ok=True)
+        with open("teste_update/111/111.html", "w", encoding="utf-8") as f:
+            f.write("<p>Amarelo</p>")
+        try:
+            #o documento 111 é reindexado com o mesmo doc_id
+            html_indexer.update_files(["teste_update/111/111.html"])
+            self.assertEqual(obj_index.document_table.get_doc_id("111"), doc_111)
+            self.assertListEqual([occur.doc_id for occur in obj_index.get_occurrence_list("amarel")], [doc_111])
+            self.assertNotIn(doc_111, [occur.doc_id for occur in obj_index.get_occurrence_list("cas")])
+            self.assertEqual(obj_index.document_count, len(lst_files))
+        finally:
+            obj_index.close()
+            shutil.rmtree("teste_update", ignore_errors=True)
+            shutil.rmtree("teste_segments", ignore_errors=True)
+
+        with self.assertRaises(NotImplementedError):
+            HashIndex().delete_document(1)
+
+    def test_text_word_count(self):
+        html_indexer = HTMLIndexer(HashIndex())
+        #"casa" e "casas" resultam no mesmo termo, suas frequencias devem ser somadas
+        dic_count = html_indexer.text_word_count("A casa e as casas. Casa verde!")
+        self.assertEqual(dic_count["cas"], 3)
+        self.assertEqual(dic_count["verd"], 1)
+
+    def test_text_word_positions(self):
+        html_indexer = HTMLIndexer(HashIndex())
+        #a pontuação não conta como posição e as stop words removidas contam
+        dic_positions = {}
+        dic_count = html_indexer.text_word_count("A casa e as casas. Casa verde!", dic_positions)
+        self.assertListEqual(dic_positions["cas"], [1,4,5])
+        self.assertListEqual(dic_positions["verd"], [6])
+        self.assertDictEqual(dic_count, html_indexer.text_word_count("A casa e as casas. Casa verde!"))
+
+    def test_positions_indexer(self):
+        from index.positions import PositionsIndex
+        lst_positions = []
+        for num_workers in [1, 2]:
+            obj_index = HashIndex()
+            obj_index.positions = PositionsIndex(f"teste_positions_{num_workers}.idx")
+            HTMLIndexer(obj_index).index_text_dir("index/docs_test", num_workers=num_workers, chunk_size=1)
+            for term in obj_index.vocabulary:
+                for occur in obj_index.get_occurrence_list(term):
+                    self.assertEqual(occur.term_freq, len(obj_index.positions.get_positions(term, occur.doc_id)))
+            lst_positions.append({(term, occur.doc_id): obj_index.positions.get_positions(term, occur.doc_id)
+                                  for term in obj_index.vocabulary for occur in obj_index.get_occurrence_list(term)})
+            obj_index.positions.close()
+            os.remove(f"teste_positions_{num_workers}.idx")
+            os.remove(f"teste_positions_{num_workers}.idx.dir")
+        self.assertDictEqual(lst_positions[0], lst_positions[1], "Posições diferentes na indexação paralela")
+
+    def test_text_word_count_performance(self):
+        html_indexer = HTMLIndexer(HashIndex())
+        lst_texts = []
+        for str_file in HTMLIndexer.list_html_files("index/docs_test"):
+            with open(str_file,'r',encoding='utf-8') as f:
+                lst_texts.append(html_indexer.cleaner.html_to_plain_text(f.read()))
+        #documento longo, como os artigos da Wikipédia, formado pelos textos do docs_test
+        str_long_text = " ".join(lst_texts)*300
+
+        def quadratic_word_count(plain_text):
+            #implementação anterior: tokens.count e stemming a cada ocorrencia
+            dic_word_count = {}
+            tokens = word_tokenize(html_indexer.cleaner.preprocess_text(plain_text))
+            for token in tokens:
+                checkedToken = html_indexer.cleaner.preprocess_word(token)
+                if checkedToken:
+                    dic_word_count[checkedToken] = tokens.count(token)
+            return dic_word_count
+
+        dic_quadratic, time_quadratic, _ = CheckPerformance.measure(quadratic_word_count, str_long_text)
+        dic_linear, time_linear, _ = CheckPerformance.measure(html_indexer.text_word_count, str_long_text)
+        print(f"Contagem de termos ({len(str_long_text)} caracteres): anterior {time_quadratic:.4f}s, atual {time_linear:.4f}s ({time_quadratic/time_linear:.1f}x)")
+        self.assertSetEqual(set(dic_quadratic.keys()), set(dic_linear.keys()))
+        self.assertLess(time_linear, time_quadratic)
+
+    def test_cleaner_cache(self):
+        cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                          perform_stop_words_removal=True, perform_accents_removal=True,
+                          perform_stemming=True, cache_size=2)
+        self.assertEqual(cleaner.preprocess_word("casas"), "cas")
+        self.assertEqual(cleaner.preprocess_word("casas"), "cas")
+        self.assertEqual(cleaner.cache_stats()["preprocess_word"]["hits"], 1)
+        self.assertEqual(cleaner.cache_stats()["preprocess_word"]["misses"], 1)
+
+        #o cache é limitado a 2 entradas: "casas" é a menos recente e deve ser removida
+        cleaner.preprocess_word("verde")
+        cleaner.preprocess_word("prédio")
+        self.assertNotIn("casas", cleaner.dic_caches["preprocess_word"])
+        self.assertEqual(len(cleaner.dic_caches["preprocess_word"]), 2)
+
+        cleaner.save_cache("teste_cleaner_cache.pkl")
+        cleaner_warm = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                          perform_stop_words_removal=True, perform_accents_removal=True,
+                          perform_stemming=True, cache_file="teste_cleaner_cache.pkl")
+        self.assertIn("verde", cleaner_warm.dic_caches["preprocess_word"])
+        cleaner_warm.preprocess_word("verde")
+        self.assertEqual(cleaner_warm.cache_stats()["preprocess_word"]["hits"], 1)
+
+        #caches gerados com outra configuração são ignorados
+        cleaner_other = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                          perform_stop_words_removal=False, perform_accents_removal=True,
+                          perform_stemming=True)
+        self.assertFalse(cleaner_other.load_cache("teste_cleaner_cache.pkl"))
+        self.assertEqual(len(cleaner_other.dic_caches["preprocess_word"]), 0)
+
+    def test_parallel_cleaner_cache(self):
+        #os caches dos processos do pool são unidos ao cache do cleaner do indexador
+        html_indexer = HTMLIndexer(HashIndex())
+        html_indexer.cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                          perform_stop_words_removal=True, perform_accents_removal=True,
+                          perform_stemming=True, cache_file="teste_cleaner_cache.pkl")
+        html_indexer.index_text_dir("index/docs_test", num_workers=2, chunk_size=1)
+        self.assertIn("verde", html_indexer.cleaner.dic_caches["preprocess_word"])
+        self.assertIn("casa", html_indexer.cleaner.dic_caches["word_stem"])
+        html_indexer.cleaner.save_cache()
+        cleaner_warm = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                          perform_stop_words_removal=True, perform_accents_removal=True,
+                          perform_stemming=True, cache_file="teste_cleaner_cache.pkl")
+        self.assertIn("verde", cleaner_warm.dic_caches["preprocess_word"])
+        os.remove("teste_cleaner_cache.pkl")
+
+    def read_docs_test(self):
+        lst_html = []
+        for str_file in HTMLIndexer.list_html_files("index/docs_test"):
+            with open(str_file,'r',encoding='utf-8') as f:
+                lst_html.append(f.read())
+        return lst_html
+
+    def test_html_to_plain_text(self):
+        lst_html = self.read_docs_test()+["<strong>Ol&aacute;! </str> Quais <script>var x = '<b>';</script>são<style>p {}</style> os <!-- x --> dados?"]
+        for str_backend in HTML_TO_TEXT_BACKENDS:
+            cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                              perform_stop_words_removal=True, perform_accents_removal=True,
+                              perform_stemming=True, html_backend=str_backend)
+            for html in lst_html:
+                str_expected = HTML_TO_TEXT_BACKENDS["bs4"](html)
+                str_text = cleaner.html_to_plain_text(html)
+                if str_backend == "lxml":
+                    #o lxml descarta alguns espaços em branco antes da tag html
+                    self.assertListEqual(str_text.split(), str_expected.split(), f"Texto inesperado com o backend {str_backend}")
+                else:
+                    self.assertEqual(str_text, str_expected, f"Texto inesperado com o backend {str_backend}")
+            self.assertNotIn("var", cleaner.html_to_plain_text(lst_html[-1]))
+
+    def test_html_to_plain_text_performance(self):
+        lst_html = self.read_docs_test()*500
+        int_bytes = sum(len(html.encode('utf-8')) for html in lst_html)
+        for str_backend, html_to_text in HTML_TO_TEXT_BACKENDS.items():
+            _, elapsed, _ = CheckPerformance.measure(lambda: [html_to_text(html) for html in lst_html])
+            print(f"Extração de texto ({str_backend}): {int_bytes/elapsed/2**20:.2f} MB/s")
+
     def test_wiki_idx(self):
         wiki_idx = Index.read("wiki.idx")
 
@@ -0,0 +1,183 @@
+from typing import Iterator, Mapping, Tuple
+import bisect
+import sys
+import numpy as np
+
+
+def vbyte_append(buffer: bytearray, int_value: int):
+    # mesmo formato de postings_codec.vbyte_encode, um valor por vez
+    while int_value >= 0x80:
+        buffer.append(int_value & 0x7f)
+        int_value >>= 7
+    buffer.append(int_value | 0x80)
+
+
+def vbyte_read(data: bytes, pos: int) -> Tuple[int, int]:
+    """
+    Lê um valor (variable-byte) a partir de `pos`. Retorna o valor e a posição seguinte
+    """
+    int_value = 0
+    int_shift = 0
+    byte = data[pos]
+    while not byte & 0x80:
+        int_value |= byte << int_shift
+        int_shift += 7
+        pos += 1
+        byte = data[pos]
+    return int_value | ((byte & 0x7f) << int_shift), pos+1
+
+
+class FrontCodedLexicon:
+    """
+    Dicionario de termos congelado (somente leitura), usado no lugar de um dict de objetos após a indexação.
+
+    Os termos são ordenados (bytes utf-8) e divididos em buckets de `bucket_size` termos. Em term_blob,
+    o primeiro termo de cada bucket é gravado inteiro (tamanho + bytes) e os demais por front coding:
+    (tamanho do prefixo comum com o termo anterior, tamanho do sufixo, sufixo). A busca de um termo é
+    uma busca binária nos primeiros termos dos buckets seguida de uma varredura do bucket.
+
+    Os campos das entradas (ex. term_id, term_file_start_pos, doc_count_with_term e max_term_freq de
+    TermFilePosition) são armazenados em arr_entries, uma linha por termo na ordem dos termos e uma
+    coluna por campo (na ordem dos parametros do construtor da entrada); None é armazenado como -1. Cada acesso (ex. lexicon[term]) cria uma nova entrada:
+    alterá-la não altera o lexicon (ver `to_dict`).
+    """
+    BUCKET_SIZE = 8
+
+    def __init__(self, dic_index: Mapping[str, object], bucket_size: int = None):
+        self.bucket_size = bucket_size if bucket_size is not None else FrontCodedLexicon.BUCKET_SIZE
+        lst_terms = sorted(dic_index.keys(), key=lambda term: term.encode('utf-8'))
+        self.num_terms = len(lst_terms)
+
+        # classe e campos (atributos inteiros) das entradas
+        obj_first = dic_index[lst_terms[0]] if self.num_terms > 0 else None
+        self.entry_class = type(obj_first)
+        self.lst_fields = list(vars(obj_first).keys()) if obj_first is not None else []
+        # uma linha por termo e uma coluna por campo
+        self.arr_entries = np.array([[-1 if value is None else value for value in vars(dic_index[term]).values()]
+                                        for term in lst_terms], dtype=np.int64).reshape(self.num_terms, len(self.lst_fields))
+
+        term_blob = bytearray()
+        lst_bucket_offsets = []
+        bytes_previous = b""
+        for position, term in enumerate(lst_terms):
+            bytes_term = term.encode('utf-8')
+            if position % self.bucket_size == 0:
+                lst_bucket_offsets.append(len(term_blob))
+                vbyte_append(term_blob, len(bytes_term))
+                term_blob += bytes_term
+            else:
+                int_prefix = 0
+                int_max_prefix = min(len(bytes_previous), len(bytes_term))
+                while int_prefix < int_max_prefix and bytes_previous[int_prefix] == bytes_term[int_prefix]:
+                    int_prefix += 1
+                vbyte_append(term_blob, int_prefix)
+                vbyte_append(term_blob, len(bytes_term)-int_prefix)
+                term_blob += bytes_term[int_prefix:]
+            bytes_previous = bytes_term
+        self.term_blob = bytes(term_blob)
+        self.arr_bucket_offsets = np.array(lst_bucket_offsets, dtype=np.int64)
+        # os primeiros termos dos buckets são mantidos decodificados para a busca binária
+        self.lst_bucket_heads = [self.read_bucket_head(int(offset))[0] for offset in self.arr_bucket_offsets]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lst_bucket_heads"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lst_bucket_heads = [self.read_bucket_head(int(offset))[0] for offset in self.arr_bucket_offsets]
+
+    def read_bucket_head(self, offset: int) -> Tuple[bytes, int]:
+        int_size, pos = vbyte_read(self.term_blob, offset)
+        return self.term_blob[pos:pos+int_size], pos+int_size
+
+    def iter_bucket(self, bucket: int) -> Iterator[bytes]:
+        """
+        Gera os termos (bytes) do bucket, decodificando o front coding
+        """
+        bytes_term, pos = self.read_bucket_head(int(self.arr_bucket_offsets[bucket]))
+        yield bytes_term
+        int_bucket_size = min(self.bucket_size, self.num_terms-bucket*self.bucket_size)
+        for _ in range(int_bucket_size-1):
+            int_prefix, pos = vbyte_read(self.term_blob, pos)
+            int_suffix, pos = vbyte_read(self.term_blob, pos)
+            bytes_term = bytes_term[:int_prefix]+self.term_blob[pos:pos+int_suffix]
+            pos += int_suffix
+            yield bytes_term
+
+    def find_position(self, term: str) -> int:
+        """
+        Retorna a posição do termo (na ordem dos termos) ou None caso ele não exista
+        """
+        bytes_term = term.encode('utf-8')
+        bucket = bisect.bisect_right(self.lst_bucket_heads, bytes_term)-1
+        if bucket < 0:
+            return None
+        bytes_bucket_term = self.lst_bucket_heads[bucket]
+        position = bucket*self.bucket_size
+        int_end = min(position+self.bucket_size, self.num_terms)
+        term_blob = self.term_blob
+        pos = int(self.arr_bucket_offsets[bucket])
+        pos = vbyte_read(term_blob, pos)[1]+len(bytes_bucket_term)
+        while bytes_bucket_term < bytes_term:
+            position += 1
+            if position == int_end:
+                return None
+            # tamanhos menores que 128 (quase todos) ocupam um único byte
+            if term_blob[pos] & 0x80 and term_blob[pos+1] & 0x80:
+                int_prefix, int_suffix = term_blob[pos] & 0x7f, term_blob[pos+1] & 0x7f
+                pos += 2
+            else:
+                int_prefix, pos = vbyte_read(term_blob, pos)
+                int_suffix, pos = vbyte_read(term_blob, pos)
+            bytes_bucket_term = bytes_bucket_term[:int_prefix]+term_blob[pos:pos+int_suffix]
+            pos += int_suffix
+        return position if bytes_bucket_term == bytes_term else None
+
+    def entry_at(self, position: int):
+        return self.entry_class(*[None if value == -1 else value for value in self.arr_entries[position].tolist()])
+
+    def get(self, term: str, default=None):
+        position = self.find_position(term)
+        return self.entry_at(position) if position is not None else default
+
+    def __getitem__(self, term: str):
+        position = self.find_position(term)
+        if position is None:
+            raise KeyError(term)
+        return self.entry_at(position)
+
+    def __contains__(self, term: str) -> bool:
+        return self.find_position(term) is not None
+
+    def __len__(self):
+        return self.num_terms
+
+    def keys(self) -> Iterator[str]:
+        for bucket in range(len(self.arr_bucket_offsets)):
+            for bytes_term in self.iter_bucket(bucket):
+                yield bytes_term.decode('utf-8')
+
+    def __iter__(self):
+        return self.keys()
+
+    def values(self) -> Iterator:
+        for position in range(self.num_terms):
+            yield self.entry_at(position)
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        return zip(self.keys(), self.values())
+
+    def to_dict(self) -> dict:
+        """
+        Dicionario (mutável) equivalente, usado caso o indice volte a ser alterado
+        """
+        return dict(sorted(self.items(), key=lambda item: item[1].term_id))
+
+    def memory_size(self) -> int:
+        """
+        Bytes ocupados pelos termos, pelos arrays e pelos primeiros termos dos buckets decodificados
+        """
+        return (len(self.term_blob)+self.arr_bucket_offsets.nbytes+self.arr_entries.nbytes
+                + sys.getsizeof(self.lst_bucket_heads)+sum(sys.getsizeof(head) for head in self.lst_bucket_heads))
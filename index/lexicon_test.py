@@ -0,0 +1,68 @@
+from index.lexicon import *
+from index.structure import FileIndex, TermFilePosition
+import pickle
+import random
+import unittest
+
+
+class FrontCodedLexiconTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(7)
+        lst_prefixes = ["casa", "cas", "verde", "vermelho", "ação", "árvore", "a"]
+        set_terms = {prefix+"".join(rnd.choice("abcdeçõ") for _ in range(rnd.randint(0, 6)))
+                        for prefix in lst_prefixes for _ in range(40)}
+        set_terms.add("x"*300)
+        self.dic_index = {term: TermFilePosition(term_id, term_id*12 if term_id % 5 else None, term_id % 7+1, term_id % 3)
+                            for term_id, term in enumerate(sorted(set_terms, key=lambda term: term[::-1]))}
+        self.lexicon = FrontCodedLexicon(self.dic_index, bucket_size=8)
+
+    def check_entry(self, obj_expected, obj_entry):
+        self.assertIsInstance(obj_entry, TermFilePosition)
+        self.assertEqual(vars(obj_expected), vars(obj_entry))
+
+    def test_lookup(self):
+        self.assertEqual(len(self.lexicon), len(self.dic_index))
+        for term, obj_expected in self.dic_index.items():
+            self.assertIn(term, self.lexicon)
+            self.check_entry(obj_expected, self.lexicon[term])
+        for term in ["", "0", "casaz", "zzz", "vermelh", "ação!"]:
+            self.assertNotIn(term, self.lexicon)
+            self.assertIsNone(self.lexicon.get(term))
+        with self.assertRaises(KeyError):
+            self.lexicon["zzz"]
+
+    def test_iteration(self):
+        # os termos são gerados em ordem (bytes utf-8)
+        self.assertListEqual(list(self.lexicon.keys()), sorted(self.dic_index, key=lambda term: term.encode('utf-8')))
+        dic_thawed = self.lexicon.to_dict()
+        self.assertListEqual(list(dic_thawed.keys()), list(self.dic_index.keys()))
+        for term, obj_expected in self.dic_index.items():
+            self.check_entry(obj_expected, dic_thawed[term])
+
+    def test_pickle(self):
+        lexicon = pickle.loads(pickle.dumps(self.lexicon))
+        for term, obj_expected in self.dic_index.items():
+            self.check_entry(obj_expected, lexicon[term])
+
+    def test_file_index(self):
+        # o dicionario do FileIndex é congelado ao finalizar a indexação e volta a ser um dict caso o indice seja alterado
+        index = FileIndex()
+        self.addCleanup(index.remove_files)
+        index.index("casa", 1, 2)
+        index.index("verde", 1, 1)
+        index.finish_indexing()
+        self.assertIsInstance(index.dic_index, FrontCodedLexicon)
+        index.index("casa", 3, 1)
+        index.index("azul", 3, 4)
+        self.assertIsInstance(index.dic_index, dict)
+        index.finish_indexing()
+        self.assertIsInstance(index.dic_index, FrontCodedLexicon)
+        self.assertEqual(index.get_term_id("azul"), 2)
+        self.assertEqual(index.document_count_with_term("casa"), 2)
+        self.assertEqual(index.max_term_freq("azul"), 4)
+        self.assertEqual(index.vocabulary_size, 3)
+        self.assertListEqual([occur.doc_id for occur in index.get_occurrence_list("casa")], [1, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+from typing import List
+import mmap
+import pickle
+import struct
+from index.structure import Index, TermOccurrence
+
+
+class MmapIndex(Index):
+    """
+    Indice somente leitura em um formato compilado que é aberto por meio de `mmap`: a abertura
+    apenas lê o cabeçalho e as páginas são carregadas sob demanda pelo sistema operacional,
+    sendo compartilhadas entre os processos que abrem o mesmo arquivo.
+
+    Layout do arquivo (inteiros little-endian):
+        cabeçalho (HEADER_STRUCT), com o checksum do conteudo do indice de origem (Index.content_checksum)
+        term_offsets: num_terms+1 posições (uint64) dos termos em term_blob
+        term_blob: termos (utf-8) ordenados
+        term_table: por termo (na mesma ordem), TERM_STRUCT = (term_id, inicio das ocorrencias, qtd de documentos, maior frequencia)
+        postings: por ocorrencia, POSTING_STRUCT = (doc_id, term_freq), agrupadas por termo e ordenadas por doc_id
+        doc_ids: num_docs ids de documentos (uint32) ordenados
+        positions: camada de posições (Index.positions) serializada com pickle, vazia caso o indice não a possua.
+                   Apenas o nome dos arquivos de posições e o seu dicionario são gravados: os arquivos não são copiados
+    """
+    MAGIC = b"RIMMAP04"
+    HEADER_STRUCT = struct.Struct("<8sIIQQQQQQQQQ")
+    TERM_OFFSET_STRUCT = struct.Struct("<Q")
+    TERM_STRUCT = struct.Struct("<IQII")
+    POSTING_STRUCT = struct.Struct("<II")
+    DOC_ID_STRUCT = struct.Struct("<I")
+
+    def __init__(self, str_file_name: str):
+        super().__init__()
+        self.str_file_name = str_file_name
+        self.open()
+
+    def open(self):
+        with open(self.str_file_name, 'rb') as idx_file:
+            self.mm_index = mmap.mmap(idx_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.num_terms, self.num_docs, self.num_postings, self.content_checksum,
+            self.term_offsets_pos, self.term_blob_pos, self.term_table_pos,
+            self.postings_pos, self.doc_ids_pos,
+            positions_pos, positions_size) = MmapIndex.HEADER_STRUCT.unpack_from(self.mm_index, 0)
+        if magic != MmapIndex.MAGIC:
+            self.mm_index.close()
+            raise ValueError(f"O arquivo {self.str_file_name} não é um indice compilado (MmapIndex)")
+        if positions_size > 0:
+            self.positions = pickle.loads(self.mm_index[positions_pos:positions_pos+positions_size])
+
+    def close(self):
+        if self.positions is not None:
+            self.positions.close()
+        self.mm_index.close()
+
+    def __getstate__(self):
+        # apenas o nome do arquivo é serializado: cada processo abre (e compartilha) o mesmo mapeamento
+        return {"str_file_name": self.str_file_name}
+
+    def __setstate__(self, state):
+        Index.__init__(self)
+        self.str_file_name = state["str_file_name"]
+        self.open()
+
+    @staticmethod
+    def compile(index: Index, str_file_name: str) -> "MmapIndex":
+        """
+        Grava `index` (já finalizado) no formato compilado e retorna o MmapIndex correspondente
+        """
+        lst_terms = sorted(index.vocabulary, key=lambda term: term.encode('utf-8'))
+        lst_doc_ids = [int(doc_id) for doc_id in index.all_doc_ids()]
+
+        term_offsets = bytearray()
+        term_blob = bytearray()
+        term_table = bytearray()
+        postings = bytearray()
+        num_postings = 0
+        for term in lst_terms:
+            term_offsets += MmapIndex.TERM_OFFSET_STRUCT.pack(len(term_blob))
+            term_blob += term.encode('utf-8')
+
+            lst_occur = sorted(index.get_occurrence_list(term), key=lambda occur: occur.doc_id)
+            term_table += MmapIndex.TERM_STRUCT.pack(index.get_term_id(term), num_postings, len(lst_occur),
+                                                     max((occur.term_freq for occur in lst_occur), default=0))
+            for occur in lst_occur:
+                postings += MmapIndex.POSTING_STRUCT.pack(occur.doc_id, occur.term_freq)
+            num_postings += len(lst_occur)
+        term_offsets += MmapIndex.TERM_OFFSET_STRUCT.pack(len(term_blob))
+        doc_ids = b"".join(MmapIndex.DOC_ID_STRUCT.pack(doc_id) for doc_id in lst_doc_ids)
+        positions = pickle.dumps(index.positions) if index.positions is not None else b""
+
+        term_offsets_pos = MmapIndex.HEADER_STRUCT.size
+        term_blob_pos = term_offsets_pos+len(term_offsets)
+        term_table_pos = term_blob_pos+len(term_blob)
+        postings_pos = term_table_pos+len(term_table)
+        doc_ids_pos = postings_pos+len(postings)
+        positions_pos = doc_ids_pos+len(doc_ids)
+        with open(str_file_name, 'wb') as idx_file:
+            idx_file.write(MmapIndex.HEADER_STRUCT.pack(MmapIndex.MAGIC, len(lst_terms), len(lst_doc_ids), num_postings, index.content_checksum,
+                                                        term_offsets_pos, term_blob_pos, term_table_pos,
+                                                        postings_pos, doc_ids_pos, positions_pos, len(positions)))
+            for section in [term_offsets, term_blob, term_table, postings, doc_ids, positions]:
+                idx_file.write(section)
+        return MmapIndex(str_file_name)
+
+    @staticmethod
+    def read(arq_index: str) -> "MmapIndex":
+        return MmapIndex(arq_index)
+
+    def write(self, arq_index: str):
+        raise NotImplementedError("MmapIndex é somente leitura, use MmapIndex.compile para gerá-lo a partir de outro indice")
+
+    def index(self, term: str, doc_id: int, term_freq: int):
+        raise NotImplementedError("MmapIndex é somente leitura, use MmapIndex.compile para gerá-lo a partir de outro indice")
+
+    def create_index_entry(self, termo_id: int):
+        raise NotImplementedError("MmapIndex é somente leitura")
+
+    def add_index_occur(self, entry_dic_index, doc_id: int, term_id: int, freq_termo: int):
+        raise NotImplementedError("MmapIndex é somente leitura")
+
+    def get_term_bytes(self, term_position: int) -> bytes:
+        start, = MmapIndex.TERM_OFFSET_STRUCT.unpack_from(self.mm_index, self.term_offsets_pos+term_position*MmapIndex.TERM_OFFSET_STRUCT.size)
+        end, = MmapIndex.TERM_OFFSET_STRUCT.unpack_from(self.mm_index, self.term_offsets_pos+(term_position+1)*MmapIndex.TERM_OFFSET_STRUCT.size)
+        return self.mm_index[self.term_blob_pos+start:self.term_blob_pos+end]
+
+    def find_term_position(self, term: str) -> int:
+        """
+        Busca binária do termo no dicionario ordenado. Retorna sua posição ou None caso não exista
+        """
+        bytes_term = term.encode('utf-8')
+        low, high = 0, self.num_terms-1
+        while low <= high:
+            middle = (low+high)//2
+            bytes_middle = self.get_term_bytes(middle)
+            if bytes_middle == bytes_term:
+                return middle
+            elif bytes_middle < bytes_term:
+                low = middle+1
+            else:
+                high = middle-1
+        return None
+
+    def get_term_entry(self, term: str):
+        """
+        Retorna (term_id, inicio das ocorrencias, qtd de documentos, maior frequencia) do termo ou None caso não exista
+        """
+        term_position = self.find_term_position(term)
+        if term_position is None:
+            return None
+        return MmapIndex.TERM_STRUCT.unpack_from(self.mm_index, self.term_table_pos+term_position*MmapIndex.TERM_STRUCT.size)
+
+    @property
+    def vocabulary(self) -> List[str]:
+        return [self.get_term_bytes(term_position).decode('utf-8') for term_position in range(self.num_terms)]
+
+    @property
+    def vocabulary_size(self) -> int:
+        return self.num_terms
+
+    @property
+    def document_count(self) -> int:
+        return self.num_docs
+
+    def all_doc_ids(self) -> List[int]:
+        # os documentos não são carregados em set_documents na abertura: são lidos da seção doc_ids (já ordenada)
+        block = self.mm_index[self.doc_ids_pos:self.doc_ids_pos+self.num_docs*MmapIndex.DOC_ID_STRUCT.size]
+        return [doc_id for doc_id, in MmapIndex.DOC_ID_STRUCT.iter_unpack(block)]
+
+    def get_term_id(self, term: str):
+        term_entry = self.get_term_entry(term)
+        return term_entry[0] if term_entry is not None else None
+
+    def get_occurrence_list(self, term: str) -> List:
+        term_entry = self.get_term_entry(term)
+        if term_entry is None:
+            return []
+        term_id, postings_start, doc_count_with_term, _ = term_entry
+        start = self.postings_pos+postings_start*MmapIndex.POSTING_STRUCT.size
+        block = self.mm_index[start:start+doc_count_with_term*MmapIndex.POSTING_STRUCT.size]
+        return [TermOccurrence(doc_id, term_id, term_freq) for doc_id, term_freq in MmapIndex.POSTING_STRUCT.iter_unpack(block)]
+
+    def document_count_with_term(self, term: str) -> int:
+        term_entry = self.get_term_entry(term)
+        return term_entry[2] if term_entry is not None else 0
+
+    def max_term_freq(self, term: str) -> int:
+        term_entry = self.get_term_entry(term)
+        return term_entry[3] if term_entry is not None else 0
@@ -0,0 +1,73 @@
+from index.mmap_structure import *
+from index.structure import HashIndex, FileIndex
+from index.positions import PositionsIndex
+from index.index_structure_test import StructureTest
+import os
+import pickle
+import unittest
+
+
+class MmapStructureTest(StructureTest):
+    def setUp(self):
+        self.index = HashIndex()
+        self.create_terms()
+        self.source_index = self.index
+        self.index = MmapIndex.compile(self.index, "teste_idx.midx")
+
+    def tearDown(self):
+        self.index.close()
+        self.source_index.remove_files()
+        os.remove("teste_idx.midx")
+
+    def test_read_write(self):
+        idx_novo = MmapIndex.read("teste_idx.midx")
+        self.assertEqual(3,idx_novo.document_count)
+        self.assertEqual(self.source_index.content_checksum,idx_novo.content_checksum)
+        self.occur_list_test(idx_novo)
+
+        #ao ser serializado (ex. enviado a outro processo) o indice é reaberto a partir do arquivo
+        idx_pickle = pickle.loads(pickle.dumps(idx_novo))
+        self.assertEqual(3,idx_pickle.document_count)
+        self.occur_list_test(idx_pickle)
+
+        with self.assertRaises(NotImplementedError):
+            idx_novo.index("casa",4,1)
+
+    def test_term_id(self):
+        hash_index = HashIndex()
+        self.index.close()
+        self.index = hash_index
+        self.create_terms()
+        self.index = MmapIndex.compile(hash_index, "teste_idx.midx")
+        for term in hash_index.vocabulary:
+            self.assertEqual(hash_index.get_term_id(term), self.index.get_term_id(term))
+        self.assertIsNone(self.index.get_term_id("xuxu"))
+
+    def test_positions(self):
+        #a camada de posições do indice de origem é associada ao indice compilado (também após serializado)
+        self.assertIsNone(self.index.positions)
+        self.index.close()
+        self.source_index.positions = PositionsIndex("teste_positions.idx")
+        self.source_index.positions.add_document(1, {"casa": [0, 4], "vermelho": [1]})
+        self.source_index.positions.finish_indexing()
+        self.index = MmapIndex.compile(self.source_index, "teste_idx.midx")
+        try:
+            for idx_positions in [self.index, pickle.loads(pickle.dumps(self.index))]:
+                self.assertListEqual(idx_positions.positions.get_positions("casa", 1), [0, 4])
+                self.assertListEqual(idx_positions.positions.get_positions("vermelho", 2), [])
+        finally:
+            self.source_index.positions.close()
+            for str_file in ["teste_positions.idx", "teste_positions.idx.dir"]:
+                os.remove(str_file)
+
+
+class MmapFromFileIndexStructureTest(MmapStructureTest):
+    def setUp(self):
+        self.index = FileIndex()
+        self.create_terms()
+        self.source_index = self.index
+        self.index = MmapIndex.compile(self.index, "teste_idx.midx")
+
+
+if __name__ == "__main__":
+    unittest.main()
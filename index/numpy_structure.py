@@ -0,0 +1,161 @@
+from typing import List
+import os
+import gc
+import uuid
+import numpy as np
+from index.structure import Index, TermOccurrence
+
+# uma ocorrencia por linha, contigua em memória (12 bytes por ocorrencia)
+OCCURRENCE_DTYPE = np.dtype([("doc_id", np.uint32), ("term_id", np.uint32), ("term_freq", np.uint32)])
+
+
+class NumpyIndex(Index):
+    """
+    Indice que armazena as ocorrencias em arrays NumPy (dtype OCCURRENCE_DTYPE) ao invés de
+    um objeto TermOccurrence por ocorrencia. O dic_index mapeia cada termo diretamente ao seu term_id.
+
+    Durante a indexação, as ocorrencias são acumuladas em arr_occurrences_tmp; quando este
+    buffer enche, ele é ordenado (term_id, doc_id) e gravado em uma run por meio de `tofile`.
+    Em finish_indexing as runs são unidas em arr_postings, ordenado por (term_id, doc_id),
+    e as ocorrencias de cada termo passam a ser uma fatia contigua deste array.
+
+    Como arr_postings fica todo em memória, finish_indexing também carrega todas as ocorrencias: as runs são
+    lidas, uma de cada vez, para um único array pré-alocado, que é então ordenado. O pico de memória é de cerca
+    de 2x o tamanho final de arr_postings (o array lido e a sua cópia ordenada) mais os indices da ordenação
+    (8 bytes por ocorrencia) e uma run.
+    """
+    TMP_OCCURRENCES_LIMIT = 1000000
+    FILE_PREFIX = "occur_np_index"
+
+    def __init__(self, tmp_occurrences_limit: int = None):
+        super().__init__()
+        self.tmp_occurrences_limit = tmp_occurrences_limit if tmp_occurrences_limit is not None else NumpyIndex.TMP_OCCURRENCES_LIMIT
+        self.arr_occurrences_tmp = None
+        self.int_tmp_occur_size = 0
+
+        self.lst_run_files = []
+        self.idx_file_counter = 0
+        # identificador das runs deste indice (como em FileIndex), para que indices diferentes não usem o mesmo arquivo
+        self.str_file_id = uuid.uuid4().hex
+
+        # definidos em finish_indexing
+        self.arr_postings = np.empty(0, dtype=OCCURRENCE_DTYPE)
+        self.arr_term_start = np.empty(0, dtype=np.int64)
+        self.arr_term_doc_count = np.empty(0, dtype=np.int64)
+        self.arr_term_max_freq = np.empty(0, dtype=np.uint32)
+
+    def __getstate__(self):
+        # as runs pendentes seriam compartilhadas (e removidas em finish_indexing) pelas cópias do indice
+        if len(self.lst_run_files) > 0:
+            raise ValueError("Finalize (finish_indexing) o indice antes de gravá-lo: há runs pendentes")
+        return self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # o indice lido cria as suas próprias runs
+        self.str_file_id = uuid.uuid4().hex
+        self.idx_file_counter = 0
+
+    def get_term_id(self, term: str):
+        return self.dic_index[term]
+
+    def create_index_entry(self, term_id: int) -> int:
+        return term_id
+
+    def add_index_occur(self, entry_dic_index: int, doc_id: int, term_id: int, term_freq: int):
+        if self.arr_occurrences_tmp is None:
+            self.arr_occurrences_tmp = np.empty(self.tmp_occurrences_limit, dtype=OCCURRENCE_DTYPE)
+        self.arr_occurrences_tmp[self.int_tmp_occur_size] = (int(doc_id), term_id, term_freq)
+        self.int_tmp_occur_size += 1
+        if self.int_tmp_occur_size == self.tmp_occurrences_limit:
+            self.save_tmp_occurrences()
+
+    @staticmethod
+    def sort_occurrences(arr_occurrences: np.ndarray) -> np.ndarray:
+        # lexsort ordena pela ultima chave e desempata pelas anteriores: term_id e, depois, doc_id
+        return arr_occurrences[np.lexsort((arr_occurrences["doc_id"], arr_occurrences["term_id"]))]
+
+    def save_tmp_occurrences(self):
+        if self.int_tmp_occur_size == 0:
+            return
+        str_run_file = self.new_run_file_name()
+        NumpyIndex.sort_occurrences(self.arr_occurrences_tmp[:self.int_tmp_occur_size]).tofile(str_run_file)
+        self.lst_run_files.append(str_run_file)
+        self.int_tmp_occur_size = 0
+
+    def new_run_file_name(self) -> str:
+        # nomes já existentes são evitados: um arquivo que não foi criado por este indice nunca é sobrescrito
+        str_file_name = f"{NumpyIndex.FILE_PREFIX}_{self.str_file_id}_{self.idx_file_counter}"
+        while os.path.exists(str_file_name):
+            self.idx_file_counter += 1
+            str_file_name = f"{NumpyIndex.FILE_PREFIX}_{self.str_file_id}_{self.idx_file_counter}"
+        self.idx_file_counter += 1
+        return str_file_name
+
+    def finish_indexing(self):
+        self.generation += 1
+        gc.disable()
+        # as ocorrencias (já finalizadas, das runs e do buffer) são copiadas para um único array
+        lst_run_sizes = [os.path.getsize(str_run_file)//OCCURRENCE_DTYPE.itemsize for str_run_file in self.lst_run_files]
+        arr_occurrences = np.empty(len(self.arr_postings)+sum(lst_run_sizes)+self.int_tmp_occur_size, dtype=OCCURRENCE_DTYPE)
+        int_position = len(self.arr_postings)
+        arr_occurrences[:int_position] = self.arr_postings
+        self.arr_postings = None
+        for str_run_file, int_run_size in zip(self.lst_run_files, lst_run_sizes):
+            arr_occurrences[int_position:int_position+int_run_size] = np.fromfile(str_run_file, dtype=OCCURRENCE_DTYPE)
+            int_position += int_run_size
+        if self.int_tmp_occur_size > 0:
+            arr_occurrences[int_position:] = self.arr_occurrences_tmp[:self.int_tmp_occur_size]
+        self.arr_occurrences_tmp = None
+        self.arr_postings = NumpyIndex.sort_occurrences(arr_occurrences)
+        del arr_occurrences
+
+        for str_run_file in self.lst_run_files:
+            os.remove(str_run_file)
+        self.lst_run_files = []
+        # o buffer só é realocado caso novas ocorrencias sejam indexadas
+        self.int_tmp_occur_size = 0
+
+        # como os term_ids são sequenciais, a quantidade de documentos e a posição inicial
+        # de cada termo são indexadas pelo proprio term_id
+        self.arr_term_doc_count = np.bincount(self.arr_postings["term_id"], minlength=len(self.dic_index))
+        self.arr_term_start = np.zeros(len(self.arr_term_doc_count), dtype=np.int64)
+        np.cumsum(self.arr_term_doc_count[:-1], out=self.arr_term_start[1:])
+        self.arr_term_max_freq = np.zeros(len(self.arr_term_doc_count), dtype=np.uint32)
+        np.maximum.at(self.arr_term_max_freq, self.arr_postings["term_id"], self.arr_postings["term_freq"])
+        gc.enable()
+
+    def remove_files(self):
+        # apenas as runs pendentes estão em arquivos: as ocorrencias finalizadas ficam em arr_postings
+        for str_run_file in self.lst_run_files:
+            if os.path.exists(str_run_file):
+                os.remove(str_run_file)
+        self.lst_run_files = []
+
+    def get_postings(self, term: str) -> np.ndarray:
+        """
+        Retorna as ocorrencias do termo como uma fatia (sem cópia) de arr_postings
+        """
+        if term not in self.dic_index:
+            return self.arr_postings[:0]
+        term_id = self.dic_index[term]
+        if term_id >= len(self.arr_term_start):
+            return self.arr_postings[:0]
+        int_start = self.arr_term_start[term_id]
+        return self.arr_postings[int_start:int_start+self.arr_term_doc_count[term_id]]
+
+    def get_occurrence_list(self, term: str) -> List:
+        arr_occurrences = self.get_postings(term)
+        if len(arr_occurrences) == 0:
+            return []
+        term_id = self.dic_index[term]
+        return [TermOccurrence(doc_id, term_id, term_freq)
+                    for doc_id, term_freq in zip(arr_occurrences["doc_id"].tolist(), arr_occurrences["term_freq"].tolist())]
+
+    def document_count_with_term(self, term: str) -> int:
+        return len(self.get_postings(term))
+
+    def max_term_freq(self, term: str) -> int:
+        if term not in self.dic_index or self.dic_index[term] >= len(self.arr_term_max_freq):
+            return 0
+        return int(self.arr_term_max_freq[self.dic_index[term]])
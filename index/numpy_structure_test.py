@@ -0,0 +1,55 @@
+from index.numpy_structure import *
+from index.index_structure_test import StructureTest
+import pickle
+import unittest
+
+
+class NumpyStructureTest(StructureTest):
+    def setUp(self):
+        self.index = NumpyIndex()
+        self.create_terms()
+
+
+class NumpySpillStructureTest(StructureTest):
+    def setUp(self):
+        #buffer pequeno para forçar a gravação de runs durante a indexação
+        self.index = NumpyIndex(tmp_occurrences_limit=2)
+        self.create_terms()
+
+    def test_postings_sorted(self):
+        self.assertEqual(len(self.index.lst_run_files), 0, "As runs deveriam ser removidas em finish_indexing")
+        arr_postings = self.index.arr_postings
+        self.assertEqual(arr_postings.dtype, OCCURRENCE_DTYPE)
+        self.assertEqual(len(arr_postings), 6)
+        lst_keys = list(zip(arr_postings["term_id"].tolist(), arr_postings["doc_id"].tolist()))
+        self.assertListEqual(lst_keys, sorted(lst_keys), "As ocorrencias deveriam estar ordenadas por (term_id, doc_id)")
+
+    def test_index_after_finish(self):
+        self.index.index("verde", 4, 2)
+        self.index.finish_indexing()
+        self.assertEqual(self.index.document_count_with_term("verde"), 2)
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("verde")], [1, 4])
+        self.assertEqual(self.index.document_count, 4)
+
+
+    def test_independent_runs(self):
+        #dois indices (um deles lido do outro) com runs pendentes ao mesmo tempo não usam os mesmos arquivos
+        index = NumpyIndex(tmp_occurrences_limit=2)
+        index.index("casa", 1, 1)
+        index_lido = pickle.loads(pickle.dumps(index))
+        self.assertNotEqual(index.str_file_id, index_lido.str_file_id)
+        for idx, term in [(index, "verde"), (index_lido, "azul")]:
+            idx.index(term, 2, 1)
+            idx.index(term, 3, 1)
+        self.assertEqual(len(set(index.lst_run_files) & set(index_lido.lst_run_files)), 0)
+        #um indice com runs pendentes não pode ser gravado
+        with self.assertRaises(ValueError):
+            pickle.dumps(index)
+        index.finish_indexing()
+        index_lido.finish_indexing()
+        self.assertListEqual([occur.doc_id for occur in index.get_occurrence_list("verde")], [2, 3])
+        self.assertListEqual(index.get_occurrence_list("azul"), [])
+        self.assertListEqual([occur.doc_id for occur in index_lido.get_occurrence_list("azul")], [2, 3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,10 @@
 from IPython.display import clear_output
 from index.structure import *
+from index.numpy_structure import NumpyIndex
+from index.compressed_structure import CompressedFileIndex
+from index.postings_codec import POSTINGS_CODECS, decode_postings
+from index.lexicon import FrontCodedLexicon
+from query.boolean_query import intersect_cursors
 
 from datetime import datetime
 import math
@@ -59,6 +64,193 @@ class FilePerformanceTest(PerformanceTest):
     def setUp(self):
         self.index = FileIndex()
 
+
+class NumpyPerformanceTest(PerformanceTest):
+    def setUp(self):
+        self.index = NumpyIndex()
+
+
+class NumpyIndexMemoryPerformanceTest(unittest.TestCase):
+    NUM_DOCS = 1000
+    NUM_TERM_PER_DOC = 200
+
+    def build_index(self, index):
+        seed(10)
+        for doc_i in range(NumpyIndexMemoryPerformanceTest.NUM_DOCS):
+            for term_j in range(NumpyIndexMemoryPerformanceTest.NUM_TERM_PER_DOC):
+                index.index(f"t{randrange(0,5000)}", doc_i, (term_j%10)+1)
+        index.finish_indexing()
+        return index
+
+    def measure_index(self, index):
+        tracemalloc.start()
+        start = time.perf_counter()
+        self.build_index(index)
+        elapsed = time.perf_counter()-start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, current, peak
+
+    def test_memory_and_throughput(self):
+        total = NumpyIndexMemoryPerformanceTest.NUM_DOCS*NumpyIndexMemoryPerformanceTest.NUM_TERM_PER_DOC
+        dic_results = {}
+        for str_name, index in [("HashIndex", HashIndex()), ("NumpyIndex", NumpyIndex(tmp_occurrences_limit=total//4))]:
+            elapsed, current, peak = self.measure_index(index)
+            dic_results[str_name] = (elapsed, current, peak)
+            print(f"{str_name}: {total/elapsed:.0f} ocorrencias/s, memória retida {current/2**20:.1f}MB (pico {peak/2**20:.1f}MB)")
+        self.assertLess(dic_results["NumpyIndex"][1], dic_results["HashIndex"][1])
+
+
+class FileIndexReadPerformanceTest(unittest.TestCase):
+    NUM_DOCS = 300
+    NUM_TERM_PER_DOC = 100
+    NUM_QUERY_TERMS = 20
+
+    def setUp(self):
+        self.index = FileIndex()
+        seed(10)
+        vocabulary = [f"t{i}" for i in range(2000)]
+        for doc_i in range(FileIndexReadPerformanceTest.NUM_DOCS):
+            for str_term in {vocabulary[randrange(0,len(vocabulary))] for _ in range(FileIndexReadPerformanceTest.NUM_TERM_PER_DOC)}:
+                self.index.index(str_term, doc_i, randrange(1,10))
+        self.index.finish_indexing()
+        self.query_terms = self.index.vocabulary[:FileIndexReadPerformanceTest.NUM_QUERY_TERMS]
+
+    def read_all(self, get_occurrence_list):
+        return [get_occurrence_list(term) for term in self.query_terms]
+
+    def test_seek_vs_full_scan(self):
+        lst_scan, time_scan, _ = CheckPerformance.measure(self.read_all, self.index.get_occurrence_list_full_scan)
+        lst_seek, time_seek, _ = CheckPerformance.measure(self.read_all, self.index.get_occurrence_list)
+
+        for term, occur_scan, occur_seek in zip(self.query_terms, lst_scan, lst_seek):
+            self.assertListEqual(occur_scan, occur_seek, f"Ocorrencias diferentes para o termo {term}")
+        print(f"Leitura de {len(self.query_terms)} termos: varredura completa {time_scan:.4f}s, seek {time_seek:.4f}s ({time_scan/time_seek:.1f}x)")
+        self.assertLess(time_seek, time_scan)
+
+class CompressedPostingsPerformanceTest(unittest.TestCase):
+    NUM_DOCS = 3000
+    NUM_TERMS = 1000
+
+    def build_index(self, index):
+        # o termo de posição r ocorre em ~NUM_DOCS/r documentos (Zipf)
+        seed(10)
+        for doc_i in range(CompressedPostingsPerformanceTest.NUM_DOCS):
+            for rank in range(1, CompressedPostingsPerformanceTest.NUM_TERMS+1):
+                if randrange(0, rank) == 0:
+                    index.index(f"t{rank}", doc_i, randrange(1, 10) if randrange(0, 4) else 1)
+        index.finish_indexing()
+        return index
+
+    def decode_fixed(self, lst_data):
+        return sum(len(list(FileIndex.OCCURRENCE_STRUCT.iter_unpack(data))) for data in lst_data)
+
+    def decode_compressed(self, lst_data, lst_doc_counts, codec):
+        return sum(len(decode_postings(data, int_doc_count, codec)[0]) for data, int_doc_count in zip(lst_data, lst_doc_counts))
+
+    def test_bytes_per_posting_and_decode(self):
+        """
+        Compara o tamanho do arquivo e a velocidade de decodificação (ocorrencias já em memória,
+        todos os termos) do formato de tamanho fixo (occur_index_N) e dos formatos comprimidos
+        """
+        index = self.build_index(FileIndex())
+        lst_terms = index.vocabulary
+        num_postings = sum(index.document_count_with_term(term) for term in lst_terms)
+        with open(index.str_idx_file_name, 'rb') as idx_file:
+            lst_data = []
+            for term in lst_terms:
+                idx_file.seek(index.dic_index[term].term_file_start_pos)
+                lst_data.append(idx_file.read(index.document_count_with_term(term)*FileIndex.OCCURRENCE_SIZE))
+        _, time_fixed, _ = CheckPerformance.measure(self.decode_fixed, lst_data, repeat=5)
+        print(f"{num_postings} ocorrencias de {len(lst_terms)} termos")
+        print(f"occur_index (tamanho fixo): {os.path.getsize(index.str_idx_file_name)/num_postings:.2f} bytes/ocorrencia, "
+              f"decodificação: {num_postings/time_fixed/1e6:.2f} M ocorrencias/s")
+
+        for codec in ["bitpack", "vbyte"]:
+            idx_compressed = self.build_index(CompressedFileIndex(codec=codec))
+            with open(idx_compressed.str_postings_file_name, 'rb') as postings_file:
+                lst_data = []
+                for term in lst_terms:
+                    postings_file.seek(idx_compressed.dic_index[term].term_file_start_pos)
+                    lst_data.append(postings_file.read(idx_compressed.dic_index[term].term_byte_size))
+            int_decoded, time_decode, _ = CheckPerformance.measure(self.decode_compressed, lst_data,
+                                                                     [index.document_count_with_term(term) for term in lst_terms],
+                                                                     POSTINGS_CODECS[codec], repeat=5)
+            self.assertEqual(int_decoded, num_postings)
+            bytes_per_posting = os.path.getsize(idx_compressed.str_postings_file_name)/num_postings
+            print(f"{codec}: {bytes_per_posting:.2f} bytes/ocorrencia, decodificação: {num_postings/time_decode/1e6:.2f} M ocorrencias/s")
+            self.assertLess(bytes_per_posting, FileIndex.OCCURRENCE_SIZE/2)
+
+class SkipPointersPerformanceTest(unittest.TestCase):
+    NUM_DOCS_LONG = 300000
+    NUM_DOCS_SHORT = 50
+
+    def setUp(self):
+        # uma lista muito longa (termo frequente) e uma curta
+        seed(10)
+        self.index = CompressedFileIndex()
+        for doc_id in range(SkipPointersPerformanceTest.NUM_DOCS_LONG):
+            self.index.index("de", doc_id, randrange(1, 10))
+        for doc_id in sorted({randrange(0, SkipPointersPerformanceTest.NUM_DOCS_LONG) for _ in range(SkipPointersPerformanceTest.NUM_DOCS_SHORT)}):
+            self.index.index("raro", doc_id, 1)
+        self.index.finish_indexing()
+
+    def intersect_decoded(self):
+        # decodifica a lista longa inteira antes da interseção
+        return intersect_cursors([PostingCursor(self.index.get_occurrence_list(term)) for term in ["raro", "de"]])
+
+    def intersect_skipping(self):
+        self.lst_cursors = [self.index.get_posting_cursor(term) for term in ["raro", "de"]]
+        return intersect_cursors(self.lst_cursors)
+
+    def test_skip_intersection(self):
+        lst_decoded, time_decoded, _ = CheckPerformance.measure(self.intersect_decoded, repeat=3)
+        lst_skipping, time_skipping, _ = CheckPerformance.measure(self.intersect_skipping, repeat=3)
+        self.assertListEqual(lst_decoded, lst_skipping)
+        cursor_long = self.lst_cursors[1]
+        print(f"Interseção de {SkipPointersPerformanceTest.NUM_DOCS_SHORT} x {SkipPointersPerformanceTest.NUM_DOCS_LONG} ocorrencias: "
+              f"decodificando a lista: {time_decoded:.4f}s, com skip table: {time_skipping:.4f}s ({time_decoded/time_skipping:.1f}x), "
+              f"blocos decodificados: {cursor_long.num_decoded_blocks} de {cursor_long.int_num_blocks}")
+        self.assertLess(cursor_long.num_decoded_blocks, cursor_long.int_num_blocks)
+        self.assertLess(time_skipping, time_decoded)
+
+class LexiconPerformanceTest(unittest.TestCase):
+    NUM_TERMS = 60000
+    NUM_LOOKUPS = 20000
+
+    def setUp(self):
+        seed(10)
+        # termos com prefixos comuns, como palavras de um mesmo radical
+        lst_radicals = ["".join(chr(randrange(97,123)) for _ in range(randrange(3,7))) for _ in range(LexiconPerformanceTest.NUM_TERMS//20)]
+        set_terms = set()
+        while len(set_terms) < LexiconPerformanceTest.NUM_TERMS:
+            set_terms.add(lst_radicals[randrange(0,len(lst_radicals))]+"".join(chr(randrange(97,123)) for _ in range(randrange(0,6))))
+        self.lst_terms = list(set_terms)
+        self.lst_lookups = [self.lst_terms[randrange(0,len(self.lst_terms))] for _ in range(LexiconPerformanceTest.NUM_LOOKUPS)]
+
+    def build_dict(self):
+        return {term: TermFilePosition(term_id, term_id*12, randrange(1,100), randrange(1,10))
+                    for term_id, term in enumerate(self.lst_terms)}
+
+    def lookup_all(self, dic_index):
+        return [dic_index.get(term).term_file_start_pos for term in self.lst_lookups]
+
+    def test_memory_and_lookup(self):
+        # a memoria é medida a partir de cópias dos termos, pois as strings de lst_terms já estão alocadas
+        self.lst_terms = [term.encode('utf-8').decode('utf-8') for term in self.lst_terms]
+        dic_index, _, mem_dict = CheckPerformance.measure(self.build_dict, trace_memory=True)
+        lexicon = FrontCodedLexicon(dic_index)
+
+        lst_dict, time_dict, _ = CheckPerformance.measure(self.lookup_all, dic_index, repeat=3)
+        lst_lexicon, time_lexicon, _ = CheckPerformance.measure(self.lookup_all, lexicon, repeat=3)
+        self.assertListEqual(lst_dict, lst_lexicon)
+        int_num_terms = LexiconPerformanceTest.NUM_TERMS
+        print(f"Dicionario de {int_num_terms} termos: dict {mem_dict/int_num_terms:.1f} bytes/termo, "
+              f"FrontCodedLexicon {lexicon.memory_size()/int_num_terms:.1f} bytes/termo")
+        print(f"Busca de {LexiconPerformanceTest.NUM_LOOKUPS} termos: dict {time_dict/LexiconPerformanceTest.NUM_LOOKUPS*1e6:.2f}us/termo, "
+              f"FrontCodedLexicon {time_lexicon/LexiconPerformanceTest.NUM_LOOKUPS*1e6:.2f}us/termo")
+        self.assertLess(lexicon.memory_size()*4, mem_dict)
+
 def test():
     for i in range(10):
         clear_output(wait=True)
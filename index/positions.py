@@ -0,0 +1,142 @@
+from typing import List, Mapping
+from itertools import accumulate
+import mmap
+import os
+import numpy as np
+from index.lexicon import vbyte_append
+from index.postings_codec import vbyte_decode_small
+
+
+class PositionsIndex:
+    """
+    Camada opcional de posições de um indice (Index.positions), gravada em arquivos separados das ocorrencias,
+    de forma que consultas sem frase não leem (nem carregam) nenhuma posição:
+        `str_file_name`: um registro por (termo, documento) com as posições do termo no documento,
+                         ordenadas e gravadas como gaps (a primeira, absoluta) em variable-byte
+        `str_file_name`.dir: por termo (na ordem dos termos), as entradas DIR_DTYPE = (doc_id, inicio do registro, tamanho)
+                         ordenadas por doc_id. Em dic_terms, cada termo possui (primeira entrada, qtd de entradas)
+
+    Os registros são adicionados (add_document) ao final do arquivo de posições durante a indexação e o diretório
+    é regravado em finish_indexing. As posições de um documento são lidas (get_positions) apenas quando necessário,
+    ex. para os documentos candidatos de uma consulta por frase
+    """
+    DIR_DTYPE = np.dtype([("doc_id", "<u4"), ("start", "<u8"), ("size", "<u4")])
+
+    def __init__(self, str_file_name: str = "positions.idx"):
+        self.str_file_name = str_file_name
+        self.dic_terms = {}
+        # entradas adicionadas após a ultima finalização: termo -> [(doc_id, inicio, tamanho)]
+        self.dic_pending = {}
+        self.int_data_size = 0
+        with open(self.str_file_name, 'wb'):
+            pass
+        self.positions_file = None
+        self.open()
+
+    def __getstate__(self):
+        if len(self.dic_pending) > 0:
+            raise ValueError("Finalize (finish_indexing) as posições antes de gravá-las")
+        return {"str_file_name": self.str_file_name, "dic_terms": self.dic_terms, "int_data_size": self.int_data_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.dic_pending = {}
+        self.positions_file = None
+        self.open()
+
+    def dir_file_name(self) -> str:
+        return f"{self.str_file_name}.dir"
+
+    def open(self):
+        self.mm_data = None
+        self.mm_dir = None
+        # arquivos vazios não podem ser mapeados
+        if self.int_data_size > 0:
+            with open(self.str_file_name, 'rb') as data_file:
+                self.mm_data = mmap.mmap(data_file.fileno(), self.int_data_size, access=mmap.ACCESS_READ)
+        if os.path.exists(self.dir_file_name()) and os.path.getsize(self.dir_file_name()) > 0:
+            with open(self.dir_file_name(), 'rb') as dir_file:
+                self.mm_dir = mmap.mmap(dir_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.positions_file is not None:
+            self.positions_file.close()
+            self.positions_file = None
+        for mm_file in [self.mm_data, self.mm_dir]:
+            if mm_file is not None:
+                mm_file.close()
+        self.mm_data = None
+        self.mm_dir = None
+
+    def add_document(self, doc_id: int, dic_positions: Mapping[str, List[int]]):
+        """
+        Adiciona as posições (ordenadas) de cada termo do documento
+        """
+        if self.positions_file is None:
+            self.positions_file = open(self.str_file_name, 'ab')
+        buffer = bytearray()
+        for term, lst_positions in dic_positions.items():
+            int_start = self.int_data_size+len(buffer)
+            int_previous = 0
+            for position in lst_positions:
+                vbyte_append(buffer, position-int_previous)
+                int_previous = position
+            self.dic_pending.setdefault(term, []).append((doc_id, int_start, self.int_data_size+len(buffer)-int_start))
+        self.positions_file.write(buffer)
+        self.int_data_size += len(buffer)
+
+    def get_entries(self, term: str) -> np.ndarray:
+        """
+        Entradas (doc_id, inicio, tamanho) do termo, ordenadas por doc_id
+        """
+        term_entry = self.dic_terms.get(term)
+        if term_entry is None or self.mm_dir is None:
+            return np.empty(0, dtype=PositionsIndex.DIR_DTYPE)
+        int_first, int_count = term_entry
+        return np.frombuffer(self.mm_dir, dtype=PositionsIndex.DIR_DTYPE, count=int_count,
+                             offset=int_first*PositionsIndex.DIR_DTYPE.itemsize)
+
+    def finish_indexing(self):
+        """
+        Grava as posições adicionadas e regrava o diretório com as entradas novas. Caso um documento
+        tenha sido adicionado mais de uma vez (ex. reindexado), apenas o seu ultimo registro é mantido
+        """
+        if len(self.dic_pending) == 0:
+            return
+        self.positions_file.flush()
+        lst_terms = sorted(set(self.dic_terms) | set(self.dic_pending), key=lambda term: term.encode('utf-8'))
+        dic_terms = {}
+        int_first = 0
+        with open(f"{self.dir_file_name()}.tmp", 'wb') as dir_file:
+            for term in lst_terms:
+                # cópia: o diretório mapeado é fechado antes de ser substituido
+                arr_entries = self.get_entries(term).copy()
+                if term in self.dic_pending:
+                    arr_entries = np.concatenate([arr_entries, np.array(self.dic_pending[term], dtype=PositionsIndex.DIR_DTYPE)])
+                    # ordenação estável: o ultimo registro de cada doc_id é o ultimo do grupo
+                    arr_entries = arr_entries[np.argsort(arr_entries["doc_id"], kind="stable")]
+                    arr_last = np.append(arr_entries["doc_id"][1:] != arr_entries["doc_id"][:-1], True)
+                    arr_entries = arr_entries[arr_last]
+                dir_file.write(arr_entries.tobytes())
+                dic_terms[term] = (int_first, len(arr_entries))
+                int_first += len(arr_entries)
+        # o diretório anterior (mapeado) é usado até o novo ser gravado
+        self.close()
+        os.replace(f"{self.dir_file_name()}.tmp", self.dir_file_name())
+        self.dic_terms = dic_terms
+        self.dic_pending = {}
+        self.open()
+
+    def get_positions(self, term: str, doc_id: int) -> List[int]:
+        """
+        Posições (ordenadas) do termo no documento ou uma lista vazia caso ele não ocorra no documento
+        """
+        arr_entries = self.get_entries(term)
+        position = int(np.searchsorted(arr_entries["doc_id"], doc_id))
+        if position == len(arr_entries) or arr_entries[position]["doc_id"] != doc_id:
+            return []
+        int_start, int_size = int(arr_entries[position]["start"]), int(arr_entries[position]["size"])
+        return list(accumulate(vbyte_decode_small(self.mm_data[int_start:int_start+int_size])))
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.dic_terms
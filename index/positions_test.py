@@ -0,0 +1,58 @@
+from index.positions import *
+import pickle
+import unittest
+
+
+class PositionsIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.positions = PositionsIndex("teste_positions.idx")
+        self.positions.add_document(1, {"casa": [0, 4, 300], "verde": [1]})
+        self.positions.add_document(3, {"casa": [2]})
+        self.positions.finish_indexing()
+
+    def tearDown(self):
+        self.positions.close()
+        for str_file in ["teste_positions.idx", "teste_positions.idx.dir"]:
+            if os.path.exists(str_file):
+                os.remove(str_file)
+
+    def test_get_positions(self):
+        self.assertListEqual(self.positions.get_positions("casa", 1), [0, 4, 300])
+        self.assertListEqual(self.positions.get_positions("casa", 3), [2])
+        self.assertListEqual(self.positions.get_positions("verde", 1), [1])
+        self.assertListEqual(self.positions.get_positions("verde", 3), [])
+        self.assertListEqual(self.positions.get_positions("azul", 1), [])
+        self.assertIn("casa", self.positions)
+        self.assertNotIn("azul", self.positions)
+
+    def test_incremental(self):
+        # documentos adicionados após a finalização e documento reindexado (vale o ultimo registro)
+        self.positions.add_document(2, {"azul": [5], "casa": [7, 8]})
+        self.positions.add_document(1, {"casa": [9]})
+        self.assertListEqual(self.positions.get_positions("azul", 2), [], "Entradas pendentes só são visiveis após a finalização")
+        self.positions.finish_indexing()
+        self.assertListEqual(list(self.positions.get_entries("casa")["doc_id"]), [1, 2, 3])
+        self.assertListEqual(self.positions.get_positions("casa", 1), [9])
+        self.assertListEqual(self.positions.get_positions("casa", 2), [7, 8])
+        self.assertListEqual(self.positions.get_positions("azul", 2), [5])
+        self.assertListEqual(self.positions.get_positions("verde", 1), [1])
+
+    def test_pickle(self):
+        positions_lidas = pickle.loads(pickle.dumps(self.positions))
+        self.assertListEqual(positions_lidas.get_positions("casa", 1), [0, 4, 300])
+        positions_lidas.close()
+
+        self.positions.add_document(4, {"casa": [1]})
+        with self.assertRaises(ValueError):
+            pickle.dumps(self.positions)
+
+    def test_empty(self):
+        positions = PositionsIndex("teste_positions.idx")
+        self.assertListEqual(positions.get_positions("casa", 1), [])
+        positions.finish_indexing()
+        self.assertEqual(len(positions.get_entries("casa")), 0)
+        positions.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+from typing import List, Tuple
+import struct
+import numpy as np
+
+# quantidade de ocorrencias por bloco comprimido
+BLOCK_SIZE = 128
+# listas com até esta quantidade de ocorrencias (um único bloco) são decodificadas sem NumPy,
+# pois o custo fixo de cada operação vetorizada supera o da decodificação em Python
+SMALL_LIST_SIZE = 32
+
+
+def vbyte_encode(arr_values: np.ndarray) -> bytes:
+    """
+    Variable-byte: cada valor é gravado em 7 bits por byte, do menos para o mais significativo.
+    O bit mais alto marca o ultimo byte do valor
+    """
+    arr_values = np.asarray(arr_values, dtype=np.uint64)
+    arr_num_bytes = np.ones(len(arr_values), dtype=np.int64)
+    for int_shift in [7, 14, 21, 28, 35]:
+        arr_num_bytes += arr_values >= (1 << int_shift)
+    arr_start = np.zeros(len(arr_values), dtype=np.int64)
+    np.cumsum(arr_num_bytes[:-1], out=arr_start[1:])
+    arr_bytes = np.zeros(int(arr_num_bytes.sum()), dtype=np.uint8)
+    for int_byte in range(int(arr_num_bytes.max(initial=0))):
+        arr_mask = arr_num_bytes > int_byte
+        arr_byte = (arr_values[arr_mask] >> np.uint64(7*int_byte)) & np.uint64(0x7f)
+        arr_byte |= np.where(arr_num_bytes[arr_mask] == int_byte+1, 0x80, 0).astype(np.uint64)
+        arr_bytes[arr_start[arr_mask]+int_byte] = arr_byte
+    return arr_bytes.tobytes()
+
+
+def vbyte_decode(data: bytes) -> np.ndarray:
+    """
+    Decodifica (de forma vetorizada) todos os valores de `data` gravados por vbyte_encode
+    """
+    arr_bytes = np.frombuffer(data, dtype=np.uint8)
+    if len(arr_bytes) == 0:
+        return np.empty(0, dtype=np.uint64)
+    arr_end = np.flatnonzero(arr_bytes & 0x80)
+    arr_start = np.zeros(len(arr_end), dtype=np.int64)
+    arr_start[1:] = arr_end[:-1]+1
+    # posição de cada byte dentro do seu valor
+    arr_value = np.repeat(np.arange(len(arr_end)), arr_end-arr_start+1)
+    arr_shift = (np.arange(len(arr_bytes))-arr_start[arr_value])*7
+    arr_parts = (arr_bytes & 0x7f).astype(np.uint64) << arr_shift.astype(np.uint64)
+    return np.add.reduceat(arr_parts, arr_start)
+
+
+def bitpack_encode(arr_values: np.ndarray, int_bits: int) -> bytes:
+    """
+    Grava cada valor com exatamente `int_bits` bits (bits menos significativos primeiro)
+    """
+    if int_bits == 0 or len(arr_values) == 0:
+        return b""
+    arr_values = np.asarray(arr_values, dtype=np.uint64)
+    arr_bits = (arr_values[:, None] >> np.arange(int_bits, dtype=np.uint64)) & np.uint64(1)
+    return np.packbits(arr_bits.astype(np.uint8).ravel(), bitorder="little").tobytes()
+
+
+def bitpack_decode(data: bytes, int_count: int, int_bits: int) -> np.ndarray:
+    if int_bits == 0:
+        return np.zeros(int_count, dtype=np.uint64)
+    arr_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=int_count*int_bits, bitorder="little")
+    return arr_bits.reshape(int_count, int_bits).astype(np.uint64) @ (np.uint64(1) << np.arange(int_bits, dtype=np.uint64))
+
+
+def bitpack_decode_small(data: bytes, int_count: int, int_bits: int) -> List[int]:
+    # versão sem NumPy para poucos valores
+    int_packed = int.from_bytes(data, "little")
+    int_mask = (1 << int_bits)-1
+    return [(int_packed >> (i*int_bits)) & int_mask for i in range(int_count)]
+
+
+def vbyte_decode_small(data: bytes) -> List[int]:
+    # versão sem NumPy para poucos valores
+    lst_values = []
+    int_value = 0
+    int_shift = 0
+    for byte in data:
+        int_value |= (byte & 0x7f) << int_shift
+        if byte & 0x80:
+            lst_values.append(int_value)
+            int_value = 0
+            int_shift = 0
+        else:
+            int_shift += 7
+    return lst_values
+
+
+def bitpack_size(int_count: int, int_bits: int) -> int:
+    return (int_count*int_bits+7)//8
+
+
+class BitPackingCodec:
+    """
+    Bloco com largura fixa de bits (a menor que comporta o maior valor do bloco), no estilo do
+    PForDelta sem exceções: cabeçalho (qtd, bits dos gaps, bits das frequencias) seguido dos
+    gaps e das frequencias empacotados
+    """
+    HEADER_STRUCT = struct.Struct("<BBB")
+    # peso (2^i) de cada bit, por largura em bits
+    BIT_WEIGHTS = [np.uint64(1) << np.arange(int_bits, dtype=np.uint64) for int_bits in range(65)]
+
+    @staticmethod
+    def encode_block(arr_gaps: np.ndarray, arr_freqs: np.ndarray) -> bytes:
+        int_gap_bits = int(arr_gaps.max()).bit_length()
+        int_freq_bits = int(arr_freqs.max()).bit_length()
+        return (BitPackingCodec.HEADER_STRUCT.pack(len(arr_gaps), int_gap_bits, int_freq_bits)
+                + bitpack_encode(arr_gaps, int_gap_bits) + bitpack_encode(arr_freqs, int_freq_bits))
+
+    @staticmethod
+    def decode_block(data: bytes, int_offset: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Retorna os gaps, as frequencias e a posição do próximo bloco
+        """
+        int_count, int_gap_bits, int_freq_bits = BitPackingCodec.HEADER_STRUCT.unpack_from(data, int_offset)
+        int_offset += BitPackingCodec.HEADER_STRUCT.size
+        int_gap_size = bitpack_size(int_count, int_gap_bits)
+        int_freq_size = bitpack_size(int_count, int_freq_bits)
+        arr_gaps = bitpack_decode(data[int_offset:int_offset+int_gap_size], int_count, int_gap_bits)
+        int_offset += int_gap_size
+        arr_freqs = bitpack_decode(data[int_offset:int_offset+int_freq_size], int_count, int_freq_bits)
+        return arr_gaps, arr_freqs, int_offset+int_freq_size
+
+    @staticmethod
+    def decode_all(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodifica todos os blocos de `data`: os bits são desempacotados uma única vez
+        e cada bloco é apenas uma fatia deles
+        """
+        if len(data) > 0 and data[0] <= SMALL_LIST_SIZE:
+            # como apenas o ultimo bloco possui menos de BLOCK_SIZE ocorrencias, este é o único bloco
+            int_count, int_gap_bits, int_freq_bits = BitPackingCodec.HEADER_STRUCT.unpack_from(data, 0)
+            int_offset = BitPackingCodec.HEADER_STRUCT.size
+            int_gap_size = bitpack_size(int_count, int_gap_bits)
+            return (np.array(bitpack_decode_small(data[int_offset:int_offset+int_gap_size], int_count, int_gap_bits), dtype=np.uint64),
+                    np.array(bitpack_decode_small(data[int_offset+int_gap_size:], int_count, int_freq_bits), dtype=np.uint64))
+
+        arr_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")
+        lst_values = []
+        int_offset = 0
+        while int_offset < len(data):
+            int_count, int_gap_bits, int_freq_bits = BitPackingCodec.HEADER_STRUCT.unpack_from(data, int_offset)
+            int_offset += BitPackingCodec.HEADER_STRUCT.size
+            for int_bits in [int_gap_bits, int_freq_bits]:
+                if int_bits == 0:
+                    lst_values.append(np.zeros(int_count, dtype=np.uint64))
+                else:
+                    arr_block_bits = arr_bits[int_offset*8:int_offset*8+int_count*int_bits].reshape(int_count, int_bits)
+                    lst_values.append(arr_block_bits @ BitPackingCodec.BIT_WEIGHTS[int_bits])
+                int_offset += bitpack_size(int_count, int_bits)
+        if len(lst_values) == 0:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+        return np.concatenate(lst_values[0::2]), np.concatenate(lst_values[1::2])
+
+
+class VByteCodec:
+    """
+    Bloco variable-byte: cabeçalho (tamanho em bytes dos gaps e das frequencias) seguido deles
+    """
+    HEADER_STRUCT = struct.Struct("<HH")
+
+    @staticmethod
+    def encode_block(arr_gaps: np.ndarray, arr_freqs: np.ndarray) -> bytes:
+        gaps = vbyte_encode(arr_gaps)
+        freqs = vbyte_encode(arr_freqs)
+        return VByteCodec.HEADER_STRUCT.pack(len(gaps), len(freqs)) + gaps + freqs
+
+    @staticmethod
+    def decode_block(data: bytes, int_offset: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        int_gap_size, int_freq_size = VByteCodec.HEADER_STRUCT.unpack_from(data, int_offset)
+        int_offset += VByteCodec.HEADER_STRUCT.size
+        arr_gaps = vbyte_decode(data[int_offset:int_offset+int_gap_size])
+        int_offset += int_gap_size
+        arr_freqs = vbyte_decode(data[int_offset:int_offset+int_freq_size])
+        return arr_gaps, arr_freqs, int_offset+int_freq_size
+
+    @staticmethod
+    def decode_all(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodifica todos os blocos de `data` com uma única chamada a vbyte_decode, após remover os cabeçalhos.
+        Todos os blocos, exceto o ultimo, possuem BLOCK_SIZE gaps seguidos de BLOCK_SIZE frequencias
+        """
+        if len(data) > 0:
+            int_gap_size, int_freq_size = VByteCodec.HEADER_STRUCT.unpack_from(data, 0)
+            lst_gaps = vbyte_decode_small(data[VByteCodec.HEADER_STRUCT.size:VByteCodec.HEADER_STRUCT.size+int_gap_size]) \
+                if int_gap_size <= SMALL_LIST_SIZE else []
+            if 0 < len(lst_gaps) < BLOCK_SIZE:
+                # bloco com menos de BLOCK_SIZE ocorrencias: é o único bloco
+                return (np.array(lst_gaps, dtype=np.uint64),
+                        np.array(vbyte_decode_small(data[VByteCodec.HEADER_STRUCT.size+int_gap_size:]), dtype=np.uint64))
+
+        arr_bytes = np.frombuffer(data, dtype=np.uint8)
+        arr_is_value = np.ones(len(arr_bytes), dtype=bool)
+        int_offset = 0
+        while int_offset < len(data):
+            int_gap_size, int_freq_size = VByteCodec.HEADER_STRUCT.unpack_from(data, int_offset)
+            arr_is_value[int_offset:int_offset+VByteCodec.HEADER_STRUCT.size] = False
+            int_offset += VByteCodec.HEADER_STRUCT.size+int_gap_size+int_freq_size
+        arr_values = vbyte_decode(arr_bytes[arr_is_value].tobytes())
+
+        int_full = len(arr_values)//(2*BLOCK_SIZE)*(2*BLOCK_SIZE)
+        arr_full = arr_values[:int_full].reshape(-1, 2, BLOCK_SIZE)
+        arr_last = arr_values[int_full:]
+        return (np.concatenate([arr_full[:, 0, :].ravel(), arr_last[:len(arr_last)//2]]),
+                np.concatenate([arr_full[:, 1, :].ravel(), arr_last[len(arr_last)//2:]]))
+
+
+POSTINGS_CODECS = {"bitpack": BitPackingCodec,
+                   "vbyte": VByteCodec}
+
+
+# metadados de cada bloco (skip table), gravados antes dos blocos dos termos com mais de um bloco:
+# ultimo doc_id do bloco, maior frequencia do bloco e posição (em bytes) do bloco após a skip table
+SKIP_DTYPE = np.dtype([("last_doc_id", "<u4"), ("max_term_freq", "<u4"), ("block_offset", "<u4")])
+
+
+def num_blocks(int_doc_count: int) -> int:
+    return (int_doc_count+BLOCK_SIZE-1)//BLOCK_SIZE
+
+
+def skip_table_size(int_doc_count: int) -> int:
+    int_blocks = num_blocks(int_doc_count)
+    return int_blocks*SKIP_DTYPE.itemsize if int_blocks > 1 else 0
+
+
+def read_skip_table(data: bytes, int_doc_count: int) -> np.ndarray:
+    """
+    Retorna a skip table (array SKIP_DTYPE) das ocorrencias comprimidas de um termo com `int_doc_count` documentos
+    """
+    return np.frombuffer(data, dtype=SKIP_DTYPE, count=num_blocks(int_doc_count) if skip_table_size(int_doc_count) > 0 else 0)
+
+
+def encode_postings(arr_doc_ids: np.ndarray, arr_freqs: np.ndarray, codec=BitPackingCodec) -> bytes:
+    """
+    Comprime as ocorrencias de um termo (ordenadas por doc_id) em blocos de BLOCK_SIZE:
+    os doc_ids são gravados como a diferença (gap) para o anterior e as frequencias como freq-1.
+    Caso haja mais de um bloco, os blocos são precedidos pela skip table (SKIP_DTYPE)
+    """
+    arr_doc_ids = np.asarray(arr_doc_ids, dtype=np.uint64)
+    arr_freqs = np.asarray(arr_freqs, dtype=np.uint64)
+    arr_gaps = np.diff(arr_doc_ids, prepend=np.uint64(0))
+    lst_blocks = [codec.encode_block(arr_gaps[i:i+BLOCK_SIZE], arr_freqs[i:i+BLOCK_SIZE]-np.uint64(1))
+                    for i in range(0, len(arr_gaps), BLOCK_SIZE)]
+    if len(lst_blocks) <= 1:
+        return b"".join(lst_blocks)
+
+    arr_block_start = np.arange(0, len(arr_doc_ids), BLOCK_SIZE)
+    arr_skip = np.zeros(len(lst_blocks), dtype=SKIP_DTYPE)
+    arr_skip["last_doc_id"] = arr_doc_ids[np.minimum(arr_block_start+BLOCK_SIZE, len(arr_doc_ids))-1]
+    arr_skip["max_term_freq"] = np.maximum.reduceat(arr_freqs, arr_block_start)
+    arr_skip["block_offset"][1:] = np.cumsum([len(block) for block in lst_blocks[:-1]])
+    return arr_skip.tobytes()+b"".join(lst_blocks)
+
+
+def decode_postings(data: bytes, int_doc_count: int, codec=BitPackingCodec) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Retorna os arrays (doc_ids, frequencias) gravados por encode_postings
+    """
+    arr_gaps, arr_freqs = codec.decode_all(data[skip_table_size(int_doc_count):])
+    return np.cumsum(arr_gaps, dtype=np.uint64), arr_freqs+np.uint64(1)
@@ -0,0 +1,367 @@
+from typing import List
+import heapq
+import math
+import os
+import threading
+import numpy as np
+from index.structure import Index, HashIndex, TermOccurrence
+from index.mmap_structure import MmapIndex
+
+
+class Segment:
+    """
+    Segmento imutável de um SegmentedIndex: um MmapIndex (ver MmapIndex.compile) e o seu bitmap de
+    documentos removidos (tombstones), alinhado aos doc_ids (ordenados) do segmento e gravado em `arquivo`.del.
+    O arquivo do segmento nunca é alterado: remover um documento apenas marca o bitmap
+    """
+    def __init__(self, str_file_name: str):
+        self.str_file_name = str_file_name
+        self.index = MmapIndex(str_file_name)
+        self.arr_doc_ids = np.frombuffer(self.index.mm_index, dtype="<u4", count=self.index.num_docs,
+                                         offset=self.index.doc_ids_pos)
+        self.arr_deleted = np.zeros(self.index.num_docs, dtype=bool)
+        if os.path.exists(self.tombstones_file_name()):
+            arr_bits = np.unpackbits(np.fromfile(self.tombstones_file_name(), dtype=np.uint8))
+            self.arr_deleted[:] = arr_bits[:self.index.num_docs].astype(bool)
+        self.num_deleted = int(self.arr_deleted.sum())
+
+    @staticmethod
+    def create(index: Index, str_file_name: str) -> "Segment":
+        MmapIndex.compile(index, str_file_name).close()
+        return Segment(str_file_name)
+
+    def __getstate__(self):
+        return {"str_file_name": self.str_file_name}
+
+    def __setstate__(self, state):
+        self.__init__(state["str_file_name"])
+
+    def tombstones_file_name(self) -> str:
+        return f"{self.str_file_name}.del"
+
+    def write_tombstones(self):
+        if self.num_deleted == 0:
+            return
+        np.packbits(self.arr_deleted).tofile(f"{self.tombstones_file_name()}.tmp")
+        os.replace(f"{self.tombstones_file_name()}.tmp", self.tombstones_file_name())
+
+    def remove_files(self):
+        for str_file in [self.str_file_name, self.tombstones_file_name()]:
+            if os.path.exists(str_file):
+                os.remove(str_file)
+
+    @property
+    def num_docs(self) -> int:
+        return self.index.num_docs
+
+    @property
+    def num_live_docs(self) -> int:
+        return self.index.num_docs-self.num_deleted
+
+    @property
+    def num_live_postings(self) -> int:
+        # estimativa: as ocorrencias dos documentos removidos são proporcionais a eles
+        if self.num_docs == 0:
+            return 0
+        return int(self.index.num_postings*self.num_live_docs/self.num_docs)
+
+    def delete(self, doc_id: int) -> bool:
+        """
+        Marca o documento como removido. Retorna verdadeiro caso ele esteja (vivo) no segmento
+        """
+        position = int(np.searchsorted(self.arr_doc_ids, doc_id))
+        if position >= len(self.arr_doc_ids) or self.arr_doc_ids[position] != doc_id or self.arr_deleted[position]:
+            return False
+        self.arr_deleted[position] = True
+        self.num_deleted += 1
+        return True
+
+    def live_doc_ids(self) -> np.ndarray:
+        return self.arr_doc_ids[~self.arr_deleted]
+
+    def get_occurrence_list(self, term: str, term_id: int = None) -> List[TermOccurrence]:
+        """
+        Ocorrencias (ordenadas por doc_id) do termo nos documentos vivos. Caso `term_id` seja informado,
+        ele substitui o term_id do segmento (os term_ids de cada segmento são locais)
+        """
+        lst_occurrences = self.index.get_occurrence_list(term)
+        if self.num_deleted > 0 and len(lst_occurrences) > 0:
+            arr_positions = np.searchsorted(self.arr_doc_ids, [occur.doc_id for occur in lst_occurrences])
+            lst_occurrences = [occur for occur, bol_deleted in zip(lst_occurrences, self.arr_deleted[arr_positions].tolist())
+                                if not bol_deleted]
+        if term_id is not None:
+            for occur in lst_occurrences:
+                occur.term_id = term_id
+        return lst_occurrences
+
+    def document_count_with_term(self, term: str) -> int:
+        if self.num_deleted == 0:
+            return self.index.document_count_with_term(term)
+        return len(self.get_occurrence_list(term))
+
+
+class SegmentedIndex(Index):
+    """
+    Indice incremental formado por segmentos imutáveis (como no Lucene):
+        - os documentos novos são indexados em um segmento em memória (HashIndex), gravado em disco
+          como um novo Segment (flush) ao atingir `buffer_limit` ocorrencias ou em finish_indexing;
+        - a remoção de um documento (delete_document) marca o bitmap de tombstones dos segmentos que o possuem.
+          Para atualizar um documento, ele deve ser removido e indexado novamente (com o mesmo doc_id);
+        - uma política de merge em niveis (tiered) une, em uma thread em segundo plano, `merge_factor` segmentos
+          de um mesmo nivel (nivel = log_{merge_factor}(ocorrencias vivas/buffer_limit)) em um único segmento,
+          descartando os documentos removidos. Segmentos com mais da metade dos documentos removidos também são reescritos.
+
+    As consultas (get_occurrence_list etc.) percorrem todos os segmentos e o segmento em memória. A lista
+    de segmentos nunca é alterada, e sim substituida, de forma que uma consulta usa sempre uma lista consistente.
+    O dic_index mapeia cada termo ao seu term_id global e set_documents possui os documentos vivos
+
+    As alterações (documentos novos e removidos) só são persistidas por write, como um commit: até o próximo write,
+    os segmentos da ultima gravação (set_committed_files) não são removidos pelos merges, e sim mantidos em
+    lst_retired_segments, de forma que o indice gravado continua podendo ser lido (Index.read)
+    """
+    BUFFER_LIMIT = 100000
+    MERGE_FACTOR = 4
+
+    def __init__(self, str_directory: str = "segments", buffer_limit: int = None, merge_factor: int = None,
+                 background_merge: bool = True):
+        super().__init__()
+        self.str_directory = str_directory
+        os.makedirs(str_directory, exist_ok=True)
+        self.buffer_limit = buffer_limit if buffer_limit is not None else SegmentedIndex.BUFFER_LIMIT
+        self.merge_factor = merge_factor if merge_factor is not None else SegmentedIndex.MERGE_FACTOR
+        if self.merge_factor < 2:
+            raise ValueError(f"merge_factor deve ser pelo menos 2 (recebido: {self.merge_factor})")
+        self.background_merge = background_merge
+        self.buffer = HashIndex()
+        self.int_buffer_occurrences = 0
+        self.lst_segments = []
+        # arquivos dos segmentos da ultima gravação (write) e segmentos unidos que ainda fazem parte dela
+        self.set_committed_files = set()
+        self.lst_retired_segments = []
+        self.segment_counter = 0
+        self.num_merges = 0
+        self.start_merge_thread()
+
+    def start_merge_thread(self):
+        # lock: alterações da lista de segmentos e do buffer; merge_lock: um merge por vez
+        self.lock = threading.RLock()
+        self.merge_lock = threading.Lock()
+        self.merge_condition = threading.Condition()
+        self.bol_merge_requested = False
+        self.bol_closed = False
+        self.merge_thread = None
+        if self.background_merge:
+            self.merge_thread = threading.Thread(target=self.merge_loop, daemon=True)
+            self.merge_thread.start()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for str_attr in ["lock", "merge_lock", "merge_condition", "merge_thread"]:
+            del state[str_attr]
+        # os segmentos unidos são removidos após a gravação (ver write) e não fazem parte do indice gravado
+        state["lst_retired_segments"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # indices gravados antes de set_committed_files existir: os segmentos lidos são os da gravação
+        self.__dict__.setdefault("set_committed_files", {segment.str_file_name for segment in self.lst_segments})
+        self.start_merge_thread()
+
+    def new_segment_file_name(self) -> str:
+        str_file_name = os.path.join(self.str_directory, f"segment_{self.segment_counter}.midx")
+        while os.path.exists(str_file_name):
+            self.segment_counter += 1
+            str_file_name = os.path.join(self.str_directory, f"segment_{self.segment_counter}.midx")
+        self.segment_counter += 1
+        return str_file_name
+
+    def get_term_id(self, term: str):
+        return self.dic_index[term]
+
+    def create_index_entry(self, term_id: int) -> int:
+        return term_id
+
+    def add_index_occur(self, entry_dic_index: int, doc_id: int, term_id: int, term_freq: int):
+        raise NotImplementedError("As ocorrencias são adicionadas ao segmento em memória por SegmentedIndex.index")
+
+    def index(self, term: str, doc_id: int, term_freq: int):
+        with self.lock:
+            self.generation += 1
+            if term not in self.dic_index:
+                self.dic_index[term] = len(self.dic_index)
+            self.buffer.index(term, doc_id, term_freq)
+            self.set_documents.add(doc_id)
+            self.content_checksum = Index.update_checksum(self.content_checksum, doc_id, self.dic_index[term], term_freq)
+            self.int_buffer_occurrences += 1
+            if self.int_buffer_occurrences >= self.buffer_limit:
+                self.flush()
+
+    def flush(self):
+        """
+        Grava o segmento em memória como um novo segmento imutável e solicita um merge
+        """
+        with self.lock:
+            if self.int_buffer_occurrences == 0:
+                return
+            segment = Segment.create(self.buffer, self.new_segment_file_name())
+            self.lst_segments = self.lst_segments+[segment]
+            self.buffer = HashIndex()
+            self.int_buffer_occurrences = 0
+        self.request_merge()
+
+    def finish_indexing(self):
+        self.flush()
+        self.generation += 1
+
+    def delete_document(self, doc_id: int) -> bool:
+        """
+        Remove o documento de todos os segmentos. Retorna falso caso ele não esteja no indice
+        """
+        with self.lock:
+            if doc_id in self.buffer.set_documents:
+                # o segmento em memória não possui tombstones: ele é gravado antes da remoção
+                self.flush()
+            bol_deleted = False
+            for segment in self.lst_segments:
+                bol_deleted = segment.delete(doc_id) or bol_deleted
+            self.set_documents.discard(doc_id)
+            self.generation += 1
+            # a remoção é registrada como uma ocorrencia com term_id -1
+            self.content_checksum = Index.update_checksum(self.content_checksum, doc_id, -1, 0)
+            return bol_deleted
+
+    def snapshot(self):
+        with self.lock:
+            return self.lst_segments, self.buffer
+
+    def get_occurrence_list(self, term: str) -> List:
+        term_id = self.dic_index.get(term)
+        if term_id is None:
+            return []
+        lst_segments, buffer = self.snapshot()
+        lst_lists = [segment.get_occurrence_list(term, term_id) for segment in lst_segments]
+        lst_lists.append(sorted((TermOccurrence(occur.doc_id, term_id, occur.term_freq) for occur in buffer.get_occurrence_list(term)),
+                                key=lambda occur: occur.doc_id))
+        return list(heapq.merge(*lst_lists, key=lambda occur: occur.doc_id))
+
+    def document_count_with_term(self, term: str) -> int:
+        lst_segments, buffer = self.snapshot()
+        return sum(segment.document_count_with_term(term) for segment in lst_segments)+buffer.document_count_with_term(term)
+
+    def max_term_freq(self, term: str) -> int:
+        # limite superior: os documentos removidos não são desconsiderados
+        lst_segments, buffer = self.snapshot()
+        return max([segment.index.max_term_freq(term) for segment in lst_segments]+[buffer.max_term_freq(term)])
+
+    def segment_tier(self, segment: Segment) -> int:
+        return int(math.log(max(segment.num_live_postings, 1)/self.buffer_limit, self.merge_factor)) if segment.num_live_postings > self.buffer_limit else 0
+
+    def select_merge(self) -> List[Segment]:
+        """
+        Segmentos a serem unidos: os `merge_factor` segmentos mais antigos do menor nivel que possua
+        pelo menos `merge_factor` segmentos ou, caso não exista, um segmento com a maioria dos documentos removidos
+        """
+        lst_segments, _ = self.snapshot()
+        dic_tiers = {}
+        for segment in lst_segments:
+            dic_tiers.setdefault(self.segment_tier(segment), []).append(segment)
+        for int_tier in sorted(dic_tiers):
+            if len(dic_tiers[int_tier]) >= self.merge_factor:
+                return dic_tiers[int_tier][:self.merge_factor]
+        for segment in lst_segments:
+            if segment.num_deleted > segment.num_docs/2:
+                return [segment]
+        return []
+
+    def merge_segments(self, lst_sources: List[Segment]):
+        """
+        Une os segmentos em um novo segmento com apenas os documentos vivos. As remoções feitas durante o merge
+        são aplicadas ao novo segmento antes dele substituir os segmentos unidos
+        """
+        lst_deleted_before = [segment.arr_deleted.copy() for segment in lst_sources]
+        merged = HashIndex()
+        for segment in lst_sources:
+            for term in segment.index.vocabulary:
+                for occur in segment.get_occurrence_list(term):
+                    merged.index(term, occur.doc_id, occur.term_freq)
+        segment_merged = Segment.create(merged, self.new_segment_file_name()) if len(merged.set_documents) > 0 else None
+
+        with self.lock:
+            lst_segments = [segment for segment in self.lst_segments if segment not in lst_sources]
+            if segment_merged is not None:
+                for segment, arr_deleted_before in zip(lst_sources, lst_deleted_before):
+                    for doc_id in segment.arr_doc_ids[segment.arr_deleted & ~arr_deleted_before].tolist():
+                        segment_merged.delete(doc_id)
+                segment_merged.write_tombstones()
+                lst_segments.insert(self.lst_segments.index(lst_sources[0]), segment_merged)
+            self.lst_segments = lst_segments
+            self.num_merges += 1
+        # consultas em andamento continuam lendo os segmentos antigos, pois o mapeamento (mmap) permanece válido.
+        # Os segmentos da ultima gravação só são removidos no próximo write
+        for segment in lst_sources:
+            if segment.str_file_name in self.set_committed_files:
+                self.lst_retired_segments.append(segment)
+            else:
+                segment.remove_files()
+
+    def maybe_merge(self):
+        """
+        Executa os merges selecionados pela política até que nenhum seja necessário
+        """
+        with self.merge_lock:
+            lst_sources = self.select_merge()
+            while len(lst_sources) > 0:
+                self.merge_segments(lst_sources)
+                lst_sources = self.select_merge()
+
+    def request_merge(self):
+        if not self.background_merge:
+            self.maybe_merge()
+            return
+        with self.merge_condition:
+            self.bol_merge_requested = True
+            self.merge_condition.notify()
+
+    def merge_loop(self):
+        while True:
+            with self.merge_condition:
+                while not self.bol_merge_requested and not self.bol_closed:
+                    self.merge_condition.wait()
+                if self.bol_closed:
+                    return
+                self.bol_merge_requested = False
+            self.maybe_merge()
+
+    def wait_for_merges(self):
+        """
+        Aguarda o merge em andamento e executa os merges pendentes
+        """
+        self.maybe_merge()
+
+    def close(self):
+        with self.merge_condition:
+            self.bol_closed = True
+            self.merge_condition.notify()
+        if self.merge_thread is not None:
+            self.merge_thread.join()
+
+    def write(self, arq_index: str):
+        """
+        Grava o segmento em memória e os tombstones. O arquivo `arq_index` possui apenas a lista de segmentos
+        e o dicionario: os segmentos continuam em `str_directory`. Após a gravação, os segmentos unidos desde
+        o write anterior são removidos: apenas o indice gravado por ultimo permanece válido
+        """
+        self.flush()
+        with self.merge_lock:
+            for segment in self.lst_segments:
+                segment.write_tombstones()
+            self.set_committed_files = {segment.str_file_name for segment in self.lst_segments}
+            super().write(arq_index)
+            for segment in self.lst_retired_segments:
+                segment.remove_files()
+            self.lst_retired_segments = []
+
+    @property
+    def num_segments(self) -> int:
+        return len(self.lst_segments)
@@ -0,0 +1,144 @@
+from index.segmented_structure import *
+from index.structure import Index
+from index.index_structure_test import StructureTest
+import shutil
+import unittest
+
+
+class SegmentedStructureTest(StructureTest):
+    def setUp(self):
+        # buffer pequeno: os termos do teste são divididos em três segmentos
+        self.index = SegmentedIndex("teste_segments", buffer_limit=2, background_merge=False)
+        self.create_terms()
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree("teste_segments", ignore_errors=True)
+        super().tearDown()
+
+    def test_read_write(self):
+        self.index.write("teste_segments/teste_idx.idx")
+        idx_novo = Index.read("teste_segments/teste_idx.idx")
+        self.assertEqual(3,idx_novo.document_count)
+        self.occur_list_test(idx_novo)
+        idx_novo.close()
+
+    def test_term_id(self):
+        # os term_ids globais são mantidos em todos os segmentos
+        for term in self.index.vocabulary:
+            for occur in self.index.get_occurrence_list(term):
+                self.assertEqual(self.index.get_term_id(term), occur.term_id)
+
+    def test_occurrences_in_buffer(self):
+        self.index.index("azul",4,2)
+        self.index.index("casa",4,1)
+        self.assertListEqual([(occur.doc_id,occur.term_freq) for occur in self.index.get_occurrence_list("casa")],
+                             [(1,10),(2,3),(4,1)])
+        self.assertEqual(3,self.index.document_count_with_term("casa"))
+        self.assertEqual(4,self.index.document_count)
+
+    def test_delete_document(self):
+        self.assertTrue(self.index.delete_document(1))
+        self.assertFalse(self.index.delete_document(1), "O documento 1 já foi removido")
+        self.assertFalse(self.index.delete_document(10), "O documento 10 não existe")
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("casa")],[2])
+        self.assertListEqual(self.index.get_occurrence_list("verde"),[])
+        self.assertEqual(1,self.index.document_count_with_term("casa"))
+        self.assertEqual(2,self.index.document_count_with_term("vermelho"))
+        self.assertEqual(2,self.index.document_count)
+
+        # os tombstones são gravados junto com o indice
+        self.index.write("teste_segments/teste_idx.idx")
+        idx_novo = Index.read("teste_segments/teste_idx.idx")
+        self.assertListEqual([occur.doc_id for occur in idx_novo.get_occurrence_list("vermelho")],[2,3])
+        idx_novo.close()
+
+    def test_update_document(self):
+        # documento ainda no segmento em memória: ele é gravado antes de ser removido
+        self.index.index("amarelo",5,1)
+        self.index.delete_document(5)
+        self.index.index("azul",5,4)
+        self.index.delete_document(2)
+        self.index.index("casa",2,7)
+        self.index.finish_indexing()
+
+        self.assertListEqual([(occur.doc_id,occur.term_freq) for occur in self.index.get_occurrence_list("casa")],
+                             [(1,10),(2,7)])
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("vermelho")],[1,3])
+        self.assertListEqual(self.index.get_occurrence_list("amarelo"),[])
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("azul")],[5])
+        self.assertEqual(4,self.index.document_count)
+
+    def test_merge(self):
+        # cada documento em um segmento; a cada 4 segmentos de um nivel, eles são unidos
+        index = SegmentedIndex("teste_segments/merge", buffer_limit=2, merge_factor=4, background_merge=False)
+        for doc_id in range(16):
+            index.index("par" if doc_id % 2 == 0 else "impar",doc_id,1)
+            index.index("todos",doc_id,doc_id+1)
+            if doc_id == 6:
+                index.delete_document(3)
+        index.finish_indexing()
+
+        self.assertLess(index.num_segments,16)
+        self.assertGreater(index.num_merges,0)
+        self.assertListEqual([occur.doc_id for occur in index.get_occurrence_list("todos")],
+                             [doc_id for doc_id in range(16) if doc_id != 3])
+        self.assertListEqual([occur.term_freq for occur in index.get_occurrence_list("todos")][:4],[1,2,3,5])
+        self.assertEqual(7,index.document_count_with_term("impar"))
+        # os arquivos dos segmentos unidos são removidos
+        self.assertEqual(index.num_segments,len([file for file in os.listdir("teste_segments/merge") if file.endswith(".midx")]))
+
+        # segmentos com a maioria dos documentos removidos são reescritos
+        for doc_id in range(12):
+            index.delete_document(doc_id)
+        index.wait_for_merges()
+        self.assertListEqual([occur.doc_id for occur in index.get_occurrence_list("todos")],[12,13,14,15])
+        self.assertTrue(all(segment.num_deleted <= segment.num_docs/2 for segment in index.lst_segments))
+        index.close()
+
+    def test_merge_after_write(self):
+        # o indice gravado continua válido após merges, até a próxima gravação
+        index = SegmentedIndex("teste_segments/commit", buffer_limit=2, merge_factor=2, background_merge=False)
+        for doc_id in range(2):
+            index.index("termo",doc_id,1)
+            index.index("outro",doc_id,1)
+        index.write("teste_segments/commit/teste_idx.idx")
+        lst_committed_files = [segment.str_file_name for segment in index.lst_segments]
+
+        # o merge substitui os segmentos gravados, mas os seus arquivos são mantidos
+        index.delete_document(0)
+        for doc_id in range(2, 4):
+            index.index("termo",doc_id,1)
+            index.index("outro",doc_id,1)
+        index.finish_indexing()
+        self.assertGreater(index.num_merges,0)
+        self.assertTrue(all(os.path.exists(str_file) for str_file in lst_committed_files))
+        idx_gravado = Index.read("teste_segments/commit/teste_idx.idx")
+        self.assertListEqual([occur.doc_id for occur in idx_gravado.get_occurrence_list("termo")],[0,1])
+        idx_gravado.close()
+
+        # após a nova gravação, os segmentos unidos são removidos
+        index.write("teste_segments/commit/teste_idx.idx")
+        self.assertFalse(any(os.path.exists(str_file) for str_file in lst_committed_files
+                             if str_file not in index.set_committed_files))
+        idx_gravado = Index.read("teste_segments/commit/teste_idx.idx")
+        self.assertListEqual([occur.doc_id for occur in idx_gravado.get_occurrence_list("termo")],[1,2,3])
+        idx_gravado.close()
+        index.close()
+
+    def test_background_merge(self):
+        index = SegmentedIndex("teste_segments/background", buffer_limit=2, merge_factor=2)
+        for doc_id in range(20):
+            index.index("termo",doc_id,1)
+            index.index("outro",doc_id,1)
+            # as consultas durante os merges veem sempre todos os documentos
+            self.assertEqual(doc_id+1,len(index.get_occurrence_list("outro")))
+        index.finish_indexing()
+        index.wait_for_merges()
+        index.close()
+        self.assertLessEqual(index.num_segments,5)
+        self.assertListEqual([occur.doc_id for occur in index.get_occurrence_list("termo")],list(range(20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+from typing import Callable, List, Mapping
+import heapq
+import os
+from index.structure import Index, FileIndex, TermOccurrence
+
+
+class CollectionStatistics:
+    """
+    Estatisticas globais da coleção (somadas em todos os shards): quantidade de documentos, frequencia
+    de documentos de cada termo e soma dos tamanhos dos documentos. São usadas no ranqueamento de cada
+    shard (ver IndexPreComputedVals) para que os pesos (tf-idf e BM25) sejam os mesmos do indice não particionado
+    """
+    def __init__(self, doc_count: int, dic_document_frequency: Mapping[str, int], total_document_length: int):
+        self.doc_count = doc_count
+        self.dic_document_frequency = dic_document_frequency
+        self.total_document_length = total_document_length
+
+    def document_frequency(self, term: str, default: int = 0) -> int:
+        return self.dic_document_frequency.get(term, default)
+
+    @property
+    def avg_document_length(self) -> float:
+        return self.total_document_length/self.doc_count if self.doc_count > 0 else 0.0
+
+    def signature(self):
+        return (self.doc_count, len(self.dic_document_frequency), self.total_document_length)
+
+
+class ShardedIndex(Index):
+    """
+    Indice particionado por documento: cada documento é indexado apenas no shard `shard_of(doc_id)`
+    (doc_id módulo a quantidade de shards, como os doc_ids são densos, os shards ficam balanceados).
+    Cada shard é um indice independente (por padrão, um FileIndex com os seus próprios arquivos de ocorrencias
+    em `str_directory`), que pode ser construido em outro processo (ver HTMLIndexer.index_text_dir) e consultado
+    por outro processo (ver query.processing.ShardCoordinator).
+
+    Pela interface de Index, as ocorrencias de um termo são as dos shards intercaladas por doc_id e
+    o dic_index mapeia cada termo ao seu term_id global
+    """
+    def __init__(self, num_shards: int = 4, str_directory: str = "shards", index_factory: Callable[[int], Index] = None):
+        super().__init__()
+        if num_shards < 1:
+            raise ValueError(f"num_shards deve ser pelo menos 1 (recebido: {num_shards})")
+        self.num_shards = num_shards
+        self.str_directory = str_directory
+        os.makedirs(str_directory, exist_ok=True)
+        self.lst_shards = [index_factory(shard_number) if index_factory is not None
+                            else FileIndex(str_file_prefix=os.path.join(str_directory, f"shard_{shard_number}_occur_index"))
+                           for shard_number in range(num_shards)]
+        # shards alterados desde a ultima finalização
+        self.set_pending_shards = set()
+        self.total_document_length = 0
+        self.collection_stats = None
+
+    def shard_of(self, doc_id: int) -> int:
+        return int(doc_id) % self.num_shards
+
+    def get_term_id(self, term: str):
+        return self.dic_index[term]
+
+    def create_index_entry(self, term_id: int) -> int:
+        return term_id
+
+    def add_index_occur(self, entry_dic_index: int, doc_id: int, term_id: int, term_freq: int):
+        raise NotImplementedError("As ocorrencias são adicionadas ao shard do documento por ShardedIndex.index")
+
+    def index(self, term: str, doc_id: int, term_freq: int):
+        self.generation += 1
+        if term not in self.dic_index:
+            self.dic_index[term] = len(self.dic_index)
+        shard_number = self.shard_of(doc_id)
+        self.lst_shards[shard_number].index(term, doc_id, term_freq)
+        self.set_pending_shards.add(shard_number)
+        self.set_documents.add(doc_id)
+        self.total_document_length += term_freq
+        self.content_checksum = Index.update_checksum(self.content_checksum, doc_id, self.dic_index[term], term_freq)
+
+    def set_shard(self, shard_number: int, shard_index: Index, total_document_length: int):
+        """
+        Substitui o shard por um indice (já finalizado) construido fora deste processo, com os documentos
+        deste shard, cujos tamanhos somam `total_document_length`
+        """
+        self.generation += 1
+        self.lst_shards[shard_number] = shard_index
+        self.set_pending_shards.discard(shard_number)
+        for term in shard_index.vocabulary:
+            if term not in self.dic_index:
+                self.dic_index[term] = len(self.dic_index)
+        self.set_documents.update(shard_index.all_doc_ids())
+        self.total_document_length += total_document_length
+        # os checksums são somas: o do shard (com os seus term_ids) é somado ao do indice
+        self.content_checksum = (self.content_checksum+shard_index.content_checksum) & Index.CHECKSUM_MASK
+        self.collection_stats = None
+
+    def finish_indexing(self):
+        for shard_number in sorted(self.set_pending_shards):
+            self.lst_shards[shard_number].finish_indexing()
+        self.set_pending_shards = set()
+        self.collection_stats = None
+        self.generation += 1
+
+    def collection_statistics(self) -> CollectionStatistics:
+        """
+        Estatisticas globais dos shards (calculadas uma única vez após a finalização)
+        """
+        if self.collection_stats is None:
+            dic_document_frequency = {term: self.document_count_with_term(term) for term in self.dic_index}
+            self.collection_stats = CollectionStatistics(self.document_count, dic_document_frequency, self.total_document_length)
+        return self.collection_stats
+
+    def merge_shard_occurrences(self, term: str, lst_occurrence_lists: List[List[TermOccurrence]]) -> List[TermOccurrence]:
+        # os shards possuem term_ids locais: as ocorrencias recebem o term_id global
+        term_id = self.dic_index[term]
+        return [TermOccurrence(occur.doc_id, term_id, occur.term_freq)
+                for occur in heapq.merge(*[sorted(lst_occurrences, key=lambda occur: occur.doc_id)
+                                           for lst_occurrences in lst_occurrence_lists],
+                                         key=lambda occur: occur.doc_id)]
+
+    def get_occurrence_list(self, term: str) -> List:
+        if term not in self.dic_index:
+            return []
+        return self.merge_shard_occurrences(term, [shard.get_occurrence_list(term) for shard in self.lst_shards])
+
+    def get_occurrence_lists(self, terms: List[str]) -> Mapping[str, List]:
+        lst_shard_occurrences = [shard.get_occurrence_lists(terms) for shard in self.lst_shards]
+        return {term: self.merge_shard_occurrences(term, [dic_occurrences[term] for dic_occurrences in lst_shard_occurrences])
+                        if term in self.dic_index else []
+                for term in terms}
+
+    def document_count_with_term(self, term: str) -> int:
+        return sum(shard.document_count_with_term(term) for shard in self.lst_shards)
+
+    def max_term_freq(self, term: str) -> int:
+        return max(shard.max_term_freq(term) for shard in self.lst_shards)
@@ -0,0 +1,57 @@
+from index.sharded_structure import *
+from index.structure import HashIndex
+from index.index_structure_test import StructureTest
+import shutil
+import unittest
+
+
+class ShardedStructureTest(StructureTest):
+    def setUp(self):
+        self.index = ShardedIndex(2, "teste_shards")
+        self.create_terms()
+
+    def tearDown(self):
+        shutil.rmtree("teste_shards", ignore_errors=True)
+        super().tearDown()
+
+    def test_shards(self):
+        # doc_id módulo a quantidade de shards
+        self.assertSetEqual(self.index.lst_shards[0].set_documents, {2})
+        self.assertSetEqual(self.index.lst_shards[1].set_documents, {1,3})
+        self.assertListEqual([occur.doc_id for occur in self.index.get_occurrence_list("vermelho")],[1,2,3])
+        # os arquivos de ocorrencias de cada shard não colidem
+        self.assertTrue(self.index.lst_shards[0].str_idx_file_name.startswith("teste_shards/shard_0_"))
+        self.assertTrue(self.index.lst_shards[1].str_idx_file_name.startswith("teste_shards/shard_1_"))
+
+    def test_term_id(self):
+        for term in self.index.vocabulary:
+            for occur in self.index.get_occurrence_list(term):
+                self.assertEqual(self.index.get_term_id(term), occur.term_id)
+
+    def test_collection_statistics(self):
+        collection_statistics = self.index.collection_statistics()
+        self.assertEqual(3,collection_statistics.doc_count)
+        self.assertDictEqual({"casa":2,"vermelho":3,"verde":1},collection_statistics.dic_document_frequency)
+        self.assertEqual(0,collection_statistics.document_frequency("cinza"))
+        # tamanhos: doc. 1 = 14, doc. 2 = 4, doc. 3 = 1
+        self.assertAlmostEqual(19/3,collection_statistics.avg_document_length)
+
+    def test_set_shard(self):
+        index = ShardedIndex(2, "teste_shards/set_shard", lambda shard_number: HashIndex())
+        shard_index = HashIndex()
+        shard_index.index("azul",4,2)
+        shard_index.index("casa",6,1)
+        shard_index.finish_indexing()
+        index.index("casa",1,3)
+        index.set_shard(0, shard_index, 3)
+        index.finish_indexing()
+        self.assertListEqual([(occur.doc_id,occur.term_freq) for occur in index.get_occurrence_list("casa")],[(1,3),(6,1)])
+        self.assertEqual(3,index.document_count)
+        self.assertAlmostEqual(2,index.collection_statistics().avg_document_length)
+
+        with self.assertRaises(ValueError):
+            ShardedIndex(0, "teste_shards/invalido")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,48 @@
 from IPython.display import clear_output
-from typing import List, Set, Union
+from typing import List, Mapping, Set, Union
 from abc import abstractmethod
 from functools import total_ordering
 from os import path
 import os
 import pickle
+import shutil
+import struct
 import gc
+import heapq
+import bisect
+import uuid
+from index.lexicon import FrontCodedLexicon
 
 
 class Index:
+    # o checksum do conteudo é mantido em 64 bits (ver update_checksum)
+    CHECKSUM_MASK = 0xFFFFFFFFFFFFFFFF
+
     def __init__(self):
         self.dic_index = {}
         self.set_documents = set()
+        # tabela de documentos (index.document_table.DocumentTable) preenchida pelo HTMLIndexer:
+        # mapeia os ids externos aos doc_ids internos (densos) usados no indice
+        self.document_table = None
+        # camada opcional de posições dos termos (index.positions.PositionsIndex), preenchida pelo HTMLIndexer
+        # e usada apenas pelas consultas por frase e proximidade
+        self.positions = None
+        # geração do indice: muda sempre que o indice é alterado ou finalizado (usada para invalidar caches de consulta)
+        self.generation = 0
+        # soma (independente da ordem) do hash de cada ocorrencia indexada, ver update_checksum
+        self.content_checksum = 0
+
+    @staticmethod
+    def update_checksum(content_checksum: int, doc_id: int, term_id: int, term_freq: int) -> int:
+        """
+        Adiciona a ocorrencia ao checksum do conteudo do indice. Diferente da geração, ele é o mesmo para
+        indices com as mesmas ocorrencias e muda com o conteudo (ex. documentos diferentes com o mesmo
+        tamanho de vocabulario), sendo usado para verificar se valores gravados correspondem ao indice
+        """
+        return (content_checksum+hash((doc_id, term_id, term_freq))) & Index.CHECKSUM_MASK
 
     def index(self, term: str, doc_id: int, term_freq: int):
+        self.generation += 1
         if term not in self.dic_index:
             int_term_id = len(self.dic_index)
             self.dic_index[term] = self.create_index_entry(int_term_id)
@@ -22,15 +51,28 @@ class Index:
 
         self.add_index_occur(self.dic_index[term], doc_id, int_term_id, term_freq)
         self.set_documents.add(doc_id) 
+        self.content_checksum = Index.update_checksum(self.content_checksum, doc_id, int_term_id, term_freq)
 
     @property
     def vocabulary(self) -> List[str]:
         return list(self.dic_index.keys())
 
+    @property
+    def vocabulary_size(self) -> int:
+        # evita a cópia dos termos feita por `vocabulary`
+        return len(self.dic_index)
+
     @property
     def document_count(self) -> int:
         return len(self.set_documents)
 
+    def all_doc_ids(self) -> List[int]:
+        """
+        Ids (ordenados) de todos os documentos do indice, ex. o universo de uma consulta com NOT.
+        Indices que não mantêm os documentos em set_documents devem sobrepor este método
+        """
+        return sorted(self.set_documents)
+
     @abstractmethod
     def get_term_id(self, term: str):
         raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
@@ -51,8 +93,36 @@ class Index:
     def document_count_with_term(self, term: str) -> int:
         raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
 
+    def max_term_freq(self, term: str) -> int:
+        """
+        Maior frequencia do termo em um documento, usada como limite superior do peso do termo (ex. WAND).
+        Subclasses que a armazenam ao finalizar a indexação devem sobrepor este método
+        """
+        return max((occur.term_freq for occur in self.get_occurrence_list(term)), default=0)
+
+    def get_occurrence_lists(self, terms: List[str]) -> Mapping[str, List]:
+        """
+        Lista de ocorrencias de cada termo (ex. de um lote de consultas). Indices em arquivo
+        podem sobrepor este método para ler todos os termos em um único acesso ao arquivo
+        """
+        return {term: self.get_occurrence_list(term) for term in terms}
+
+    def get_posting_cursor(self, term: str) -> "PostingCursor":
+        """
+        Cursor (ordenado por doc_id) sobre as ocorrencias do termo. Indices com as ocorrencias
+        divididas em blocos podem sobrepor este método para evitar decodificar a lista inteira
+        """
+        return PostingCursor(PostingCursor.sort_occurrences(self.get_occurrence_list(term)))
+
+    def delete_document(self, doc_id: int) -> bool:
+        """
+        Remove o documento do indice (ex. para indexá-lo novamente após uma alteração).
+        Apenas indices incrementais (ver index.segmented_structure.SegmentedIndex) sobrepõem este método
+        """
+        raise NotImplementedError(f"{type(self).__name__} não permite remover documentos, use um SegmentedIndex")
+
     def finish_indexing(self):
-        pass
+        self.generation += 1
 
     def write(self, arq_index: str):
         with open(arq_index, 'wb') as f:
@@ -65,6 +135,31 @@ class Index:
             idx = pickle.load(f)
         return idx
 
+    def remove_files(self):
+        """
+        Remove os arquivos de trabalho criados pelo indice (ex. as ocorrencias de um FileIndex), quando ele não
+        for mais usado. Os arquivos gravados por write e write_checkpoint não são removidos. Os indices em memória
+        não possuem arquivos
+        """
+        pass
+
+    def write_checkpoint(self, arq_index: str):
+        """
+        Grava o indice (já finalizado) de forma atômica: um checkpoint anterior só é
+        substituido após o novo ser gravado por completo
+        """
+        self.write(f"{arq_index}.tmp")
+        os.replace(f"{arq_index}.tmp", arq_index)
+
+    def restore_checkpoint(self):
+        pass
+
+    @staticmethod
+    def read_checkpoint(arq_index: str):
+        idx = Index.read(arq_index)
+        idx.restore_checkpoint()
+        return idx
+
     def __str__(self):
         arr_index = []
         for str_term in self.vocabulary:
@@ -99,11 +194,13 @@ class TermOccurrence:
             return False
 
     def __lt__(self, other_occurrence: "TermOccurrence"): 
+        # ordena por term_id e, depois, por doc_id: assim as ocorrencias de um mesmo
+        # termo ficam contiguas no arquivo de indice
         if other_occurrence is not None:
-            if self.doc_id != other_occurrence.doc_id:
-                return self.doc_id < other_occurrence.doc_id 
-            else:
+            if self.term_id != other_occurrence.term_id:
                 return self.term_id < other_occurrence.term_id 
+            else:
+                return self.doc_id < other_occurrence.doc_id 
                     
         else:
             return True
@@ -133,16 +230,111 @@ class HashIndex(Index):
         return len(self.dic_index[term]) if term in self.dic_index else 0
 
 
+class PostingCursor:
+    """
+    Cursor sobre uma lista de ocorrencias ordenada por doc_id (processamento document-at-a-time)
+    """
+    def __init__(self, occurrences: List[TermOccurrence]):
+        self.occurrences = occurrences
+        self.position = 0
+
+    @staticmethod
+    def item_doc_id(item) -> int:
+        return item.doc_id
+
+    @staticmethod
+    def from_postings(postings) -> "PostingCursor":
+        """
+        Retorna `postings` caso ele já seja um cursor (ex. Index.get_posting_cursor) ou um cursor sobre a lista de ocorrencias
+        """
+        if isinstance(postings, PostingCursor):
+            return postings
+        return PostingCursor(PostingCursor.sort_occurrences(postings))
+
+    @staticmethod
+    def to_occurrence_list(postings) -> List[TermOccurrence]:
+        return postings.to_list() if isinstance(postings, PostingCursor) else postings
+
+    @staticmethod
+    def sort_occurrences(occurrences: List[TermOccurrence]) -> List[TermOccurrence]:
+        """
+        Retorna as ocorrencias ordenadas por doc_id (a propria lista, caso já esteja ordenada)
+        """
+        if all(occurrences[i].doc_id <= occurrences[i+1].doc_id for i in range(len(occurrences)-1)):
+            return occurrences
+        return sorted(occurrences, key=lambda occur: occur.doc_id)
+
+    @property
+    def current(self) -> TermOccurrence:
+        return self.occurrences[self.position] if self.position < len(self.occurrences) else None
+
+    @property
+    def doc_id(self) -> int:
+        return self.item_doc_id(self.occurrences[self.position]) if self.position < len(self.occurrences) else None
+
+    def next(self) -> TermOccurrence:
+        self.position += 1
+        return self.current
+
+    def next_geq(self, doc_id: int) -> TermOccurrence:
+        """
+        Avança até a primeira ocorrencia com doc_id >= `doc_id` por meio de uma busca exponencial
+        (galloping) a partir da posição atual, seguida de uma busca binária
+        """
+        int_size = len(self.occurrences)
+        if self.position >= int_size or self.item_doc_id(self.occurrences[self.position]) >= doc_id:
+            return self.current
+        step = 1
+        while self.position+step < int_size and self.item_doc_id(self.occurrences[self.position+step]) < doc_id:
+            step *= 2
+        self.position = bisect.bisect_left(self.occurrences, doc_id, self.position+step//2+1, min(self.position+step+1, int_size),
+                                           key=self.item_doc_id)
+        return self.current
+
+    def iter_doc_ids(self):
+        """
+        Gera os doc_ids a partir da posição atual, avançando o cursor
+        """
+        while self.position < len(self.occurrences):
+            yield self.item_doc_id(self.occurrences[self.position])
+            self.position += 1
+
+    def to_list(self) -> List[TermOccurrence]:
+        """
+        Ocorrencias a partir da posição atual
+        """
+        return self.occurrences[self.position:]
+
+    def clone(self) -> "PostingCursor":
+        """
+        Novo cursor, no inicio da mesma lista
+        """
+        return type(self)(self.occurrences)
+
+    def __len__(self):
+        return len(self.occurrences)
+
+
+class DocIdCursor(PostingCursor):
+    """
+    Cursor sobre uma lista ordenada de doc_ids (ex. resultado de uma subexpressão booleana)
+    """
+    @staticmethod
+    def item_doc_id(item) -> int:
+        return item
+
+
 class TermFilePosition:
-    def __init__(self, term_id: int, term_file_start_pos: int = None, doc_count_with_term: int = None):
+    def __init__(self, term_id: int, term_file_start_pos: int = None, doc_count_with_term: int = None, max_term_freq: int = None):
         self.term_id = term_id
 
         # a serem definidos após a indexação
         self.term_file_start_pos = term_file_start_pos
         self.doc_count_with_term = doc_count_with_term
+        self.max_term_freq = max_term_freq
 
     def __str__(self):
-        return f"term_id: {self.term_id}, doc_count_with_term: {self.doc_count_with_term}, term_file_start_pos: {self.term_file_start_pos}"
+        return f"term_id: {self.term_id}, doc_count_with_term: {self.doc_count_with_term}, term_file_start_pos: {self.term_file_start_pos}, max_term_freq: {self.max_term_freq}"
 
     def __repr__(self):
         return str(self)
@@ -150,21 +342,67 @@ class TermFilePosition:
 
 class FileIndex(Index):
     TMP_OCCURRENCES_LIMIT = 1000000
-
-    def __init__(self):
+    # quantidade máxima de runs intercaladas de uma só vez em merge_runs
+    MERGE_FAN_IN = 16
+    RUN_READ_BUFFER_OCCURRENCES = 8192
+    # cada ocorrencia ocupa 3 inteiros de 4 bytes (doc_id, term_id, term_freq)
+    OCCURRENCE_STRUCT = struct.Struct(">III")
+    OCCURRENCE_SIZE = OCCURRENCE_STRUCT.size
+    FILE_PREFIX = "occur_index"
+
+    def __init__(self, merge_fan_in: int = None, str_file_prefix: str = None):
         super().__init__()
 
         self.lst_occurrences_tmp = [None]*FileIndex.TMP_OCCURRENCES_LIMIT
         self.idx_file_counter = 0
+        # prefixo dos arquivos de ocorrencias (ex. um por shard de um ShardedIndex)
+        self.str_file_prefix = str_file_prefix if str_file_prefix is not None else FileIndex.FILE_PREFIX
+        # identificador dos arquivos criados por este indice: indices diferentes (inclusive um indice
+        # restaurado e o que o gravou) nunca usam o mesmo nome de arquivo
+        self.str_file_id = uuid.uuid4().hex
         self.str_idx_file_name = None
 
+        # runs ordenadas ainda não intercaladas (ver save_tmp_occurrences e merge_runs)
+        self.lst_run_files = []
+        self.merge_fan_in = merge_fan_in if merge_fan_in is not None else FileIndex.MERGE_FAN_IN
+        if self.merge_fan_in < 2:
+            raise ValueError(f"merge_fan_in deve ser pelo menos 2 (recebido: {self.merge_fan_in})")
+        # bytes lidos e gravados por fase: run_generation, merge_pass_1, merge_pass_2...
+        self.dic_io_stats = {}
+
         # metodos auxiliares para verifica o tamanho da lst_occurrences_tmp
         self.idx_tmp_occur_last_element  = -1
         self.idx_tmp_occur_first_element = 0
         
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # indices gravados antes do prefixo existir usam o prefixo padrão
+        self.__dict__.setdefault("str_file_prefix", FileIndex.FILE_PREFIX)
+        # o indice lido (ex. de um checkpoint ou de outro processo) cria os seus próprios arquivos
+        self.str_file_id = uuid.uuid4().hex
+        self.idx_file_counter = 0
+
     def get_tmp_occur_size(self):
         return self.idx_tmp_occur_last_element - self.idx_tmp_occur_first_element + 1
 
+    def index(self, term: str, doc_id: int, term_freq: int):
+        if type(self.dic_index) is FrontCodedLexicon:
+            self.thaw_lexicon()
+        super().index(term, doc_id, term_freq)
+
+    def freeze_lexicon(self):
+        """
+        Substitui o dic_index (termo -> TermFilePosition) pelo FrontCodedLexicon equivalente,
+        que ocupa uma fração da memória. Chamado ao final de finish_indexing
+        """
+        if type(self.dic_index) is dict and len(self.dic_index) > 0:
+            self.dic_index = FrontCodedLexicon(self.dic_index)
+
+    def thaw_lexicon(self):
+        # volta a um dict (mutável) para que novos termos e ocorrencias possam ser indexados
+        if type(self.dic_index) is FrontCodedLexicon:
+            self.dic_index = self.dic_index.to_dict()
+
     def get_term_id(self, term: str):
         return self.dic_index[term].term_id
 
@@ -174,8 +412,7 @@ class FileIndex(Index):
     def add_index_occur(self, entry_dic_index: TermFilePosition, doc_id: int, term_id: int, term_freq: int):
         self.idx_tmp_occur_last_element += 1
         self.lst_occurrences_tmp[self.idx_tmp_occur_last_element] = TermOccurrence(doc_id,term_id,term_freq) 
-        if self.idx_tmp_occur_last_element == self.TMP_OCCURRENCES_LIMIT:
-
+        if self.idx_tmp_occur_last_element == self.TMP_OCCURRENCES_LIMIT-1:
             self.save_tmp_occurrences()
 
     def next_from_list(self) -> TermOccurrence:
@@ -205,88 +442,256 @@ class FileIndex(Index):
         
         return TermOccurrence(doc_id, term_id, term_freq)
 
+    def new_idx_file_name(self) -> str:
+        # nomes já existentes são evitados: um arquivo que não foi criado por este indice nunca é sobrescrito
+        str_file_name = f"{self.str_file_prefix}_{self.str_file_id}_{self.idx_file_counter}"
+        while os.path.exists(str_file_name):
+            self.idx_file_counter += 1
+            str_file_name = f"{self.str_file_prefix}_{self.str_file_id}_{self.idx_file_counter}"
+        self.idx_file_counter += 1
+        return str_file_name
+
+    def get_phase_io_stats(self, str_phase: str) -> Mapping[str, int]:
+        if str_phase not in self.dic_io_stats:
+            self.dic_io_stats[str_phase] = {"bytes_read": 0, "bytes_written": 0}
+        return self.dic_io_stats[str_phase]
+
+    def read_run(self, str_file_name: str, dic_phase_stats: Mapping[str, int]):
+        """
+        Gera as tuplas (doc_id, term_id, term_freq) de um arquivo de run, lendo-o em blocos
+        """
+        block_size = self.RUN_READ_BUFFER_OCCURRENCES*self.OCCURRENCE_SIZE
+        with open(str_file_name, 'rb') as run_file:
+            block = run_file.read(block_size)
+            while block:
+                dic_phase_stats["bytes_read"] += len(block)
+                yield from self.OCCURRENCE_STRUCT.iter_unpack(block)
+                block = run_file.read(block_size)
+
+    def write_run(self, it_occurrences, dic_phase_stats: Mapping[str, int]) -> str:
+        """
+        Grava as tuplas (doc_id, term_id, term_freq), já ordenadas, em um novo arquivo de run
+        e retorna o nome deste arquivo
+        """
+        str_file_name = self.new_idx_file_name()
+        pack = self.OCCURRENCE_STRUCT.pack
+        with open(str_file_name, 'wb') as run_file:
+            for doc_id, term_id, term_freq in it_occurrences:
+                run_file.write(pack(doc_id, term_id, term_freq))
+            dic_phase_stats["bytes_written"] += run_file.tell()
+        return str_file_name
+
     def save_tmp_occurrences(self):
+        """
+        Ordena as ocorrencias em memória e as grava em um novo arquivo de run (imutável).
+        As runs só são intercaladas em merge_runs, assim cada ocorrencia é gravada uma
+        única vez nesta etapa
+        """
         # Ordena pelo term_id, doc_id
         #    Para eficiência, todo o código deve ser feito com o garbage collector desabilitado gc.disable()
         gc.disable()
-        self.lst_occurrences_tmp.sort(key=lambda x:(x is None, x))
-    
-        #If there is no index file created yet, create one and fill with the list
-        if self.str_idx_file_name == None: 
-            self.str_idx_file_name = "occur_index_" + str(self.idx_file_counter)
-            with open(self.str_idx_file_name, 'wb') as file:
-                next = self.next_from_list()
-                while(next is not None):
-                    next.write(file)
-                    next = self.next_from_list()
-
-        else:
-            old_file_name = self.str_idx_file_name
-            self.idx_file_counter += 1
-            self.str_idx_file_name = "occur_index_" + str(self.idx_file_counter)
-
-            with open( self.str_idx_file_name ,'wb') as new_file:
-                with open(old_file_name,'rb') as old_file:
-                    next_file = self.next_from_file(old_file)
-                    next_list =  self.next_from_list()
-                    while(next_file is not None):
-                        if(next_file < next_list):
-                            next_file.write(new_file)
-                            next_file = self.next_from_file(old_file)
-                        else:
-                            next_list.write(new_file)
-                            next_list =  self.next_from_list()
-                    while(next_list is not None):
-                        next_list.write(new_file)
-                        next_list =  self.next_from_list()
-            os.remove(old_file_name)
+        lst_occurrences = self.lst_occurrences_tmp[self.idx_tmp_occur_first_element:self.idx_tmp_occur_last_element+1]
+        lst_occurrences.sort(key=lambda occur: (occur.term_id, occur.doc_id))
+
+        dic_phase_stats = self.get_phase_io_stats("run_generation")
+        str_run_file = self.write_run(((occur.doc_id, occur.term_id, occur.term_freq) for occur in lst_occurrences),
+                                      dic_phase_stats)
+        self.lst_run_files.append(str_run_file)
+        # libera as ocorrencias já gravadas
+        self.lst_occurrences_tmp[self.idx_tmp_occur_first_element:self.idx_tmp_occur_last_element+1] = [None]*len(lst_occurrences)
         gc.enable()
 
         self.idx_tmp_occur_last_element  = -1
         self.idx_tmp_occur_first_element = 0
 
+    def merge_run_files(self, lst_run_files: List[str], dic_phase_stats: Mapping[str, int]) -> str:
+        """
+        Intercala (k-way merge por meio de um heap) as runs ordenadas em uma única run
+        e remove os arquivos intercalados
+        """
+        it_merged = heapq.merge(*[self.read_run(str_file, dic_phase_stats) for str_file in lst_run_files],
+                                key=lambda occur: (occur[1], occur[0]))
+        str_merged_file = self.write_run(it_merged, dic_phase_stats)
+        for str_file in lst_run_files:
+            os.remove(str_file)
+        return str_merged_file
+
+    def merge_runs(self):
+        """
+        Intercala todas as runs no arquivo de indice final (str_idx_file_name). Caso existam
+        mais runs do que merge_fan_in, são feitas várias passadas, cada uma intercalando
+        grupos de até merge_fan_in runs
+        """
+        if len(self.lst_run_files) == 0:
+            return
+        int_pass = 0
+        while len(self.lst_run_files) > 1:
+            int_pass += 1
+            dic_phase_stats = self.get_phase_io_stats(f"merge_pass_{int_pass}")
+            self.lst_run_files = [self.merge_run_files(self.lst_run_files[i:i+self.merge_fan_in], dic_phase_stats)
+                                    if len(self.lst_run_files[i:i+self.merge_fan_in]) > 1
+                                    else self.lst_run_files[i]
+                                  for i in range(0, len(self.lst_run_files), self.merge_fan_in)]
+        self.str_idx_file_name = self.lst_run_files[0]
+
     def finish_indexing(self):
-        if len(self.lst_occurrences_tmp) > 0:
+        if self.get_tmp_occur_size() > 0:
             self.save_tmp_occurrences()
+        self.merge_runs()
+        self.generation += 1
+        self.thaw_lexicon()
         # Sugestão: faça a navegação e obetenha um mapeamento
         # id_termo -> obj_termo armazene-o em dic_ids_por_termo
         # obj_termo é a instancia TermFilePosition correspondente ao id_termo
         dic_ids_por_termo = {}
         for str_term, obj_term in self.dic_index.items():
+            obj_term.term_file_start_pos = None
+            obj_term.doc_count_with_term = None
+            obj_term.max_term_freq = 0
             dic_ids_por_termo[obj_term.term_id] = obj_term
 
+        if self.str_idx_file_name is None:
+            self.freeze_lexicon()
+            return
+
         with open(self.str_idx_file_name, 'rb') as idx_file:
             # navega nas ocorrencias para atualizar cada termo em dic_ids_por_termo
-            # apropriadamente
+            # apropriadamente. Como o arquivo está ordenado por term_id, as ocorrencias
+            # de um termo são contiguas e começam na posição da sua primeira ocorrencia
             next_occur = self.next_from_file(idx_file)
-            size = idx_file.tell()
             pos = 0
             while(next_occur is not None):
                 obj_term = dic_ids_por_termo[next_occur.term_id]
                 if(obj_term.term_file_start_pos is None):
-                    obj_term.term_file_start_pos = pos*size
+                    obj_term.term_file_start_pos = pos*self.OCCURRENCE_SIZE
                 if(obj_term.doc_count_with_term  is None):
                     obj_term.doc_count_with_term = 1
                 else:
                     obj_term.doc_count_with_term += 1
+                obj_term.max_term_freq = max(obj_term.max_term_freq, next_occur.term_freq)
                 
-                dic_ids_por_termo[next_occur.term_id] = obj_term
                 next_occur = self.next_from_file(idx_file)
                 pos+=1
+        self.freeze_lexicon()
+
+    @staticmethod
+    def link_file(str_source: str, str_target: str):
+        """
+        Cria str_target com o mesmo conteúdo de str_source por meio de um hard link (ou de uma cópia,
+        caso o sistema de arquivos não suporte). Como os arquivos de ocorrencias são imutáveis,
+        o conteúdo permanece válido mesmo que str_source seja removido em um merge posterior.
+
+        O link é criado em um arquivo temporário que substitui str_target (ex. o arquivo de um checkpoint
+        anterior) apenas ao final, assim o conteúdo de um str_target existente nunca é alterado
+        """
+        # str_target já é um link de str_source (ex. checkpoint gravado novamente sem novas ocorrencias)
+        if os.path.exists(str_target) and os.path.samefile(str_source, str_target):
+            return
+        str_tmp_file = f"{str_target}.tmp"
+        if os.path.exists(str_tmp_file):
+            os.remove(str_tmp_file)
+        try:
+            os.link(str_source, str_tmp_file)
+        except OSError:
+            shutil.copyfile(str_source, str_tmp_file)
+        os.replace(str_tmp_file, str_target)
+
+    def remove_files(self):
+        # o arquivo de ocorrencias e as runs pendentes: como os nomes são únicos por indice (str_file_id),
+        # eles não são reaproveitados e devem ser removidos por quem cria o indice
+        for str_file in set(self.lst_run_files) | {self.str_idx_file_name}:
+            if str_file is not None and os.path.exists(str_file):
+                os.remove(str_file)
+        self.str_idx_file_name = None
+        self.lst_run_files = []
+
+    def write_checkpoint(self, arq_index: str):
+        """
+        Além do indice, o checkpoint possui o seu próprio arquivo de ocorrencias (`arq_index`.occur),
+        que não é alterado nem removido pelos merges posteriores
+        """
+        str_idx_file_name, lst_run_files = self.str_idx_file_name, self.lst_run_files
+        if str_idx_file_name is not None:
+            FileIndex.link_file(str_idx_file_name, f"{arq_index}.occur")
+            self.str_idx_file_name, self.lst_run_files = f"{arq_index}.occur", [f"{arq_index}.occur"]
+        try:
+            super().write_checkpoint(arq_index)
+        finally:
+            self.str_idx_file_name, self.lst_run_files = str_idx_file_name, lst_run_files
+
+    def restore_checkpoint(self):
+        # o indice restaurado trabalha sobre uma cópia do arquivo do checkpoint para preservá-lo
+        if self.str_idx_file_name is not None:
+            str_work_file = self.new_idx_file_name()
+            FileIndex.link_file(self.str_idx_file_name, str_work_file)
+            self.str_idx_file_name, self.lst_run_files = str_work_file, [str_work_file]
+
+    def read_occurrence_block(self, idx_file, term_file_start_pos: int, doc_count_with_term: int) -> List[TermOccurrence]:
+        """
+        Lê, com um único acesso ao arquivo, as `doc_count_with_term` ocorrencias que
+        começam em `term_file_start_pos` e as decodifica em bloco
+        """
+        idx_file.seek(term_file_start_pos)
+        block = idx_file.read(doc_count_with_term*self.OCCURRENCE_SIZE)
+        return [TermOccurrence(doc_id, term_id, term_freq)
+                    for doc_id, term_id, term_freq in self.OCCURRENCE_STRUCT.iter_unpack(block)]
 
     def get_occurrence_list(self, term: str) -> List:
-        if term in self.dic_index:
+        obj_term = self.dic_index.get(term)
+        if obj_term is None:
+            return []
+        if obj_term.term_file_start_pos is None:
+            # a indexação não foi finalizada (ou o termo não foi salvo ainda)
+            return self.get_occurrence_list_full_scan(term)
+        with open(self.str_idx_file_name,'rb') as file:
+            return self.read_occurrence_block(file, obj_term.term_file_start_pos, obj_term.doc_count_with_term)
+
+    def get_occurrence_lists(self, terms: List[str]) -> Mapping[str, List]:
+        """
+        O arquivo é aberto uma única vez e os termos são lidos na ordem em que estão nele
+        """
+        dic_occurrences = {term: [] for term in terms}
+        lst_positions = []
+        for term in dic_occurrences:
+            obj_term = self.dic_index.get(term)
+            if obj_term is None:
+                continue
+            if obj_term.term_file_start_pos is None:
+                dic_occurrences[term] = self.get_occurrence_list(term)
+            else:
+                lst_positions.append((obj_term.term_file_start_pos, obj_term.doc_count_with_term, term))
+        if len(lst_positions) > 0:
+            with open(self.str_idx_file_name,'rb') as file:
+                for term_file_start_pos, doc_count_with_term, term in sorted(lst_positions):
+                    dic_occurrences[term] = self.read_occurrence_block(file, term_file_start_pos, doc_count_with_term)
+        return dic_occurrences
+
+    def get_occurrence_list_full_scan(self, term: str) -> List:
+        """
+        Percorre todo o arquivo de ocorrencias procurando pelo termo.
+        Mantido para comparação de desempenho com get_occurrence_list
+        """
+        if term in self.dic_index and self.str_idx_file_name is not None:
             occurences = []
+            term_id = self.dic_index[term].term_id
             with open(self.str_idx_file_name,'rb') as file:
                 next_occur = self.next_from_file(file)
                 while(next_occur is not None):
-                    if next_occur.term_id == self.dic_index[term].term_id:
+                    if next_occur.term_id == term_id:
                         occurences.append(next_occur)
                     next_occur = self.next_from_file(file)
-            print()
             return occurences
         else:
             return []
 
     def document_count_with_term(self, term: str) -> int:
-        return self.dic_index[term].doc_count_with_term  if term in self.dic_index else 0
+        obj_term = self.dic_index.get(term)
+        if obj_term is None:
+            return 0
+        return obj_term.doc_count_with_term or 0
+
+    def max_term_freq(self, term: str) -> int:
+        obj_term = self.dic_index.get(term)
+        if obj_term is None or obj_term.max_term_freq is None:
+            return super().max_term_freq(term)
+        return obj_term.max_term_freq
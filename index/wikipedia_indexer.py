@@ -1,19 +1,36 @@
 from index.indexer import *
 from index.structure import *
+from index.mmap_structure import MmapIndex
+from index.positions import PositionsIndex
+from query.ranking_models import IndexPreComputedVals
 import time
+import os
 
 
 if __name__ == "__main__":
     index = HashIndex()
+    # posições dos termos (consultas por frase e NEAR), gravadas em um arquivo separado das ocorrencias
+    index.positions = PositionsIndex("wiki.pos")
     html = HTMLIndexer(index)
     html.cleaner = Cleaner(stop_words_file="stopwords.txt",
                         language="portuguese",
                         perform_stop_words_removal=True,
                         perform_accents_removal=True,
-                        perform_stemming=False)
+                        perform_stemming=False,
+                        cache_file="cleaner_cache.pkl")
     startTime = time.time()
-    html.index_text_dir("index/wiki_data")
+    html.index_text_dir("index/wiki_data", num_workers=os.cpu_count())
+    # doc_ids internos -> ids externos e titulos (titlePerDoc.dat), em um arquivo aberto por mmap na consulta
+    index.document_table.load_titles("titlePerDoc.dat")
+    index.document_table.compile("wiki.docs")
     index.write("wiki.idx")
+    # versão compilada (somente leitura) aberta por mmap, com a camada de posições: MmapIndex.read("wiki.midx")
+    MmapIndex.compile(index, "wiki.midx")
+    # valores usados pelos modelos de ranqueamento (normas, tamanhos dos documentos etc.) calculados
+    # uma única vez na indexação e lidos pelo QueryRunner
+    IndexPreComputedVals(index, "wiki_precomp.dat")
+    # o cache de preprocessamento é reaproveitado nas próximas execuções (e pelo QueryRunner)
+    html.cleaner.save_cache()
     endTime = time.time()
     print(f"Time spent: \n - {(endTime-startTime)/60} minutes \n - ({endTime-startTime} seconds)")
     
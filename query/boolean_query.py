@@ -0,0 +1,486 @@
+from typing import Callable, Iterator, List, Mapping
+from index.structure import TermOccurrence, PostingCursor, DocIdCursor
+import bisect
+import heapq
+import re
+
+
+def intersect_cursors(lst_cursors: List[PostingCursor]) -> List[int]:
+    """
+    Interseção de listas ordenadas por doc_id: os candidatos são os documentos da menor lista,
+    que são procurados nas demais (da menor para a maior) por meio de PostingCursor.next_geq (galloping).
+    Nenhum conjunto é criado e o custo depende, principalmente, do tamanho da menor lista
+    """
+    if len(lst_cursors) == 0:
+        return []
+    lst_cursors = sorted(lst_cursors, key=len)
+    lst_doc_ids = []
+    for doc_id in lst_cursors[0].iter_doc_ids():
+        for cursor in lst_cursors[1:]:
+            cursor.next_geq(doc_id)
+            if cursor.doc_id is None:
+                return lst_doc_ids
+            if cursor.doc_id != doc_id:
+                break
+        else:
+            lst_doc_ids.append(doc_id)
+    return lst_doc_ids
+
+
+def iter_union_cursors(lst_cursors: List[PostingCursor]) -> Iterator[int]:
+    """
+    União de listas ordenadas por doc_id por meio de um merge de k vias (heapq.merge):
+    os doc_ids são gerados em ordem, sem repetição, sob demanda
+    """
+    last_doc_id = None
+    for doc_id in heapq.merge(*[cursor.iter_doc_ids() for cursor in lst_cursors]):
+        if doc_id != last_doc_id:
+            yield doc_id
+            last_doc_id = doc_id
+
+
+def iter_difference_cursors(it_doc_ids: Iterator[int], lst_cursors: List[PostingCursor]) -> Iterator[int]:
+    """
+    Gera os doc_ids (ordenados) de `it_doc_ids` que não estão em nenhum dos cursores
+    """
+    for doc_id in it_doc_ids:
+        for cursor in lst_cursors:
+            cursor.next_geq(doc_id)
+            if cursor.doc_id == doc_id:
+                break
+        else:
+            yield doc_id
+
+
+def intersect_positions(lst_positions: List[int], lst_other_positions: List[int]) -> List[int]:
+    """
+    Interseção (merge) de duas listas ordenadas de posições
+    """
+    lst_common = []
+    i, j = 0, 0
+    while i < len(lst_positions) and j < len(lst_other_positions):
+        if lst_positions[i] == lst_other_positions[j]:
+            lst_common.append(lst_positions[i])
+            i += 1
+            j += 1
+        elif lst_positions[i] < lst_other_positions[j]:
+            i += 1
+        else:
+            j += 1
+    return lst_common
+
+
+def match_phrase(lst_term_positions: List[List[int]], lst_offsets: List[int]) -> bool:
+    """
+    Frase exata: existe um inicio p em que cada termo i ocorre na posição p + lst_offsets[i].
+    As posições de cada termo, deslocadas pelo seu offset, são intersectadas com os inicios possíveis
+    """
+    lst_starts = [position-lst_offsets[0] for position in lst_term_positions[0]]
+    for lst_positions, offset in zip(lst_term_positions[1:], lst_offsets[1:]):
+        lst_starts = intersect_positions(lst_starts, [position-offset for position in lst_positions])
+        if len(lst_starts) == 0:
+            return False
+    return len(lst_starts) > 0
+
+
+def match_ordered_window(lst_term_positions: List[List[int]], lst_offsets: List[int], int_slop: int) -> bool:
+    """
+    Frase com folga: os termos ocorrem na ordem da frase e a distância entre o primeiro e o ultimo
+    excede a da frase em no máximo `int_slop` posições. Para cada posição do primeiro termo, cada termo
+    seguinte é a sua primeira ocorrencia após o anterior (o que minimiza a distância)
+    """
+    int_phrase_span = lst_offsets[-1]-lst_offsets[0]
+    for first_position in lst_term_positions[0]:
+        previous_position = first_position
+        for lst_positions in lst_term_positions[1:]:
+            next_index = bisect.bisect_right(lst_positions, previous_position)
+            if next_index == len(lst_positions):
+                # as próximas posições do primeiro termo também não teriam continuação
+                return False
+            previous_position = lst_positions[next_index]
+        if previous_position-first_position-int_phrase_span <= int_slop:
+            return True
+    return False
+
+
+def match_unordered_window(lst_term_positions: List[List[int]], int_window: int) -> bool:
+    """
+    Proximidade (NEAR): existe uma ocorrencia de cada termo, em qualquer ordem, entre as quais a maior distância
+    é no máximo `int_window`. Merge de k vias das posições (heap) mantendo a posição atual de cada termo:
+    a cada passo, o termo de menor posição avança
+    """
+    heap = [(lst_positions[0], term_index, 0) for term_index, lst_positions in enumerate(lst_term_positions)]
+    heapq.heapify(heap)
+    max_position = max(position for position, _, _ in heap)
+    while True:
+        min_position, term_index, position_index = heap[0]
+        if max_position-min_position <= int_window:
+            return True
+        if position_index+1 == len(lst_term_positions[term_index]):
+            return False
+        next_position = lst_term_positions[term_index][position_index+1]
+        heapq.heapreplace(heap, (next_position, term_index, position_index+1))
+        max_position = max(max_position, next_position)
+
+
+class BooleanExpression:
+    """
+    Nó de uma expressão booleana. `cursor` retorna um cursor sobre os documentos (ordenados por doc_id)
+    que satisfazem a expressão e `iter_doc_ids` os gera sob demanda.
+
+    `map_lst_occurrences` possui a lista de ocorrencias de cada termo da expressão e `get_all_doc_ids`
+    retorna todos os doc_ids (ordenados) do indice, necessário apenas para NOT fora de um AND
+    """
+
+    def terms(self) -> List[str]:
+        raise NotImplementedError(
+            "Voce deve criar uma subclasse e a mesma deve sobrepor este método"
+        )
+
+    def positional_expressions(self) -> List["PhraseExpression"]:
+        """
+        Frases e proximidades (não negadas) da expressão
+        """
+        return []
+
+    def cursor(
+        self,
+        map_lst_occurrences: Mapping[str, List[TermOccurrence]],
+        get_all_doc_ids: Callable[[], List[int]] = None,
+    ) -> PostingCursor:
+        return DocIdCursor(list(self.iter_doc_ids(map_lst_occurrences, get_all_doc_ids)))
+
+    def iter_doc_ids(
+        self,
+        map_lst_occurrences: Mapping[str, List[TermOccurrence]],
+        get_all_doc_ids: Callable[[], List[int]] = None,
+    ) -> Iterator[int]:
+        return self.cursor(map_lst_occurrences, get_all_doc_ids).iter_doc_ids()
+
+
+class TermExpression(BooleanExpression):
+    def __init__(self, term: str):
+        self.term = term
+
+    def terms(self) -> List[str]:
+        return [self.term]
+
+    def cursor(self, map_lst_occurrences, get_all_doc_ids=None) -> PostingCursor:
+        postings = map_lst_occurrences.get(self.term, [])
+        # um mesmo termo pode aparecer mais de uma vez na expressão: cada ocorrencia usa o seu cursor
+        return postings.clone() if isinstance(postings, PostingCursor) else PostingCursor.from_postings(postings)
+
+    def __repr__(self):
+        return self.term
+
+
+class AndExpression(BooleanExpression):
+    def __init__(self, lst_children: List[BooleanExpression]):
+        self.lst_children = lst_children
+
+    def terms(self) -> List[str]:
+        return [term for child in self.lst_children for term in child.terms()]
+
+    def positional_expressions(self) -> List["PhraseExpression"]:
+        return [expression for child in self.lst_children for expression in child.positional_expressions()]
+
+    def iter_doc_ids(self, map_lst_occurrences, get_all_doc_ids=None) -> Iterator[int]:
+        # os filhos negados são removidos do resultado (A AND NOT B), sem precisar de todos os documentos
+        lst_positive = [child for child in self.lst_children if not isinstance(child, NotExpression)]
+        lst_negated = [child.child for child in self.lst_children if isinstance(child, NotExpression)]
+        if len(lst_positive) == 0:
+            return NotExpression(OrExpression(lst_negated)).iter_doc_ids(
+                map_lst_occurrences, get_all_doc_ids
+            )
+        lst_doc_ids = intersect_cursors(
+            [child.cursor(map_lst_occurrences, get_all_doc_ids) for child in lst_positive]
+        )
+        return iter_difference_cursors(
+            iter(lst_doc_ids),
+            [child.cursor(map_lst_occurrences, get_all_doc_ids) for child in lst_negated],
+        )
+
+    def __repr__(self):
+        return "(" + " AND ".join(repr(child) for child in self.lst_children) + ")"
+
+
+class OrExpression(BooleanExpression):
+    def __init__(self, lst_children: List[BooleanExpression]):
+        self.lst_children = lst_children
+
+    def terms(self) -> List[str]:
+        return [term for child in self.lst_children for term in child.terms()]
+
+    def positional_expressions(self) -> List["PhraseExpression"]:
+        return [expression for child in self.lst_children for expression in child.positional_expressions()]
+
+    def iter_doc_ids(self, map_lst_occurrences, get_all_doc_ids=None) -> Iterator[int]:
+        return iter_union_cursors(
+            [child.cursor(map_lst_occurrences, get_all_doc_ids) for child in self.lst_children]
+        )
+
+    def __repr__(self):
+        return "(" + " OR ".join(repr(child) for child in self.lst_children) + ")"
+
+
+class NotExpression(BooleanExpression):
+    def __init__(self, child: BooleanExpression):
+        self.child = child
+
+    def terms(self) -> List[str]:
+        return self.child.terms()
+
+    def iter_doc_ids(self, map_lst_occurrences, get_all_doc_ids=None) -> Iterator[int]:
+        if get_all_doc_ids is None:
+            raise ValueError(
+                "NOT fora de um AND precisa de todos os documentos do indice (get_all_doc_ids)"
+            )
+        return iter_difference_cursors(
+            iter(get_all_doc_ids()),
+            [self.child.cursor(map_lst_occurrences, get_all_doc_ids)],
+        )
+
+    def __repr__(self):
+        return f"NOT {self.child!r}"
+
+
+class PhraseExpression(BooleanExpression):
+    """
+    Frase (ex. "são paulo", termos consecutivos), frase com folga (ex. "são paulo"~2) ou proximidade
+    (ex. são NEAR/3 paulo, em qualquer ordem). `lst_offsets` possui a posição de cada termo na frase, contando
+    as palavras descartadas pelo preprocessamento (ex. stop words).
+
+    Os candidatos são os documentos com todos os termos (interseção das listas de ocorrencias, como no AND)
+    e as posições (`get_positions(termo, doc_id)`, ex. PositionsIndex.get_positions) são lidas apenas para
+    eles, termo a termo, até que algum termo não possua posições
+    """
+
+    def __init__(
+        self,
+        lst_terms: List[str],
+        lst_offsets: List[int],
+        int_slop: int = 0,
+        bol_ordered: bool = True,
+        get_positions: Callable[[str, int], List[int]] = None,
+    ):
+        self.lst_terms = lst_terms
+        self.lst_offsets = lst_offsets
+        self.int_slop = int_slop
+        self.bol_ordered = bol_ordered
+        self.get_positions = get_positions
+
+    def terms(self) -> List[str]:
+        return list(self.lst_terms)
+
+    def positional_expressions(self) -> List["PhraseExpression"]:
+        return [self]
+
+    def matches(self, doc_id: int) -> bool:
+        lst_term_positions = []
+        for term in self.lst_terms:
+            lst_positions = self.get_positions(term, doc_id)
+            if len(lst_positions) == 0:
+                return False
+            lst_term_positions.append(lst_positions)
+        if not self.bol_ordered:
+            return match_unordered_window(lst_term_positions, self.int_slop)
+        if self.int_slop == 0:
+            return match_phrase(lst_term_positions, self.lst_offsets)
+        return match_ordered_window(lst_term_positions, self.lst_offsets, self.int_slop)
+
+    def iter_doc_ids(self, map_lst_occurrences, get_all_doc_ids=None) -> Iterator[int]:
+        if self.get_positions is None:
+            raise ValueError(
+                "Consultas por frase ou proximidade precisam de um indice com posições (Index.positions)"
+            )
+        lst_candidates = intersect_cursors(
+            [TermExpression(term).cursor(map_lst_occurrences) for term in self.lst_terms]
+        )
+        return (doc_id for doc_id in lst_candidates if self.matches(doc_id))
+
+    def __repr__(self):
+        if not self.bol_ordered:
+            return "(" + f" NEAR/{self.int_slop} ".join(self.lst_terms) + ")"
+        return '"' + " ".join(self.lst_terms) + '"' + (f"~{self.int_slop}" if self.int_slop > 0 else "")
+
+
+class BooleanQueryParser:
+    """
+    Converte uma consulta como `casa AND (verde OR NOT vermelha)` em uma BooleanExpression.
+    Precedência: NEAR, NOT, AND e OR; termos adjacentes sem operador são unidos por `default_operator`
+    ("AND" ou "OR"). Cada termo é preprocessado por `preprocess_term`; termos descartados
+    por ele (ex. stop words) são removidos da expressão.
+
+    Frases são escritas entre aspas, opcionalmente com uma folga (ex. "são paulo" ou "são paulo"~2), e a
+    proximidade entre termos por NEAR/n (ex. são NEAR/3 paulo). Ambas são avaliadas por PhraseExpression
+    com as posições de `get_positions`
+    """
+
+    OPERATORS = {"AND", "OR", "NOT"}
+    TOKEN_REGEX = re.compile(r'"[^"]*"(?:~\d+)?|\(|\)|[^\s()]+')
+    PHRASE_REGEX = re.compile(r'"([^"]*)"(?:~(\d+))?')
+    NEAR_REGEX = re.compile(r"NEAR/(\d+)")
+    WORD_REGEX = re.compile(r"\w+")
+
+    def __init__(
+        self,
+        default_operator: str = "AND",
+        preprocess_term: Callable[[str], str] = None,
+        get_positions: Callable[[str, int], List[int]] = None,
+    ):
+        self.default_operator = default_operator
+        self.preprocess_term = preprocess_term
+        self.get_positions = get_positions
+
+    @staticmethod
+    def is_positional_token(token: str) -> bool:
+        return (
+            BooleanQueryParser.PHRASE_REGEX.fullmatch(token) is not None
+            or BooleanQueryParser.NEAR_REGEX.fullmatch(token) is not None
+        )
+
+    @staticmethod
+    def is_expression(str_query: str) -> bool:
+        """
+        Retorna verdadeiro caso a consulta possua algum operador, parenteses ou frase
+        """
+        return any(
+            token in BooleanQueryParser.OPERATORS
+            or token in "()"
+            or BooleanQueryParser.is_positional_token(token)
+            for token in BooleanQueryParser.TOKEN_REGEX.findall(str_query)
+        )
+
+    @staticmethod
+    def has_positional_operator(str_query: str) -> bool:
+        """
+        Retorna verdadeiro caso a consulta possua alguma frase ou operador NEAR
+        """
+        return any(
+            BooleanQueryParser.is_positional_token(token)
+            for token in BooleanQueryParser.TOKEN_REGEX.findall(str_query)
+        )
+
+    @staticmethod
+    def remove_positional_operators(str_query: str) -> str:
+        """
+        Consulta sem as aspas, folgas e operadores NEAR (ex. para obter os termos a serem ranqueados)
+        """
+        lst_tokens = []
+        for token in BooleanQueryParser.TOKEN_REGEX.findall(str_query):
+            phrase_match = BooleanQueryParser.PHRASE_REGEX.fullmatch(token)
+            if phrase_match is not None:
+                lst_tokens.append(phrase_match.group(1))
+            elif BooleanQueryParser.NEAR_REGEX.fullmatch(token) is None:
+                lst_tokens.append(token)
+        return " ".join(lst_tokens)
+
+    def parse(self, str_query: str) -> BooleanExpression:
+        """
+        Retorna a expressão da consulta ou None caso ela não possua termos
+        """
+        self.lst_tokens = BooleanQueryParser.TOKEN_REGEX.findall(str_query)
+        self.position = 0
+        expression = self.parse_or()
+        if self.position < len(self.lst_tokens):
+            raise ValueError(
+                f"Token inesperado '{self.lst_tokens[self.position]}' na consulta: {str_query}"
+            )
+        return expression
+
+    def peek(self) -> str:
+        return self.lst_tokens[self.position] if self.position < len(self.lst_tokens) else None
+
+    def starts_operand(self) -> bool:
+        token = self.peek()
+        return (
+            token is not None
+            and token not in {"AND", "OR", ")"}
+            and BooleanQueryParser.NEAR_REGEX.fullmatch(token) is None
+        )
+
+    @staticmethod
+    def combine(expression_class, lst_children: List[BooleanExpression]) -> BooleanExpression:
+        lst_children = [child for child in lst_children if child is not None]
+        if len(lst_children) == 0:
+            return None
+        if len(lst_children) == 1:
+            return lst_children[0]
+        return expression_class(lst_children)
+
+    def parse_or(self) -> BooleanExpression:
+        lst_children = [self.parse_and()]
+        while self.peek() == "OR" or (self.default_operator == "OR" and self.starts_operand()):
+            if self.peek() == "OR":
+                self.position += 1
+            lst_children.append(self.parse_and())
+        return BooleanQueryParser.combine(OrExpression, lst_children)
+
+    def parse_and(self) -> BooleanExpression:
+        lst_children = [self.parse_not()]
+        while self.peek() == "AND" or (self.default_operator == "AND" and self.starts_operand()):
+            if self.peek() == "AND":
+                self.position += 1
+            lst_children.append(self.parse_not())
+        return BooleanQueryParser.combine(AndExpression, lst_children)
+
+    def parse_not(self) -> BooleanExpression:
+        if self.peek() == "NOT":
+            self.position += 1
+            child = self.parse_not()
+            return NotExpression(child) if child is not None else None
+        return self.parse_near()
+
+    def parse_near(self) -> BooleanExpression:
+        """
+        Sequência de termos unidos por NEAR/n (com a mesma distância n)
+        """
+        lst_operands = [self.parse_atom()]
+        lst_distances = []
+        while self.peek() is not None and BooleanQueryParser.NEAR_REGEX.fullmatch(self.peek()):
+            lst_distances.append(int(BooleanQueryParser.NEAR_REGEX.fullmatch(self.peek()).group(1)))
+            self.position += 1
+            lst_operands.append(self.parse_atom())
+        if len(lst_distances) == 0:
+            return lst_operands[0]
+        if len(set(lst_distances)) > 1:
+            raise ValueError("Os operadores NEAR de uma mesma sequência devem ter a mesma distância")
+        if not all(operand is None or isinstance(operand, TermExpression) for operand in lst_operands):
+            raise ValueError("O operador NEAR deve unir termos")
+        lst_terms = [operand.term for operand in lst_operands if operand is not None]
+        if len(lst_terms) <= 1:
+            return TermExpression(lst_terms[0]) if len(lst_terms) == 1 else None
+        return PhraseExpression(
+            lst_terms, list(range(len(lst_terms))), lst_distances[0], False, self.get_positions
+        )
+
+    def parse_phrase(self, phrase_match) -> BooleanExpression:
+        # as palavras descartadas pelo preprocessamento contam na posição (offset) dos termos seguintes
+        lst_terms = []
+        lst_offsets = []
+        for offset, word in enumerate(BooleanQueryParser.WORD_REGEX.findall(phrase_match.group(1))):
+            term = self.preprocess_term(word) if self.preprocess_term is not None else word
+            if term:
+                lst_terms.append(term)
+                lst_offsets.append(offset)
+        if len(lst_terms) <= 1:
+            return TermExpression(lst_terms[0]) if len(lst_terms) == 1 else None
+        int_slop = int(phrase_match.group(2)) if phrase_match.group(2) is not None else 0
+        return PhraseExpression(lst_terms, lst_offsets, int_slop, True, self.get_positions)
+
+    def parse_atom(self) -> BooleanExpression:
+        token = self.peek()
+        if token is None or token in {"AND", "OR", ")"} or BooleanQueryParser.NEAR_REGEX.fullmatch(token):
+            raise ValueError(f"Esperava-se um termo ou '(' e não '{token}'")
+        self.position += 1
+        phrase_match = BooleanQueryParser.PHRASE_REGEX.fullmatch(token)
+        if phrase_match is not None:
+            return self.parse_phrase(phrase_match)
+        if token == "(":
+            expression = self.parse_or()
+            if self.peek() != ")":
+                raise ValueError("Parenteses não fechado na consulta")
+            self.position += 1
+            return expression
+        term = self.preprocess_term(token) if self.preprocess_term is not None else token
+        return TermExpression(term) if term else None
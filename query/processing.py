@@ -1,15 +1,37 @@
 from typing import List, Set,Mapping
 from nltk.tokenize import word_tokenize
+from collections import Counter
+from multiprocessing import Pool, Pipe, Process
+import heapq
+import itertools
+import time
+import numpy as np
 from util.time import CheckTime
-from query.ranking_models import RankingModel,VectorRankingModel, IndexPreComputedVals
-from index.structure import Index, TermOccurrence
+from query.boolean_query import BooleanQueryParser, AndExpression
+from query.query_cache import QueryCache
+from query.ranking_models import RankingModel,VectorRankingModel, BooleanRankingModel, WANDRankingModel, BM25RankingModel, OPERATOR, IndexPreComputedVals
+from index.structure import Index, TermOccurrence, PostingCursor
 from index.indexer import Cleaner
+from index.document_table import MmapDocumentTable
+from index.mmap_structure import MmapIndex
+from index.sharded_structure import ShardedIndex, CollectionStatistics
 
 class QueryRunner:
-	def __init__(self,ranking_model:RankingModel,index:Index, cleaner:Cleaner):
+	# top-n em que a precisão e a revocação são avaliadas e quantidade de respostas impressas
+	ARR_TOP = [5,10,20,50]
+	NUM_PRINTED_DOCS = 10
+
+	def __init__(self,ranking_model:RankingModel,index:Index, cleaner:Cleaner, document_table:MmapDocumentTable = None,
+				cache:QueryCache = None, shard_coordinator:"ShardCoordinator" = None):
 		self.ranking_model = ranking_model
 		self.index = index
 		self.cleaner = cleaner
+		#mapeia os doc_ids internos do indice aos ids externos e titulos (ver index.document_table)
+		self.document_table = document_table
+		#cache (opcional) das respostas e das ocorrencias dos termos
+		self.cache = cache
+		#caso o indice seja um ShardedIndex, as consultas podem ser distribuidas aos processos dos shards (ver ShardCoordinator)
+		self.shard_coordinator = shard_coordinator
 
 
 	def get_relevance_per_query(self) -> Mapping[str,Set[int]]:
@@ -17,13 +39,42 @@ class QueryRunner:
 		Adiciona a lista de documentos relevantes para um determinada query (os documentos relevantes foram
 		fornecidos no ".dat" correspondente. Por ex, belo_horizonte.dat possui os documentos relevantes da consulta "Belo Horizonte"
 
+		Os arquivos possuem os ids externos dos documentos, que são convertidos nos doc_ids (inteiros) do indice
+		por meio da tabela de documentos. Documentos que não estão na tabela são ignorados.
 		"""
 		dic_relevance_docs = {}
 		for arquiv in ["belo_horizonte","irlanda","sao_paulo"]:
 			with open(f"relevant_docs/{arquiv}.dat") as arq:
-				dic_relevance_docs[arquiv] = set(arq.readline().split(","))
+				lst_external_ids = [str_id.strip() for str_id in arq.readline().split(",") if str_id.strip() != ""]
+			dic_relevance_docs[arquiv] = self.get_internal_doc_ids(lst_external_ids)
 		return dic_relevance_docs
 
+	def get_internal_doc_ids(self, lst_external_ids:List[str]) -> Set[int]:
+		"""
+			Converte os ids externos nos doc_ids do indice. Sem tabela de documentos, o id externo é o proprio doc_id
+		"""
+		if self.document_table is None:
+			return {int(str_id) for str_id in lst_external_ids}
+		set_doc_ids = {self.document_table.get_doc_id(str_id) for str_id in lst_external_ids}
+		set_doc_ids.discard(None)
+		return set_doc_ids
+
+	def format_doc(self, doc_id:int) -> str:
+		"""
+			Titulo e id externo do documento, obtidos diretamente da tabela de documentos (mmap)
+		"""
+		if self.document_table is None:
+			return str(doc_id)
+		return f"{self.document_table.get_title(doc_id)} (doc {self.document_table.get_external_id(doc_id)})"
+
+	@staticmethod
+	def get_relevance_key(query:str) -> str:
+		"""
+			Chave da consulta no mapeamento retornado por get_relevance_per_query (ex. "São Paulo" -> "sao_paulo")
+		"""
+		str_key = query.strip().lower().translate(str.maketrans("áéíóúâêôçãẽõü", "aeiouaeocaeou"))
+		return "_".join(str_key.split())
+
 	def count_topn_relevant(self,n:int,respostas:List[int],doc_relevantes:Set[int]) -> int:
 		"""
 		Calcula a quantidade de documentos relevantes na top n posições da lista lstResposta que é a resposta a uma consulta
@@ -32,17 +83,19 @@ class QueryRunner:
 		"""
 		#print(f"Respostas: {respostas} doc_relevantes: {doc_relevantes}")
 		relevance_count = 0
-        
+		for doc_id in respostas[:n]:
+			if doc_id in doc_relevantes:
+				relevance_count += 1
 
 		return relevance_count
 
 	def compute_precision_recall(self, n:int, lst_docs:List[int],relevant_docs:Set[int]) -> (float,float):
-		
-		precision = None
-		recall = None
+		relevance_count = self.count_topn_relevant(n, lst_docs, relevant_docs)
+		precision = relevance_count/n if n > 0 else 0
+		recall = relevance_count/len(relevant_docs) if len(relevant_docs) > 0 else 0
 		return precision, recall
-    
-    def get_query_term_occurence(self, query:str) -> Mapping[str,TermOccurrence]:
+
+	def get_query_term_occurence(self, query:str) -> Mapping[str,TermOccurrence]:
 		"""
 			Preprocesse a consulta da mesma forma que foi preprocessado o texto do documento (use a classe Cleaner para isso).
 			E transforme a consulta em um dicionario em que a chave é o termo que ocorreu
@@ -52,8 +105,15 @@ class QueryRunner:
 		"""
 		#print(self.index)
 		map_term_occur = {}
-
-
+		clean_query = self.cleaner.preprocess_text(query)
+		for token, int_count in Counter(word_tokenize(clean_query)).items():
+			term = self.cleaner.preprocess_word(token)
+			if term is None or self.index.document_count_with_term(term) == 0:
+				continue
+			if term in map_term_occur:
+				map_term_occur[term].term_freq += int_count
+			else:
+				map_term_occur[term] = TermOccurrence(None, self.index.get_term_id(term), int_count)
 
 		return map_term_occur
 
@@ -62,83 +122,461 @@ class QueryRunner:
 			Retorna dicionario a lista de ocorrencia no indice de cada termo passado como parametro.
 			Caso o termo nao exista, este termo possuirá uma lista vazia
 		"""
+		dic_terms = {}
+		for term in terms:
+			dic_terms[term] = self.index.get_occurrence_list(term)
 
+		return dic_terms
 
+	def get_postings_per_term(self, terms:List) -> Mapping:
+		"""
+			Caso o modelo percorra as ocorrencias por meio de cursores, retorna o cursor de cada termo
+			(Index.get_posting_cursor, que pode saltar blocos sem decodificá-los). Caso contrário, a lista de ocorrencias
+		"""
+		bol_cursor = self.ranking_model.ACCEPTS_POSTING_CURSORS
+		if self.cache is not None:
+			self.cache.check_generation(self.index)
+			fetch = self.index.get_posting_cursor if bol_cursor else self.index.get_occurrence_list
+			return {term: self.cache.get_postings(term, bol_cursor, fetch) for term in terms}
+		if bol_cursor:
+			return {term: self.index.get_posting_cursor(term) for term in terms}
+		return self.get_occurrence_list_per_term(terms)
 
-		return dic_terms
-	def get_docs_term(self, query:str) -> List[int]:
+	def preprocess_query_term(self, token:str) -> str:
+		"""
+			Preprocessa um termo da consulta da mesma forma que os termos dos documentos. Retorna None caso ele seja descartado
+		"""
+		clean_token = self.cleaner.preprocess_text(token)
+		return self.cleaner.preprocess_word(clean_token) if clean_token else None
+
+	def get_docs_boolean_expression(self, query:str, k:int = None) -> List[int]:
+		"""
+			Retorna os documentos da expressão booleana `query` (ex. "casa AND (verde OR NOT vermelha)")
+			por meio do BooleanRankingModel. Termos sem operador são unidos pelo operador do modelo
+		"""
+		parser = BooleanQueryParser(self.ranking_model.operator.name, self.preprocess_query_term, self.get_positions())
+		expression = parser.parse(query)
+		if expression is None:
+			return [], None
+		dic_occur_per_term_query = self.get_postings_per_term(set(expression.terms()))
+		return self.ranking_model.get_ordered_docs_expression(expression, dic_occur_per_term_query, k,
+															self.index.all_doc_ids)
+
+	def get_positions(self):
+		"""
+			Função (termo, doc_id) -> posições da camada de posições do indice ou None caso o indice não a possua
+		"""
+		positions = getattr(self.index, "positions", None)
+		return positions.get_positions if positions is not None else None
+
+	def get_docs_phrase_query(self, query:str, k:int = None):
+		"""
+			Consulta com frases ou NEAR em um modelo com pesos (ex. "são paulo" capital): todos os termos são ranqueados
+			pelo modelo, mas apenas os documentos que satisfazem as frases (e proximidades) são retornados
+		"""
+		dic_query_occur, set_phrase_docs = self.get_phrase_query_occurence(query)
+		dic_occur_per_term_query = self.get_postings_per_term(list(dic_query_occur.keys()))
+		_, documents_weight = self.ranking_model.get_ordered_docs(dic_query_occur, dic_occur_per_term_query)
+		documents_weight = {doc_id: weight for doc_id, weight in documents_weight.items() if doc_id in set_phrase_docs}
+		return self.ranking_model.rank_document_ids(documents_weight, k), documents_weight
+
+	def get_phrase_query_occurence(self, query:str):
+		"""
+			Retorna as ocorrencias dos termos da consulta (sem as aspas e operadores NEAR) e o conjunto de documentos
+			que satisfazem todas as frases e proximidades da consulta. As posições são lidas apenas para os candidatos
+		"""
+		dic_query_occur = self.get_query_term_occurence(BooleanQueryParser.remove_positional_operators(query))
+		expression = BooleanQueryParser("AND", self.preprocess_query_term, self.get_positions()).parse(query)
+		lst_positional = expression.positional_expressions() if expression is not None else []
+		if len(lst_positional) == 0:
+			return dic_query_occur, set()
+		positional_expression = lst_positional[0] if len(lst_positional) == 1 else AndExpression(lst_positional)
+		dic_occur_per_term = self.get_postings_per_term(set(positional_expression.terms()))
+		return dic_query_occur, set(positional_expression.iter_doc_ids(dic_occur_per_term))
+
+	def normalize_query(self, query:str) -> str:
+		"""
+			Chave da consulta no cache: os termos (e frases) são preprocessados como o texto dos documentos (ex. caixa baixa)
+			e os operadores booleanos, NEAR e parenteses são mantidos
+		"""
+		return " ".join(token if token in BooleanQueryParser.OPERATORS or token in "()" or BooleanQueryParser.NEAR_REGEX.fullmatch(token)
+								else self.cleaner.preprocess_text(token)
+							for token in BooleanQueryParser.TOKEN_REGEX.findall(query))
+
+	def get_docs_term(self, query:str, k:int = None) -> List[int]:
 		"""
 			A partir do indice, retorna a lista de ids de documentos desta consulta
-			usando o modelo especificado pelo atributo ranking_model
+			usando o modelo especificado pelo atributo ranking_model.
+			Caso `k` seja informado, apenas os top-k documentos são retornados.
+			Caso o QueryRunner possua um cache, as respostas são armazenadas pela chave (consulta normalizada, modelo, k)
+		"""
+		if self.cache is None:
+			return self.get_docs_term_uncached(query, k)
+		def compute_docs():
+			respostas, pesos = self.get_docs_term_uncached(query, k)
+			return list(respostas), pesos
+		self.cache.check_generation(self.index)
+		lst_docs, pesos = self.cache.get_result((self.normalize_query(query), self.ranking_model, k), compute_docs)
+		#cópias: alterar a resposta (ou os pesos) retornada não altera o cache
+		return list(lst_docs), dict(pesos) if pesos is not None else None
+
+	def get_docs_term_until(self, query:str, k:int = None, deadline:float = None):
+		"""
+			Como get_docs_term, mas com um prazo `deadline` (instante de time.monotonic()). Retorna (respostas, parcial).
+
+			Nos modelos em que o peso de um documento é a soma das contribuições dos termos (vetorial e BM25, inclusive
+			como modelo do WAND), os termos são processados do mais raro (maior idf) ao mais comum e, caso o prazo
+			se esgote, são retornados os top-k considerando apenas os termos já processados. Respostas parciais não são
+			armazenadas no cache. Nos demais modelos, a consulta é processada por completo
 		"""
+		model = self.ranking_model.scoring_model if isinstance(self.ranking_model, WANDRankingModel) else self.ranking_model
+		if (deadline is None or self.shard_coordinator is not None or BooleanQueryParser.has_positional_operator(query)
+				or not isinstance(model, (VectorRankingModel, BM25RankingModel))):
+			respostas, _ = self.get_docs_term(query, k)
+			return list(respostas), False
+		if self.cache is not None:
+			self.cache.check_generation(self.index)
+			key = (self.normalize_query(query), self.ranking_model, k)
+			if key in self.cache.results:
+				return list(self.cache.results.get(key)[0]), False
+
+		dic_query_occur = self.get_query_term_occurence(query)
+		documents_weight = {}
+		bol_partial = False
+		for term in sorted(dic_query_occur.keys(), key=self.index.document_count_with_term):
+			if time.monotonic() > deadline:
+				bol_partial = True
+				break
+			occurrences = PostingCursor.to_occurrence_list(self.get_postings_per_term([term])[term])
+			_, dic_term_weights = model.get_ordered_docs({term: dic_query_occur[term]}, {term: occurrences})
+			for doc_id, weight in dic_term_weights.items():
+				documents_weight[doc_id] = documents_weight.get(doc_id, 0) + weight
+		respostas = model.rank_document_ids(documents_weight, k)
+		if self.cache is not None and not bol_partial:
+			self.cache.results.put(key, (respostas, documents_weight))
+		return list(respostas), bol_partial
+
+	def get_docs_term_uncached(self, query:str, k:int = None) -> List[int]:
+		#com um coordenador, a consulta é ranqueada pelos processos dos shards
+		if self.shard_coordinator is not None:
+			return self.shard_coordinator.search(query, k)
+
+		#consultas com operadores booleanos (AND, OR, NOT e parenteses) são avaliadas como expressões
+		if isinstance(self.ranking_model, BooleanRankingModel) and BooleanQueryParser.is_expression(query):
+			return self.get_docs_boolean_expression(query, k)
+		#nos demais modelos, as frases (e NEAR) restringem os documentos ranqueados
+		if BooleanQueryParser.has_positional_operator(query):
+			return self.get_docs_phrase_query(query, k)
+
 		#Obtenha, para cada termo da consulta, sua ocorrencia por meio do método get_query_term_occurence
-		dic_query_occur = None
+		dic_query_occur = self.get_query_term_occurence(query)
 
 		#obtenha a lista de ocorrencia dos termos da consulta
-		dic_occur_per_term_query = None
+		dic_occur_per_term_query = self.get_postings_per_term(list(dic_query_occur.keys()))
 
 
 		#utilize o ranking_model para retornar o documentos ordenados considrando dic_query_occur e dic_occur_per_term_query
-		return None
+		return self.ranking_model.get_ordered_docs(dic_query_occur, dic_occur_per_term_query, k)
+
+	def prepare_batch_query(self, query:str):
+		"""
+			Preprocessa uma consulta do lote. Retorna a tarefa (ocorrencias da consulta ou expressão booleana) e os seus termos
+		"""
+		if isinstance(self.ranking_model, BooleanRankingModel) and BooleanQueryParser.is_expression(query):
+			expression = BooleanQueryParser(self.ranking_model.operator.name, self.preprocess_query_term, self.get_positions()).parse(query)
+			return ("expression", expression), set(expression.terms()) if expression is not None else set()
+		if BooleanQueryParser.has_positional_operator(query):
+			#os documentos que satisfazem as frases são obtidos aqui, pois os processos do lote não leem posições
+			dic_query_occur, set_phrase_docs = self.get_phrase_query_occurence(query)
+			return ("phrase", (dic_query_occur, set_phrase_docs)), set(dic_query_occur.keys())
+		dic_query_occur = self.get_query_term_occurence(query)
+		return ("terms", dic_query_occur), set(dic_query_occur.keys())
+
+	def run_batch(self, lst_queries:List[str], k:int = None, num_workers:int = 1, chunk_size:int = 16):
+		"""
+			Executa um lote de consultas (ex. um log de consultas para avaliação). As consultas são preprocessadas
+			e os termos de todas elas são unidos, de forma que a lista de ocorrencias de cada termo é lida do indice uma única vez
+			(Index.get_occurrence_lists). Com `num_workers` > 1, as consultas são ranqueadas por um pool de processos
+			que compartilham (somente leitura) o modelo e as listas de ocorrencias do lote, em lotes de `chunk_size` consultas.
+
+			Retorna as respostas (na ordem de `lst_queries`) e as estatisticas do lote (ver batch_stats)
+		"""
+		start_time = time.perf_counter()
+		lst_tasks = []
+		lst_preprocess_times = []
+		set_terms = set()
+		int_num_terms = 0
+		for query in lst_queries:
+			query_start = time.perf_counter()
+			task, set_query_terms = self.prepare_batch_query(query)
+			lst_preprocess_times.append(time.perf_counter()-query_start)
+			lst_tasks.append(task)
+			set_terms |= set_query_terms
+			int_num_terms += len(set_query_terms)
+
+		fetch_start = time.perf_counter()
+		dic_occur_per_term = self.index.get_occurrence_lists(sorted(set_terms))
+		fetch_time = time.perf_counter()-fetch_start
+
+		lst_all_doc_ids = None
+		if any(task_type == "expression" for task_type, _ in lst_tasks):
+			lst_all_doc_ids = self.index.all_doc_ids()
+		lst_tasks = [(task_type, query_data, k) for task_type, query_data in lst_tasks]
+		if num_workers <= 1:
+			init_batch_worker(self.ranking_model, dic_occur_per_term, lst_all_doc_ids)
+			lst_scored = [score_batch_query(task) for task in lst_tasks]
+		else:
+			with Pool(processes=num_workers, initializer=init_batch_worker,
+						initargs=(self.ranking_model, dic_occur_per_term, lst_all_doc_ids)) as pool:
+				lst_scored = pool.map(score_batch_query, lst_tasks, chunksize=chunk_size)
+		total_time = time.perf_counter()-start_time
+
+		lst_responses = [lst_docs for lst_docs, _ in lst_scored]
+		lst_latencies = [preprocess_time+score_time for preprocess_time, (_, score_time) in zip(lst_preprocess_times, lst_scored)]
+		dic_stats = QueryRunner.batch_stats(lst_latencies, total_time)
+		dic_stats["fetch_time"] = fetch_time
+		dic_stats["num_terms"] = int_num_terms
+		dic_stats["num_unique_terms"] = len(set_terms)
+		return lst_responses, dic_stats
 
 	@staticmethod
-	def runQuery(query:str, indice:Index, indice_pre_computado:IndexPreComputedVals , map_relevantes:Mapping[str,Set[int]]):
+	def batch_stats(lst_latencies:List[float], total_time:float) -> Mapping[str,float]:
+		"""
+			Estatisticas de latencia (em segundos) de um lote: latencia de cada consulta (preprocessamento + ranqueamento),
+			média, mediana, percentis 95 e 99, máxima e a vazão (consultas por segundo) do lote
+		"""
+		arr_latencies = np.array(lst_latencies, dtype=np.float64)
+		bol_empty = len(arr_latencies) == 0
+		return {"num_queries": len(arr_latencies),
+				"latencies": lst_latencies,
+				"latency_mean": float(arr_latencies.mean()) if not bol_empty else 0.0,
+				"latency_p50": float(np.percentile(arr_latencies, 50)) if not bol_empty else 0.0,
+				"latency_p95": float(np.percentile(arr_latencies, 95)) if not bol_empty else 0.0,
+				"latency_p99": float(np.percentile(arr_latencies, 99)) if not bol_empty else 0.0,
+				"latency_max": float(arr_latencies.max()) if not bol_empty else 0.0,
+				"total_time": total_time,
+				"queries_per_second": len(arr_latencies)/total_time if total_time > 0 else 0.0}
+
+	@staticmethod
+	def create_ranking_model(str_model:str, index:Index, indice_pre_computado:IndexPreComputedVals) -> RankingModel:
+		"""
+			Cria o modelo de ranqueamento pelo nome: booleano_and, booleano_or, vetorial, wand
+			(modelo vetorial com poda dinamica dos top-k), bm25 ou wand_bm25 (BM25 com poda dinamica dos top-k)
+		"""
+		if str_model == "booleano_and":
+			return BooleanRankingModel(OPERATOR.AND)
+		if str_model == "booleano_or":
+			return BooleanRankingModel(OPERATOR.OR)
+		if str_model == "vetorial":
+			return VectorRankingModel(indice_pre_computado)
+		if str_model == "wand":
+			return WANDRankingModel(VectorRankingModel(indice_pre_computado), index)
+		if str_model == "bm25":
+			return BM25RankingModel(indice_pre_computado)
+		if str_model == "wand_bm25":
+			return WANDRankingModel(BM25RankingModel(indice_pre_computado), index)
+		raise ValueError(f"Modelo de ranqueamento desconhecido: {str_model}")
+
+	@staticmethod
+	def runQuery(query:str, indice:Index, indice_pre_computado:IndexPreComputedVals , map_relevantes:Mapping[str,Set[int]],
+				cleaner:Cleaner, ranking_model:RankingModel = None, document_table:MmapDocumentTable = None,
+				cache:QueryCache = None):
 		"""
 			Para um daterminada consulta `query` é extraído do indice `index` os documentos mais relevantes, considerando 
 			um modelo informado pelo usuário. O `indice_pre_computado` possui valores précalculados que auxiliarão na tarefa. 
 			Além disso, para algumas consultas, é impresso a precisão e revocação nos top 5, 10, 20 e 50. Essas consultas estão
 			Especificadas em `map_relevantes` em que a chave é a consulta e o valor é o conjunto de ids de documentos relevantes
-			para esta consulta.
+			para esta consulta. Caso `document_table` seja informada, as respostas são impressas com os seus titulos.
+			O `cache` (QueryCache) é compartilhado entre as consultas, evitando reprocessar as consultas (e termos) repetidos.
 		"""
 		time_checker = CheckTime()
 
-		#PEça para usuario selecionar entre Booleano ou modelo vetorial para intanciar o QueryRunner
-		#apropriadamente. NO caso do booleano, vc deve pedir ao usuario se será um "and" ou "or" entre os termos.
-		#abaixo, existem exemplos fixos.
-		qr = QueryRunner(indice, VectorRankingModel(indice_pre_computado))
+		#caso nenhum modelo seja informado, é usado o modelo vetorial
+		if ranking_model is None:
+			ranking_model = VectorRankingModel(indice_pre_computado)
+		qr = QueryRunner(ranking_model, indice, cleaner, document_table, cache)
 		time_checker.print_delta("Query Creation")
 
 
-		#Utilize o método get_docs_term para obter a lista de documentos que responde esta consulta
-		resposta = None
-		time_checker.print_delta("anwered with {len(respostas)} docs")
+		#apenas os top-n necessários (o maior n avaliado) são selecionados
+		respostas, _ = qr.get_docs_term(query, k=max(QueryRunner.ARR_TOP))
+		respostas = list(respostas)
+		time_checker.print_delta(f"anwered with {len(respostas)} docs")
 
-		#nesse if, vc irá verificar se o termo possui documentos relevantes associados a ele
-		#se possuir, vc deverá calcular a Precisao e revocação nos top 5, 10, 20, 50.
-		#O for que fiz abaixo é só uma sugestao e o metododo countTopNRelevants podera auxiliar no calculo da revocacao e precisao
-		if(True):
-			arr_top = [5,10,20,50]
-			revocacao = 0
-			precisao = 0
-			for n in arr_top:
-				revocacao = 0#substitua aqui pelo calculo da revocacao topN
-				precisao = 0#substitua aqui pelo calculo da revocacao topN
-				print("Precisao @{n}: {precisao}")
-				print("Recall @{n}: {revocacao}")
+		#se a consulta possuir documentos relevantes associados, calcula a precisão e a revocação nos top 5, 10, 20, 50.
+		str_relevance_key = QueryRunner.get_relevance_key(query)
+		if(str_relevance_key in map_relevantes):
+			for n in QueryRunner.ARR_TOP:
+				precisao, revocacao = qr.compute_precision_recall(n, respostas, map_relevantes[str_relevance_key])
+				print(f"Precisao @{n}: {precisao}")
+				print(f"Recall @{n}: {revocacao}")
 
-		#imprima aas top 10 respostas
+		#imprima aas top 10 respostas: apenas os titulos delas são lidos da tabela de documentos
+		for posicao, doc_id in enumerate(respostas[:QueryRunner.NUM_PRINTED_DOCS], 1):
+			print(f"{posicao}: {qr.format_doc(doc_id)}")
+		return respostas
 
 	@staticmethod
 	def main():
-		#leia o indice (base da dados fornecida)
-		index = None
-
-		#Checagem se existe um documento (apenas para teste, deveria existir)
-		print(f"Existe o doc? index.hasDocId(105047)")
+		#leia o indice compilado (base da dados fornecida): aberto por mmap, com a camada de posições
+		index = MmapIndex.read("wiki.midx")
+		cleaner = Cleaner(stop_words_file="stopwords.txt",
+						language="portuguese",
+						perform_stop_words_removal=True,
+						perform_accents_removal=True,
+						perform_stemming=False,
+						cache_file="cleaner_cache.pkl")
 
 		#Instancie o IndicePreCompModelo para pr ecomputar os valores necessarios para a query
 		print("Precomputando valores atraves do indice...");
 		check_time = CheckTime()
-        
-
-
-
+		idx_pre_com = IndexPreComputedVals(index, "wiki_precomp.dat")
 		check_time.print_delta("Precomputou valores")
 
+		#tabela de documentos compilada na indexação (ids externos e titulos por doc_id)
+		document_table = MmapDocumentTable.read("wiki.docs")
+
 		#encontra os docs relevantes
-		map_relevance = None
+		map_relevance = QueryRunner(None, index, cleaner, document_table).get_relevance_per_query()
 		
-		print("Fazendo query...")
+		str_model = input("Modelo (booleano_and, booleano_or, vetorial, wand, bm25, wand_bm25) [wand]: ").strip() or "wand"
+		ranking_model = QueryRunner.create_ranking_model(str_model, index, idx_pre_com)
+		cache = QueryCache()
+
 		#aquui, peça para o usuário uma query (voce pode deixar isso num while ou fazer um interface grafica se estiver bastante animado ;)
-		query = "São Paulo";
-		runQuery(query,idx, idxPreCom,mapRelevances);
+		query = input("Consulta (vazio para sair): ")
+		while query.strip() != "":
+			print("Fazendo query...")
+			QueryRunner.runQuery(query, index, idx_pre_com, map_relevance, cleaner, ranking_model, document_table, cache)
+			print(f"Cache: {cache.stats()}")
+			query = input("Consulta (vazio para sair): ")
+
+class ShardCoordinator:
+	"""
+		Distribui as consultas aos shards de um ShardedIndex (scatter-gather): cada shard é atendido por um processo
+		que recebe as consultas por um pipe, as ranqueia com o seu próprio QueryRunner e retorna os seus top-k (e os pesos deles).
+		Os top-k dos shards são intercalados nos top-k globais.
+
+		Os processos usam as estatisticas globais da coleção (ShardedIndex.collection_statistics): quantidade de documentos,
+		frequencia de documentos de cada termo e tamanho médio dos documentos. Assim, os pesos (vetorial, wand e bm25) são
+		os mesmos do indice não particionado. Nos modelos booleanos, os documentos dos shards são intercalados por doc_id
+	"""
+	def __init__(self, index:ShardedIndex, str_model:str, cleaner:Cleaner):
+		self.index = index
+		self.str_model = str_model
+		self.cleaner = cleaner
+		self.lst_connections = []
+		self.lst_processes = []
+
+	def start(self):
+		collection_statistics = self.index.collection_statistics()
+		for shard_index in self.index.lst_shards:
+			connection, worker_connection = Pipe()
+			process = Process(target=run_shard_worker, daemon=True,
+								args=(worker_connection, shard_index, self.str_model, collection_statistics, self.cleaner))
+			process.start()
+			worker_connection.close()
+			self.lst_connections.append(connection)
+			self.lst_processes.append(process)
+		#aguarda os processos precomputarem os valores dos seus shards
+		for connection in self.lst_connections:
+			ShardCoordinator.receive(connection)
+		return self
+
+	def close(self):
+		for connection in self.lst_connections:
+			connection.send(None)
+			connection.close()
+		for process in self.lst_processes:
+			process.join()
+		self.lst_connections = []
+		self.lst_processes = []
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	@staticmethod
+	def receive(connection):
+		result = connection.recv()
+		if isinstance(result, Exception):
+			raise result
+		return result
+
+	def search(self, query:str, k:int = None):
+		"""
+			Envia a consulta a todos os shards e, em seguida, intercala as respostas deles. Retorna (respostas, pesos)
+		"""
+		for connection in self.lst_connections:
+			connection.send((query, k))
+		return ShardCoordinator.merge_results([ShardCoordinator.receive(connection) for connection in self.lst_connections], k)
+
+	@staticmethod
+	def merge_results(lst_results, k:int = None):
+		"""
+			Top-k globais a partir dos top-k (respostas, pesos) de cada shard: como cada documento está em um único shard,
+			os top-k globais estão entre os top-k dos shards
+		"""
+		if all(pesos is None for _, pesos in lst_results):
+			return list(itertools.islice(heapq.merge(*[respostas for respostas, _ in lst_results]), k)), None
+		documents_weight = {}
+		for respostas, pesos in lst_results:
+			for doc_id in respostas:
+				documents_weight[doc_id] = pesos[doc_id]
+		if k is None:
+			return sorted(documents_weight, key=RankingModel.document_order(documents_weight)), documents_weight
+		return heapq.nsmallest(k, documents_weight.keys(), key=RankingModel.document_order(documents_weight)), documents_weight
+
+def run_shard_worker(connection, shard_index:Index, str_model:str, collection_statistics:CollectionStatistics, cleaner:Cleaner):
+	"""
+		Processo de um shard do ShardCoordinator: recebe (consulta, k) pelo pipe e envia os top-k do shard
+		com os seus pesos, até receber None
+	"""
+	idx_pre_comp = IndexPreComputedVals(shard_index, collection_statistics=collection_statistics)
+	qr = QueryRunner(QueryRunner.create_ranking_model(str_model, shard_index, idx_pre_comp), shard_index, cleaner)
+	connection.send("ready")
+	message = connection.recv()
+	while message is not None:
+		query, k = message
+		try:
+			respostas, pesos = qr.get_docs_term(query, k)
+			respostas = list(respostas)
+			connection.send((respostas, {doc_id: pesos[doc_id] for doc_id in respostas} if pesos is not None else None))
+		except Exception as e:
+			connection.send(e)
+		message = connection.recv()
+	connection.close()
+
+# modelo e listas de ocorrencias do lote usados por cada processo do pool de QueryRunner.run_batch
+batch_worker_context = None
+
+def init_batch_worker(ranking_model:RankingModel, dic_occur_per_term:Mapping[str, List[TermOccurrence]], lst_all_doc_ids:List[int]):
+	global batch_worker_context
+	batch_worker_context = (ranking_model, dic_occur_per_term, lst_all_doc_ids)
+
+def score_batch_query(task):
+	"""
+		Ranqueia uma consulta do lote. Retorna as respostas e o tempo gasto
+	"""
+	ranking_model, dic_occur_per_term, lst_all_doc_ids = batch_worker_context
+	task_type, query_data, k = task
+	start = time.perf_counter()
+	if query_data is None:
+		respostas = []
+	elif task_type == "expression":
+		dic_occur = {term: dic_occur_per_term[term] for term in query_data.terms()}
+		respostas, _ = ranking_model.get_ordered_docs_expression(query_data, dic_occur, k, lambda: lst_all_doc_ids)
+	elif task_type == "phrase":
+		dic_query_occur, set_phrase_docs = query_data
+		dic_occur = {term: dic_occur_per_term[term] for term in dic_query_occur}
+		_, documents_weight = ranking_model.get_ordered_docs(dic_query_occur, dic_occur)
+		respostas = ranking_model.rank_document_ids({doc_id: weight for doc_id, weight in documents_weight.items() if doc_id in set_phrase_docs}, k)
+	else:
+		dic_occur = {term: dic_occur_per_term[term] for term in query_data}
+		respostas, _ = ranking_model.get_ordered_docs(query_data, dic_occur, k)
+	return list(respostas), time.perf_counter()-start
+
+if __name__ == "__main__":
+	QueryRunner.main()
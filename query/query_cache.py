@@ -0,0 +1,72 @@
+from typing import Callable, Hashable, Mapping
+import sys
+from util.cache import LRUCache, ByteBudgetLRUCache
+from index.structure import Index, PostingCursor
+from index.compressed_structure import BlockPostingCursor
+from index.postings_codec import BLOCK_SIZE
+
+
+def estimate_postings_size(postings) -> int:
+    """
+    Estimativa (em bytes) da memória ocupada por uma lista de ocorrencias ou por um cursor
+    """
+    if isinstance(postings, BlockPostingCursor):
+        # as ocorrencias comprimidas, a skip table e um bloco decodificado (doc_ids e frequencias)
+        return (sys.getsizeof(postings.data)+3*sys.getsizeof(postings.lst_last_doc_ids)
+                + 2*BLOCK_SIZE*(sys.getsizeof(2**20)+8))
+    if isinstance(postings, PostingCursor):
+        postings = postings.occurrences
+    if len(postings) == 0:
+        return sys.getsizeof(postings)
+    obj_first = postings[0]
+    int_item_size = sys.getsizeof(obj_first)
+    if hasattr(obj_first, "__dict__"):
+        int_item_size += sys.getsizeof(obj_first.__dict__)
+    return sys.getsizeof(postings)+len(postings)*int_item_size
+
+
+class QueryCache:
+    """
+    Cache de consultas em dois niveis usado pelo QueryRunner:
+        - results: respostas das consultas, pela chave (consulta normalizada, modelo de ranqueamento, k);
+        - postings: ocorrencias (ou cursores) de cada termo, limitadas a `postings_cache_bytes` bytes (LRU).
+
+    Ambos são esvaziados sempre que o indice (ou a sua geração, ver Index.generation) muda
+    """
+    RESULT_CACHE_SIZE = 10000
+    POSTINGS_CACHE_BYTES = 64*2**20
+
+    def __init__(self, result_cache_size: int = None, postings_cache_bytes: int = None):
+        self.results = LRUCache(result_cache_size if result_cache_size is not None else QueryCache.RESULT_CACHE_SIZE)
+        self.postings = ByteBudgetLRUCache(postings_cache_bytes if postings_cache_bytes is not None else QueryCache.POSTINGS_CACHE_BYTES,
+                                           estimate_postings_size)
+        self.index = None
+        self.generation = None
+
+    def check_generation(self, index: Index):
+        """
+        Esvazia os caches caso o indice tenha sido alterado desde que as entradas foram armazenadas
+        """
+        if index is not self.index or index.generation != self.generation:
+            self.results.clear()
+            self.postings.clear()
+            self.index = index
+            self.generation = index.generation
+
+    def get_result(self, key: Hashable, compute: Callable):
+        return self.results.get_or_compute(key, lambda _: compute())
+
+    def get_postings(self, term: str, bol_cursor: bool, fetch: Callable[[str], object]):
+        """
+        Ocorrencias do termo, lidas por `fetch` apenas caso não estejam em cache. Como os cursores
+        guardam a posição atual, é retornada uma cópia (clone) do cursor armazenado
+        """
+        postings = self.postings.get_or_compute((term, bol_cursor), lambda key: fetch(key[0]))
+        return postings.clone() if bol_cursor else postings
+
+    def stats(self) -> Mapping[str, Mapping]:
+        return {"results": self.results.stats(), "postings": self.postings.stats()}
+
+    def clear(self):
+        self.results.clear()
+        self.postings.clear()
@@ -1,66 +1,234 @@
 from typing import List
 from abc import abstractmethod
-from typing import List, Set, Mapping
-from index.structure import TermOccurrence
+from typing import List, Set, Mapping, Iterator, Callable
+from index.structure import TermOccurrence, PostingCursor
+from query.boolean_query import (
+    BooleanExpression,
+    intersect_cursors,
+    iter_union_cursors,
+)
 import math
+import heapq
+import itertools
+import numpy as np
+import os
+import pickle
 from enum import Enum
 
 
 class IndexPreComputedVals:
-    def __init__(self, index):
+    # sem estatisticas da coleção, são usadas as do próprio indice (ver __init__)
+    collection_statistics = None
+
+    def __init__(
+        self, index, precomputed_file: str = None, collection_statistics=None
+    ):
+        """
+        Caso `precomputed_file` seja informado, os valores são lidos deste arquivo (se ele existir
+        e corresponder ao indice) ou, caso contrário, calculados e gravados nele.
+
+        Caso `collection_statistics` (index.sharded_structure.CollectionStatistics) seja informado, o indice
+        é um shard: a quantidade de documentos, o idf e o tamanho médio dos documentos são os da coleção
+        """
         self.index = index
+        self.collection_statistics = collection_statistics
+        if precomputed_file is not None and os.path.exists(precomputed_file) and self.read(precomputed_file):
+            return
         self.precompute_vals()
+        if precomputed_file is not None:
+            self.write(precomputed_file)
 
     def precompute_vals(self):
         """
         Inicializa os atributos por meio do indice (idx):
             doc_count: o numero de documentos que o indice possui
+            idf: o idf de cada termo do vocabulario
             document_norm: A norma por documento (cada termo é presentado pelo seu peso (tfxidf))
+            min_document_norm: a menor norma positiva
+            document_length: o tamanho (soma das frequencias dos termos) de cada documento
+            avg_document_length: o tamanho médio dos documentos (usados pelo BM25)
+            min_document_length: o menor tamanho de documento (usado no limite superior do BM25 no WANDRankingModel)
+
+        É feita uma única passada pelas ocorrencias de cada termo, acumulando o quadrado
+        do tf-idf e a frequencia de cada ocorrencia no documento correspondente
         """
-        self.document_norm = {}
-        tf_id_lists_per_doc = {}
-        self.doc_count = self.index.document_count
-        for doc_id in range(0, self.doc_count):
-            tf_id_lists_per_doc[doc_id + 1] = []
+        self.doc_count = (
+            self.index.document_count
+            if self.collection_statistics is None
+            else self.collection_statistics.doc_count
+        )
+        self.idf = {}
+        dic_squared_sum_per_doc = {}
+        self.document_length = {}
 
         for word in self.index.vocabulary:
             occurence_list = self.index.get_occurrence_list(word)
-            for doc_id in range(1, self.doc_count + 1):
-                word_occurence_in_doc = list(
-                    filter(lambda x: x.doc_id == doc_id, occurence_list)
+            if len(occurence_list) == 0:
+                continue
+            idf = VectorRankingModel.idf(
+                self.doc_count, self.document_frequency(word, len(occurence_list))
+            )
+            self.idf[word] = idf
+            for occur in occurence_list:
+                tf_idf = VectorRankingModel.tf(occur.term_freq) * idf
+                dic_squared_sum_per_doc[occur.doc_id] = (
+                    dic_squared_sum_per_doc.get(occur.doc_id, 0) + tf_idf * tf_idf
+                )
+                self.document_length[occur.doc_id] = (
+                    self.document_length.get(occur.doc_id, 0) + occur.term_freq
                 )
-                if len(word_occurence_in_doc) > 0:
-                    doc_count = self.doc_count
-                    term_freq = word_occurence_in_doc[0].term_freq
-                    num_docs_with_term = self.index.document_count_with_term(word)
-                    tf_id_lists_per_doc[doc_id].append(
-                        VectorRankingModel.tf_idf(
-                            doc_count, term_freq, num_docs_with_term
-                        )
-                    )
-
-        for doc_id in tf_id_lists_per_doc.keys():
-            tf_idf_array = tf_id_lists_per_doc[doc_id]
-            total = sum([math.pow(x, 2) for x in tf_idf_array])
-            result_for_doc = math.sqrt(total)
-            self.document_norm[doc_id] = result_for_doc
+
+        self.document_norm = {
+            doc_id: math.sqrt(squared_sum)
+            for doc_id, squared_sum in dic_squared_sum_per_doc.items()
+        }
+        self.compute_min_document_norm()
+        self.compute_document_length_arrays()
+
+    def compute_document_length_arrays(self):
+        """
+        Arrays ordenados por doc_id com o tamanho de cada documento, para que o tamanho
+        dos documentos de uma lista de ocorrencias seja obtido de forma vetorizada
+        """
+        self.arr_doc_ids = np.array(sorted(self.document_length), dtype=np.int64)
+        self.arr_doc_length = np.array(
+            [self.document_length[doc_id] for doc_id in self.arr_doc_ids.tolist()],
+            dtype=np.float64,
+        )
+        self.avg_document_length = (
+            float(self.arr_doc_length.mean()) if len(self.arr_doc_length) > 0 else 0.0
+        )
+        self.min_document_length = (
+            float(self.arr_doc_length.min()) if len(self.arr_doc_length) > 0 else 0.0
+        )
+        if self.collection_statistics is not None:
+            self.avg_document_length = self.collection_statistics.avg_document_length
+
+    def document_frequency(self, term: str, num_docs_with_term: int) -> int:
+        """
+        Quantidade de documentos com o termo usada no idf: a da coleção, caso o indice seja um shard,
+        ou `num_docs_with_term` (o tamanho da lista de ocorrencias do termo no indice)
+        """
+        if self.collection_statistics is None:
+            return num_docs_with_term
+        return self.collection_statistics.document_frequency(term, num_docs_with_term)
+
+    def get_document_lengths(self, arr_doc_ids: np.ndarray) -> np.ndarray:
+        """
+        Tamanho de cada documento de `arr_doc_ids` (zero caso o documento não seja conhecido)
+        """
+        if len(self.arr_doc_ids) == 0:
+            return np.zeros(len(arr_doc_ids))
+        arr_position = np.minimum(
+            np.searchsorted(self.arr_doc_ids, arr_doc_ids), len(self.arr_doc_ids) - 1
+        )
+        return np.where(
+            self.arr_doc_ids[arr_position] == arr_doc_ids,
+            self.arr_doc_length[arr_position],
+            0.0,
+        )
+
+    def compute_min_document_norm(self):
+        # menor norma (positiva), usada nos limites superiores do WANDRankingModel
+        self.min_document_norm = min(
+            (norm for norm in self.document_norm.values() if norm > 0), default=0
+        )
+
+    def index_signature(self):
+        # usado para verificar se os valores gravados correspondem ao indice (e à coleção, no caso de um shard):
+        # o checksum muda com as ocorrencias, mesmo que a quantidade de documentos e de termos seja a mesma
+        return (
+            self.index.document_count,
+            self.index.vocabulary_size,
+            self.index.content_checksum,
+        ) + (
+            self.collection_statistics.signature()
+            if self.collection_statistics is not None
+            else ()
+        )
+
+    def write(self, precomputed_file: str):
+        with open(precomputed_file, "wb") as f:
+            pickle.dump(
+                {
+                    "signature": self.index_signature(),
+                    "doc_count": self.doc_count,
+                    "idf": self.idf,
+                    "document_norm": self.document_norm,
+                    "document_length": self.document_length,
+                },
+                f,
+            )
+
+    def read(self, precomputed_file: str) -> bool:
+        """
+        Lê os valores gravados por `write`. Retorna False caso eles não correspondam ao indice
+        """
+        with open(precomputed_file, "rb") as f:
+            dic_vals = pickle.load(f)
+        if (
+            dic_vals["signature"] != self.index_signature()
+            or "document_length" not in dic_vals
+        ):
+            return False
+        self.doc_count = dic_vals["doc_count"]
+        self.idf = dic_vals["idf"]
+        self.document_norm = dic_vals["document_norm"]
+        self.document_length = dic_vals["document_length"]
+        self.compute_min_document_norm()
+        self.compute_document_length_arrays()
+        return True
 
 
 class RankingModel:
+    # modelos que percorrem as ocorrencias por meio de cursores (document-at-a-time) podem
+    # receber, ao invés das listas de ocorrencias, os cursores de Index.get_posting_cursor
+    ACCEPTS_POSTING_CURSORS = False
+
     @abstractmethod
     def get_ordered_docs(
         self,
         query: Mapping[str, TermOccurrence],
         docs_occur_per_term: Mapping[str, List[TermOccurrence]],
+        k: int = None,
     ):
         raise NotImplementedError(
             "Voce deve criar uma subclasse e a mesma deve sobrepor este método"
         )
 
-    def rank_document_ids(self, documents_weight):
-        doc_ids = list(documents_weight.keys())
-        doc_ids.sort(key=lambda x: -documents_weight[x])
-        return doc_ids
+    def document_weight(self, doc_id: int, weight: float) -> float:
+        """
+        Peso final do documento a partir da soma das contribuições dos termos da consulta (calculadas pelo
+        score de get_term_scorer). Por padrão, a própria soma
+        """
+        return weight
+
+    @staticmethod
+    def document_order(documents_weight):
+        """
+        Chave da ordenação total das respostas, comum a todos os modelos (e ao WAND): maior peso
+        e, nos empates, menor doc_id
+        """
+        return lambda doc_id: (-documents_weight[doc_id], doc_id)
+
+    def rank_document_ids(self, documents_weight, k: int = None):
+        """
+        Retorna os ids dos documentos ordenados pelo peso (ver document_order). Caso `k` seja informado, retorna apenas
+        os top-k, selecionados por meio de um heap limitado a k elementos (sem ordenar todos os documentos)
+        """
+        if k is None:
+            return sorted(documents_weight.keys(), key=RankingModel.document_order(documents_weight))
+        return heapq.nsmallest(k, documents_weight.keys(), key=RankingModel.document_order(documents_weight))
+
+    def iter_ranked_document_ids(self, documents_weight):
+        """
+        Gera os ids dos documentos em ordem de peso sob demanda (ex. para paginação após os top-k):
+        o heap é construido em O(n) e cada documento gerado custa O(log n)
+        """
+        heap = [(-weight, doc_id) for doc_id, weight in documents_weight.items()]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[1]
 
 
 class OPERATOR(Enum):
@@ -70,43 +238,65 @@ class OPERATOR(Enum):
 
 # Atividade 1
 class BooleanRankingModel(RankingModel):
+    ACCEPTS_POSTING_CURSORS = True
+
     def __init__(self, operator: OPERATOR):
         self.operator = operator
 
-    def get_set_list(
+    def get_cursors(
         self, map_lst_occurrences: Mapping[str, List[TermOccurrence]]
-    ) -> List[int]:
-        set_doc_ids = []
-        for word_occurencies_list in map_lst_occurrences:
-            doc_id_list = [
-                term_occur.doc_id
-                for term_occur in map_lst_occurrences[word_occurencies_list]
-            ]
-            set_doc_ids.append(set(doc_id_list))
-        return set_doc_ids
+    ) -> List[PostingCursor]:
+        return [
+            PostingCursor.from_postings(postings)
+            for postings in map_lst_occurrences.values()
+        ]
 
     def intersection_all(
         self, map_lst_occurrences: Mapping[str, List[TermOccurrence]]
     ) -> List[int]:
-        set_doc_ids = self.get_set_list(map_lst_occurrences)
-        return set_doc_ids[0].intersection(*set_doc_ids) if set_doc_ids else {}
+        # da menor para a maior lista, com busca exponencial (galloping)
+        return intersect_cursors(self.get_cursors(map_lst_occurrences))
+
+    def iter_union_all(
+        self, map_lst_occurrences: Mapping[str, List[TermOccurrence]]
+    ) -> Iterator[int]:
+        # merge de k vias que gera os doc_ids sob demanda
+        return iter_union_cursors(self.get_cursors(map_lst_occurrences))
 
     def union_all(
         self, map_lst_occurrences: Mapping[str, List[TermOccurrence]]
     ) -> List[int]:
-        set_doc_ids = self.get_set_list(map_lst_occurrences)
-        return set_doc_ids[0].union(*set_doc_ids) if set_doc_ids else {}
+        return list(self.iter_union_all(map_lst_occurrences))
 
     def get_ordered_docs(
         self,
         query: Mapping[str, TermOccurrence],
         map_lst_occurrences: Mapping[str, List[TermOccurrence]],
+        k: int = None,
     ):
         """Considere que map_lst_occurrences possui as ocorrencias apenas dos termos que existem na consulta"""
         if self.operator == OPERATOR.AND:
-            return self.intersection_all(map_lst_occurrences), None
+            it_doc_ids = iter(self.intersection_all(map_lst_occurrences))
         else:
-            return self.union_all(map_lst_occurrences), None
+            it_doc_ids = self.iter_union_all(map_lst_occurrences)
+        # sem pesos, os documentos são ordenados por id e os top-k são os k primeiros
+        return list(itertools.islice(it_doc_ids, k)), None
+
+    def get_ordered_docs_expression(
+        self,
+        expression: BooleanExpression,
+        map_lst_occurrences: Mapping[str, List[TermOccurrence]],
+        k: int = None,
+        get_all_doc_ids: Callable[[], List[int]] = None,
+    ):
+        """
+        Documentos que satisfazem a expressão booleana (AND/OR/NOT aninhados, ver BooleanQueryParser).
+        `get_all_doc_ids` só é usado por NOT fora de um AND
+        """
+        if expression is None:
+            return [], None
+        it_doc_ids = expression.iter_doc_ids(map_lst_occurrences, get_all_doc_ids)
+        return list(itertools.islice(it_doc_ids, k)), None
 
 
 # Atividade 2
@@ -128,42 +318,310 @@ class VectorRankingModel(RankingModel):
         idf = VectorRankingModel.idf(doc_count, num_docs_with_term)
         return tf * idf
 
+    def get_term_scorer(
+        self,
+        query_occur: TermOccurrence,
+        num_docs_with_term: int,
+        max_term_freq: int = None,
+    ):
+        """
+        Retorna a função que calcula a contribuição do termo no peso de um documento, score(doc_id, term_freq) = w_ij x w_iq,
+        ainda não normalizada: a divisão pela norma é feita uma única vez por documento (document_weight), após somadas
+        as contribuições de todos os termos. Retorna também um limite superior da contribuição normalizada (w_ij x w_iq / norma_j):
+        como a norma de um documento que possui o termo é ao menos w_ij, ela nunca ultrapassa w_iq (ou, caso a maior frequencia
+        do termo seja conhecida, tf(max_tf) x idf x w_iq / menor norma)
+        """
+        doc_count = self.idx_pre_comp_vals.doc_count
+        idf = VectorRankingModel.idf(doc_count, num_docs_with_term)
+        weight_query = VectorRankingModel.tf(query_occur.term_freq) * idf
+
+        def score(doc_id: int, term_freq: int) -> float:
+            return VectorRankingModel.tf(term_freq) * idf * weight_query
+
+        upper_bound = weight_query
+        min_norm = self.idx_pre_comp_vals.min_document_norm
+        if max_term_freq is not None and min_norm > 0:
+            upper_bound = min(
+                upper_bound,
+                VectorRankingModel.tf(max_term_freq) * idf * weight_query / min_norm,
+            )
+        return score, upper_bound
+
+    def document_weight(self, doc_id: int, weight: float) -> float:
+        norm = self.idx_pre_comp_vals.document_norm.get(doc_id, 0)
+        return weight / norm if norm > 0 else 0
+
     def get_ordered_docs(
         self,
         query: Mapping[str, TermOccurrence],
         docs_occur_per_term: Mapping[str, List[TermOccurrence]],
+        k: int = None,
     ):
+        # term-at-a-time: percorre uma única vez as ocorrencias de cada termo da consulta, acumulando
+        # w_ij x w_iq no acumulador do documento. Cada documento é normalizado uma única vez, ao final
         documents_weight = {}
-        query_words = list(query.keys())
-        documents_ids = set()
-        for docList in docs_occur_per_term.values():
-            documents_ids.update([doc.doc_id for doc in docList])
-
-        for doc_id in documents_ids:
-            accumulator = 0
-            for query_word in query_words:
-                try:
-                    term_freq_on_doc = next(
-                        x.term_freq
-                        for x in docs_occur_per_term[query_word]
-                        if x.doc_id == doc_id
-                    )
-                except:
-                    term_freq_on_doc = 0.5
-
-                tfidf_query = VectorRankingModel.tf_idf(
-                    max(documents_ids),
-                    query[query_word].term_freq,
-                    len(docs_occur_per_term[query_word]),
-                )
-                tfidf_doc = VectorRankingModel.tf_idf(
-                    max(documents_ids),
-                    term_freq_on_doc,
-                    len(docs_occur_per_term[query_word]),
+        for query_word, query_occur in query.items():
+            occurrences = docs_occur_per_term.get(query_word, [])
+            if len(occurrences) == 0:
+                continue
+            score, _ = self.get_term_scorer(
+                query_occur,
+                self.idx_pre_comp_vals.document_frequency(query_word, len(occurrences)),
+            )
+            for occur in occurrences:
+                documents_weight[occur.doc_id] = documents_weight.get(
+                    occur.doc_id, 0
+                ) + score(occur.doc_id, occur.term_freq)
+        documents_weight = {
+            doc_id: self.document_weight(doc_id, weight)
+            for doc_id, weight in documents_weight.items()
+        }
+        return self.rank_document_ids(documents_weight, k), documents_weight
+
+
+class WANDRankingModel(RankingModel):
+    """
+    Seleciona os top-k documentos do `scoring_model` (VectorRankingModel ou BM25RankingModel, os modelos que
+    possuem get_term_scorer) document-at-a-time com poda dinâmica (WAND): cada termo possui um limite superior
+    da sua contribuição e um documento só é avaliado se a soma dos limites dos termos que podem contê-lo supera
+    o menor peso do heap de top-k.
+    Os demais documentos são saltados por meio de PostingCursor.next_geq.
+
+    O resultado (e os pesos) são os mesmos do scoring_model. Sem `k`, todos os documentos são avaliados
+    e a consulta é delegada ao scoring_model.
+    """
+
+    ACCEPTS_POSTING_CURSORS = True
+
+    def __init__(self, scoring_model: RankingModel, index=None):
+        self.scoring_model = scoring_model
+        self.index = index
+        # quantidade de documentos avaliados na ultima consulta
+        self.num_scored_docs = 0
+
+    def get_ordered_docs(
+        self,
+        query: Mapping[str, TermOccurrence],
+        docs_occur_per_term: Mapping[str, List[TermOccurrence]],
+        k: int = None,
+    ):
+        if k is None:
+            documents_weight = self.scoring_model.get_ordered_docs(
+                query,
+                {
+                    term: PostingCursor.to_occurrence_list(postings)
+                    for term, postings in docs_occur_per_term.items()
+                },
+            )[1]
+            self.num_scored_docs = len(documents_weight)
+            return self.scoring_model.rank_document_ids(documents_weight), documents_weight
+        if k <= 0:
+            # como nos demais modelos, nenhum documento é retornado (e o heap de top-k nunca teria um limiar)
+            self.num_scored_docs = 0
+            return [], {}
+
+        # por termo (na ordem da consulta): [cursor, score, limite superior]
+        lst_terms = []
+        for query_word, query_occur in query.items():
+            occurrences = docs_occur_per_term.get(query_word, [])
+            if len(occurrences) == 0:
+                continue
+            max_term_freq = (
+                self.index.max_term_freq(query_word) if self.index is not None else None
+            )
+            score, upper_bound = self.scoring_model.get_term_scorer(
+                query_occur,
+                self.scoring_model.idx_pre_comp_vals.document_frequency(
+                    query_word, len(occurrences)
+                ),
+                max_term_freq,
+            )
+            lst_terms.append(
+                (PostingCursor.from_postings(occurrences), score, upper_bound)
+            )
+
+        heap_top_k = []
+        documents_weight = {}
+        self.num_scored_docs = 0
+        while True:
+            threshold = heap_top_k[0][0] if len(heap_top_k) == k else -math.inf
+            lst_active = sorted(
+                (term for term in lst_terms if term[0].doc_id is not None),
+                key=lambda term: term[0].doc_id,
+            )
+            # pivô: primeiro documento em que a soma dos limites superiores supera o limiar
+            pivot_doc_id = None
+            upper_bound_sum = 0
+            for cursor, _, upper_bound in lst_active:
+                upper_bound_sum += upper_bound
+                if upper_bound_sum > threshold:
+                    pivot_doc_id = cursor.doc_id
+                    break
+            if pivot_doc_id is None:
+                break
+
+            if lst_active[0][0].doc_id == pivot_doc_id:
+                # todos os cursores anteriores ao pivô estão nele: avalia o documento somando as
+                # contribuições na ordem da consulta e obtendo o peso final uma única vez (como o scoring_model)
+                self.num_scored_docs += 1
+                weight = 0
+                for cursor, score, _ in lst_terms:
+                    if cursor.doc_id == pivot_doc_id:
+                        weight += score(pivot_doc_id, cursor.current.term_freq)
+                        cursor.next()
+                weight = self.scoring_model.document_weight(pivot_doc_id, weight)
+                if len(heap_top_k) < k:
+                    heapq.heappush(heap_top_k, (weight, -pivot_doc_id))
+                    documents_weight[pivot_doc_id] = weight
+                # os documentos são avaliados em ordem crescente de doc_id: nos empates, o que já está
+                # no heap (menor doc_id) é mantido, como em document_order
+                elif weight > threshold:
+                    _, removed_doc_id = heapq.heappushpop(heap_top_k, (weight, -pivot_doc_id))
+                    del documents_weight[-removed_doc_id]
+                    documents_weight[pivot_doc_id] = weight
+            else:
+                # avança os cursores anteriores ao pivô até ele
+                for cursor, _, _ in lst_active:
+                    if cursor.doc_id >= pivot_doc_id:
+                        break
+                    cursor.next_geq(pivot_doc_id)
+        return self.rank_document_ids(documents_weight, k), documents_weight
+
+
+class BM25RankingModel(RankingModel):
+    """
+    Modelo probabilístico BM25: o peso do documento j é a soma, para cada termo i da consulta, de
+        idf_i x f_ij x (k1+1) / (f_ij + k1 x (1 - b + b x |d_j|/avgdl))
+    em que |d_j| e avgdl (tamanho de d_j e tamanho médio dos documentos) vêm do IndexPreComputedVals.
+    O peso é calculado de forma vetorizada sobre todas as ocorrencias de cada termo
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(
+        self, idx_pre_comp_vals: IndexPreComputedVals, k1: float = None, b: float = None
+    ):
+        self.idx_pre_comp_vals = idx_pre_comp_vals
+        self.k1 = k1 if k1 is not None else BM25RankingModel.K1
+        self.b = b if b is not None else BM25RankingModel.B
+
+    @staticmethod
+    def idf(doc_count: int, num_docs_with_term: int) -> float:
+        # variante que não produz pesos negativos para termos muito frequentes
+        return math.log(
+            1 + (doc_count - num_docs_with_term + 0.5) / (num_docs_with_term + 0.5)
+        )
+
+    @staticmethod
+    def get_postings_arrays(occurrences: List[TermOccurrence]):
+        """
+        Retorna os arrays (doc_id, term_freq) das ocorrencias
+        """
+        arr_doc_ids = np.fromiter(
+            (occur.doc_id for occur in occurrences), dtype=np.int64, count=len(occurrences)
+        )
+        arr_term_freq = np.fromiter(
+            (occur.term_freq for occur in occurrences),
+            dtype=np.float64,
+            count=len(occurrences),
+        )
+        return arr_doc_ids, arr_term_freq
+
+    def term_scores(
+        self,
+        query_occur: TermOccurrence,
+        arr_doc_ids: np.ndarray,
+        arr_term_freq: np.ndarray,
+        num_docs_with_term: int = None,
+    ) -> np.ndarray:
+        """
+        Peso do termo em cada um dos documentos `arr_doc_ids`, em que ele ocorre `arr_term_freq` vezes.
+        Caso `num_docs_with_term` não seja informado, são considerados apenas os documentos `arr_doc_ids`
+        """
+        idf = BM25RankingModel.idf(
+            self.idx_pre_comp_vals.doc_count,
+            num_docs_with_term if num_docs_with_term is not None else len(arr_doc_ids),
+        )
+        avg_length = self.idx_pre_comp_vals.avg_document_length
+        arr_length_ratio = (
+            self.idx_pre_comp_vals.get_document_lengths(arr_doc_ids) / avg_length
+            if avg_length > 0
+            else np.ones(len(arr_doc_ids))
+        )
+        arr_norm = self.k1 * (1 - self.b + self.b * arr_length_ratio)
+        return (
+            query_occur.term_freq
+            * idf
+            * arr_term_freq
+            * (self.k1 + 1)
+            / (arr_term_freq + arr_norm)
+        )
+
+    def get_term_scorer(
+        self,
+        query_occur: TermOccurrence,
+        num_docs_with_term: int,
+        max_term_freq: int = None,
+    ):
+        """
+        Como em VectorRankingModel.get_term_scorer: retorna score(doc_id, term_freq), o peso do termo no documento
+        (o mesmo de term_scores), e um limite superior deste peso. O peso cresce com a frequencia e diminui com
+        o tamanho do documento: o limite é o peso com a maior frequencia do termo (max_tf) no menor documento
+        ou, sem max_tf, o limite do peso quando a frequencia tende ao infinito, q_i x idf x (k1+1)
+        """
+        idf = BM25RankingModel.idf(self.idx_pre_comp_vals.doc_count, num_docs_with_term)
+        document_length = self.idx_pre_comp_vals.document_length
+        avg_length = self.idx_pre_comp_vals.avg_document_length
+        k1, b = self.k1, self.b
+
+        def weight(term_freq: float, length: float) -> float:
+            length_ratio = length / avg_length if avg_length > 0 else 1.0
+            norm = k1 * (1 - b + b * length_ratio)
+            return query_occur.term_freq * idf * term_freq * (k1 + 1) / (term_freq + norm)
+
+        def score(doc_id: int, term_freq: int) -> float:
+            return weight(float(term_freq), float(document_length.get(doc_id, 0)))
+
+        upper_bound = query_occur.term_freq * idf * (k1 + 1)
+        if max_term_freq is not None:
+            upper_bound = min(
+                upper_bound,
+                weight(float(max_term_freq), self.idx_pre_comp_vals.min_document_length),
+            )
+        return score, upper_bound
+
+    def get_ordered_docs(
+        self,
+        query: Mapping[str, TermOccurrence],
+        docs_occur_per_term: Mapping[str, List[TermOccurrence]],
+        k: int = None,
+    ):
+        lst_doc_ids = []
+        lst_scores = []
+        for query_word, query_occur in query.items():
+            occurrences = docs_occur_per_term.get(query_word, [])
+            if len(occurrences) == 0:
+                continue
+            arr_doc_ids, arr_term_freq = BM25RankingModel.get_postings_arrays(occurrences)
+            lst_doc_ids.append(arr_doc_ids)
+            lst_scores.append(
+                self.term_scores(
+                    query_occur,
+                    arr_doc_ids,
+                    arr_term_freq,
+                    self.idx_pre_comp_vals.document_frequency(
+                        query_word, len(arr_doc_ids)
+                    ),
                 )
+            )
+        if len(lst_doc_ids) == 0:
+            return [], {}
 
-                accumulator += tfidf_doc * tfidf_query
-            accumulator /= self.idx_pre_comp_vals.document_norm[doc_id]
-            documents_weight[doc_id] = accumulator
-        # retona a lista de doc ids ordenados de acordo com o TF IDF
-        return self.rank_document_ids(documents_weight), documents_weight
+        # soma os pesos de cada documento (acumulador vetorizado)
+        arr_unique_docs, arr_inverse = np.unique(
+            np.concatenate(lst_doc_ids), return_inverse=True
+        )
+        arr_weights = np.bincount(arr_inverse, weights=np.concatenate(lst_scores))
+        documents_weight = dict(zip(arr_unique_docs.tolist(), arr_weights.tolist()))
+        return self.rank_document_ids(documents_weight, k), documents_weight
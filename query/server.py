@@ -0,0 +1,278 @@
+from typing import List, Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, urlencode
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from query.processing import QueryRunner
+from query.query_cache import QueryCache
+
+
+class QueryServer:
+    """
+    Serviço de busca HTTP/JSON (asyncio) sobre um QueryRunner, carregado uma única vez:
+        GET /search?q=<consulta>&k=<k>&timeout=<segundos> (ou POST /search com {"query", "k", "timeout"})
+        GET /stats
+
+    As consultas são ranqueadas por um pool de `num_workers` processos (cada um com uma cópia,
+    somente leitura, do QueryRunner; com 0, por uma thread do próprio processo). Consultas identicas
+    (mesma consulta normalizada e k) em andamento são unidas: apenas a primeira é enviada ao pool e
+    as demais aguardam a sua resposta. Cada requisição possui um prazo (`timeout`, por padrão `deadline`
+    segundos): ao se esgotar, o worker retorna os top-k parciais (ver QueryRunner.get_docs_term_until) e,
+    caso nem isso ocorra em DEADLINE_GRACE segundos, a resposta é vazia e parcial.
+    """
+    DEADLINE = 1.0
+    DEADLINE_GRACE = 0.5
+    K = 10
+    MAX_BODY_SIZE = 2**20
+
+    def __init__(self, query_runner: QueryRunner, num_workers: int = None, deadline: float = None, k: int = None):
+        self.query_runner = query_runner
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.deadline = deadline if deadline is not None else QueryServer.DEADLINE
+        self.k = k if k is not None else QueryServer.K
+        self.executor = None
+        self.server = None
+        self.dic_in_flight = {}
+        # conexões abertas (tarefa -> writer), encerradas em stop
+        self.dic_connections = {}
+        self.dic_stats = {"requests": 0, "coalesced": 0, "partial": 0, "timeouts": 0, "errors": 0}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Inicia o pool e o servidor. Retorna (host, porta), útil quando `port` é 0 (porta livre escolhida pelo sistema)
+        """
+        if self.num_workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.num_workers, initializer=init_server_worker,
+                                                initargs=(self.query_runner,))
+        else:
+            init_server_worker(self.query_runner)
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self.server.close()
+        for writer in self.dic_connections.values():
+            writer.close()
+        await asyncio.gather(*self.dic_connections.keys(), return_exceptions=True)
+        await self.server.wait_closed()
+        # a finalização do pool aguarda os workers e, por isso, não é feita na thread do event loop
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.executor.shutdown(wait=True, cancel_futures=True))
+
+    async def serve_forever(self, host: str, port: int):
+        str_host, int_port = await self.start(host, port)
+        print(f"Servindo em http://{str_host}:{int_port}/search?q=...")
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def search(self, query: str, k: int = None, timeout: float = None) -> Mapping:
+        k = k if k is not None else self.k
+        timeout = timeout if timeout is not None else self.deadline
+        self.dic_stats["requests"] += 1
+        start = time.perf_counter()
+        key = (self.query_runner.normalize_query(query), k)
+        bol_coalesced = key in self.dic_in_flight
+        if bol_coalesced:
+            self.dic_stats["coalesced"] += 1
+            future = self.dic_in_flight[key]
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, search_in_worker, query, k, time.monotonic()+timeout)
+            self.dic_in_flight[key] = future
+            future.add_done_callback(lambda _: self.dic_in_flight.pop(key, None))
+        try:
+            lst_docs, bol_partial = await asyncio.wait_for(asyncio.shield(future), timeout+QueryServer.DEADLINE_GRACE)
+        except asyncio.TimeoutError:
+            self.dic_stats["timeouts"] += 1
+            lst_docs, bol_partial = [], True
+        if bol_partial:
+            self.dic_stats["partial"] += 1
+        dic_response = {"query": query, "k": k, "docs": lst_docs, "partial": bol_partial,
+                        "coalesced": bol_coalesced, "latency": time.perf_counter()-start}
+        if self.query_runner.document_table is not None:
+            dic_response["titles"] = [self.query_runner.document_table.get_title(doc_id) for doc_id in lst_docs]
+        return dic_response
+
+    async def handle_request(self, str_method: str, str_target: str, body: bytes) -> (int, Mapping):
+        url = urlsplit(str_target)
+        if url.path == "/stats":
+            return 200, dict(self.dic_stats, in_flight=len(self.dic_in_flight))
+        if url.path != "/search":
+            return 404, {"error": f"Caminho desconhecido: {url.path}"}
+        if str_method == "POST":
+            dic_params = json.loads(body or b"{}")
+        else:
+            dic_params = {str_key: lst_values[0] for str_key, lst_values in parse_qs(url.query).items()}
+        if "q" in dic_params:
+            dic_params["query"] = dic_params["q"]
+        if not dic_params.get("query"):
+            return 400, {"error": "Informe a consulta (q ou query)"}
+        k = int(dic_params["k"]) if "k" in dic_params else None
+        timeout = float(dic_params["timeout"]) if "timeout" in dic_params else None
+        return 200, await self.search(dic_params["query"], k, timeout)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        HTTP/1.1 com conexões persistentes (keep-alive): as requisições são lidas até o cliente fechar a conexão
+        """
+        task = asyncio.current_task()
+        self.dic_connections[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                str_method, str_target, _ = request_line.decode("latin-1").split(" ", 2)
+                dic_headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    str_name, _, str_value = header_line.decode("latin-1").partition(":")
+                    dic_headers[str_name.strip().lower()] = str_value.strip()
+                int_length = int(dic_headers.get("content-length", 0))
+                if int_length > QueryServer.MAX_BODY_SIZE:
+                    await self.write_response(writer, 413, {"error": "Requisição muito grande"}, False)
+                    break
+                body = await reader.readexactly(int_length) if int_length > 0 else b""
+                try:
+                    int_status, dic_response = await self.handle_request(str_method, str_target, body)
+                except (ValueError, KeyError) as e:
+                    self.dic_stats["errors"] += 1
+                    int_status, dic_response = 400, {"error": str(e)}
+                except Exception as e:
+                    # ex. um erro do worker ao processar a consulta: o cliente recebe a resposta e a conexão é mantida
+                    self.dic_stats["errors"] += 1
+                    int_status, dic_response = 500, {"error": f"{type(e).__name__}: {e}"}
+                bol_keep_alive = dic_headers.get("connection", "").lower() != "close"
+                await self.write_response(writer, int_status, dic_response, bol_keep_alive)
+                if not bol_keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            del self.dic_connections[task]
+
+    @staticmethod
+    async def write_response(writer: asyncio.StreamWriter, int_status: int, dic_response: Mapping, bol_keep_alive: bool):
+        body = json.dumps(dic_response, ensure_ascii=False).encode("utf-8")
+        str_reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                      500: "Internal Server Error"}[int_status]
+        writer.write(f"HTTP/1.1 {int_status} {str_reason}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if bol_keep_alive else 'close'}\r\n\r\n".encode("latin-1")+body)
+        await writer.drain()
+
+
+# QueryRunner usado por cada processo do pool do QueryServer
+server_query_runner = None
+
+def init_server_worker(query_runner: QueryRunner):
+    global server_query_runner
+    server_query_runner = query_runner
+
+def search_in_worker(query: str, k: int, deadline: float):
+    return server_query_runner.get_docs_term_until(query, k, deadline)
+
+
+async def http_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, str_host: str, str_target: str) -> Mapping:
+    """
+    Envia um GET por uma conexão persistente e retorna o JSON da resposta
+    """
+    writer.write(f"GET {str_target} HTTP/1.1\r\nHost: {str_host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status_line = await reader.readline()
+    int_length = 0
+    while True:
+        header_line = await reader.readline()
+        if header_line in (b"\r\n", b"\n", b""):
+            break
+        str_name, _, str_value = header_line.decode("latin-1").partition(":")
+        if str_name.strip().lower() == "content-length":
+            int_length = int(str_value)
+    dic_response = json.loads(await reader.readexactly(int_length))
+    if not status_line.startswith(b"HTTP/1.1 200"):
+        raise ValueError(f"Erro na requisição {str_target}: {dic_response}")
+    return dic_response
+
+
+async def run_load(str_host: str, int_port: int, lst_queries: List[str], num_requests: int = 1000,
+                   num_clients: int = 16, k: int = 10, timeout: float = None, seed: int = 0) -> Mapping:
+    """
+    Gerador de carga: `num_clients` clientes concorrentes, cada um com uma conexão persistente, enviam
+    ao todo `num_requests` consultas sorteadas de `lst_queries`. Retorna as estatisticas de latencia e
+    vazão (ver QueryRunner.batch_stats) e a quantidade de respostas parciais e unidas (coalesced)
+    """
+    rnd = random.Random(seed)
+    lst_targets = []
+    for _ in range(num_requests):
+        dic_params = {"q": rnd.choice(lst_queries), "k": k}
+        if timeout is not None:
+            dic_params["timeout"] = timeout
+        lst_targets.append("/search?"+urlencode(dic_params))
+    lst_latencies = []
+    dic_counts = {"partial": 0, "coalesced": 0}
+
+    async def client(lst_client_targets: List[str]):
+        reader, writer = await asyncio.open_connection(str_host, int_port)
+        try:
+            for str_target in lst_client_targets:
+                start = time.perf_counter()
+                dic_response = await http_request(reader, writer, str_host, str_target)
+                lst_latencies.append(time.perf_counter()-start)
+                dic_counts["partial"] += dic_response["partial"]
+                dic_counts["coalesced"] += dic_response["coalesced"]
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(lst_targets[i::num_clients]) for i in range(num_clients)])
+    dic_stats = QueryRunner.batch_stats(lst_latencies, time.perf_counter()-start)
+    dic_stats.update(dic_counts)
+    return dic_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço de busca (serve) e gerador de carga (load)")
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--deadline", type=float, default=None)
+    parser.add_argument("--model", default="wand")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.command == "load":
+        lst_queries = ["São Paulo", "Belo Horizonte", "Irlanda", "Minas Gerais", "Portugal", "futebol", "capital do Brasil"]
+        dic_stats = asyncio.run(run_load(args.host, args.port, lst_queries, args.requests, args.clients, timeout=args.deadline))
+        del dic_stats["latencies"]
+        print(json.dumps(dic_stats, indent=2))
+        return
+
+    from index.mmap_structure import MmapIndex
+    from index.indexer import Cleaner
+    from index.document_table import MmapDocumentTable
+    from query.ranking_models import IndexPreComputedVals
+    # indice compilado aberto por mmap: as páginas são compartilhadas pelos processos do executor
+    index = MmapIndex.read("wiki.midx")
+    cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                      perform_stop_words_removal=True, perform_accents_removal=True,
+                      perform_stemming=False, cache_file="cleaner_cache.pkl")
+    idx_pre_com = IndexPreComputedVals(index, "wiki_precomp.dat")
+    ranking_model = QueryRunner.create_ranking_model(args.model, index, idx_pre_com)
+    query_runner = QueryRunner(ranking_model, index, cleaner, MmapDocumentTable.read("wiki.docs"), QueryCache())
+    asyncio.run(QueryServer(query_runner, args.workers, args.deadline).serve_forever(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+from query.boolean_query import *
+from query.ranking_models import BooleanRankingModel, OPERATOR
+from index.structure import TermOccurrence, DocIdCursor
+import random
+import unittest
+
+
+class BooleanQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.map_lst_occurrences = {
+            "casa": [TermOccurrence(doc_id, 1, 1) for doc_id in [1, 2, 4, 7, 9]],
+            "verde": [TermOccurrence(doc_id, 2, 1) for doc_id in [1, 3, 4, 9]],
+            "vermelha": [TermOccurrence(doc_id, 3, 1) for doc_id in [2, 4, 8]],
+            "azul": [TermOccurrence(doc_id, 4, 1) for doc_id in [9]],
+        }
+        self.lst_all_doc_ids = list(range(1, 11))
+
+    def evaluate(self, str_query: str, default_operator: str = "AND"):
+        expression = BooleanQueryParser(default_operator).parse(str_query)
+        return list(
+            expression.iter_doc_ids(self.map_lst_occurrences, lambda: self.lst_all_doc_ids)
+        )
+
+    def test_intersect_union(self):
+        rnd = random.Random(3)
+        for _ in range(50):
+            lst_sets = [
+                set(rnd.sample(range(200), rnd.randint(0, 120))) for _ in range(rnd.randint(1, 4))
+            ]
+            lst_sorted = [sorted(set_doc_ids) for set_doc_ids in lst_sets]
+            self.assertListEqual(
+                intersect_cursors([DocIdCursor(lst) for lst in lst_sorted]),
+                sorted(set.intersection(*lst_sets)),
+            )
+            self.assertListEqual(
+                list(iter_union_cursors([DocIdCursor(lst) for lst in lst_sorted])),
+                sorted(set.union(*lst_sets)),
+            )
+            self.assertListEqual(
+                list(iter_difference_cursors(iter(lst_sorted[0]), [DocIdCursor(lst) for lst in lst_sorted[1:]])),
+                sorted(lst_sets[0].difference(*lst_sets[1:])),
+            )
+
+    def test_union_lazy(self):
+        # a união é gerada sob demanda: os primeiros doc_ids são obtidos sem percorrer as listas inteiras
+        cursor_a = DocIdCursor(list(range(0, 100000, 2)))
+        cursor_b = DocIdCursor(list(range(1, 100000, 2)))
+        it_union = iter_union_cursors([cursor_a, cursor_b])
+        self.assertListEqual([next(it_union) for _ in range(5)], [0, 1, 2, 3, 4])
+        self.assertLess(cursor_a.position + cursor_b.position, 10)
+
+    def test_parse(self):
+        self.assertEqual(
+            repr(BooleanQueryParser().parse("casa AND verde OR NOT vermelha")),
+            "((casa AND verde) OR NOT vermelha)",
+        )
+        self.assertEqual(
+            repr(BooleanQueryParser().parse("casa (verde OR azul)")),
+            "(casa AND (verde OR azul))",
+        )
+        self.assertEqual(
+            repr(BooleanQueryParser("OR").parse("casa verde AND azul")),
+            "(casa OR (verde AND azul))",
+        )
+        # termos descartados no preprocessamento são removidos da expressão
+        parser = BooleanQueryParser(preprocess_term=lambda term: None if term == "a" else term)
+        self.assertEqual(repr(parser.parse("a AND (casa OR NOT a)")), "casa")
+        self.assertIsNone(parser.parse("a"))
+
+        for str_query in ["casa AND", "(casa OR verde", "casa )", "OR verde"]:
+            with self.assertRaises(ValueError, msg=f"A consulta '{str_query}' é inválida"):
+                BooleanQueryParser().parse(str_query)
+
+        self.assertTrue(BooleanQueryParser.is_expression("casa AND verde"))
+        self.assertTrue(BooleanQueryParser.is_expression("(casa)"))
+        self.assertFalse(BooleanQueryParser.is_expression("casa verde and"))
+
+    def test_evaluate(self):
+        dic_expected = {
+            "casa AND verde": [1, 4, 9],
+            "casa verde": [1, 4, 9],
+            "casa OR azul": [1, 2, 4, 7, 9],
+            "casa AND NOT vermelha": [1, 7, 9],
+            "casa AND (verde OR vermelha) AND NOT azul": [1, 2, 4],
+            "NOT casa": [3, 5, 6, 8, 10],
+            "NOT (casa OR verde) OR azul": [5, 6, 8, 9, 10],
+            "NOT casa AND NOT verde": [5, 6, 8, 10],
+            "casa AND crocodilo": [],
+            "crocodilo OR azul": [9],
+        }
+        for str_query, lst_expected in dic_expected.items():
+            self.assertListEqual(
+                self.evaluate(str_query), lst_expected, msg=f"Resposta inesperada para '{str_query}'"
+            )
+        self.assertListEqual(self.evaluate("casa verde", "OR"), [1, 2, 3, 4, 7, 9])
+
+        with self.assertRaises(ValueError):
+            BooleanQueryParser().parse("NOT casa").iter_doc_ids(self.map_lst_occurrences)
+
+    def test_boolean_model_expression(self):
+        model = BooleanRankingModel(OPERATOR.AND)
+        expression = BooleanQueryParser().parse("(casa OR verde) AND NOT azul")
+        lst_response, _ = model.get_ordered_docs_expression(expression, self.map_lst_occurrences)
+        self.assertListEqual(lst_response, [1, 2, 3, 4, 7])
+        lst_response, _ = model.get_ordered_docs_expression(expression, self.map_lst_occurrences, k=2)
+        self.assertListEqual(lst_response, [1, 2])
+        lst_response, _ = model.get_ordered_docs_expression(None, self.map_lst_occurrences)
+        self.assertListEqual(lst_response, [])
+
+    def test_match_positions(self):
+        self.assertTrue(match_phrase([[3, 10], [4, 20]], [0, 1]))
+        self.assertFalse(match_phrase([[3, 10], [5, 20]], [0, 1]))
+        # "casa de papel" sem a stop word: papel duas posições após casa
+        self.assertTrue(match_phrase([[1, 7], [3, 9]], [0, 2]))
+        self.assertFalse(match_phrase([[1, 7], [2, 10]], [0, 2]))
+        self.assertTrue(match_phrase([[1], [2], [3]], [0, 1, 2]))
+        self.assertFalse(match_phrase([[1], [2], [4]], [0, 1, 2]))
+
+        self.assertTrue(match_ordered_window([[1], [4]], [0, 1], 2))
+        self.assertFalse(match_ordered_window([[1], [5]], [0, 1], 2))
+        self.assertFalse(match_ordered_window([[4], [1]], [0, 1], 5), "A ordem da frase deve ser mantida")
+        self.assertTrue(match_ordered_window([[1, 8], [3, 10], [20]], [0, 1, 2], 11))
+
+        self.assertTrue(match_unordered_window([[5], [2]], 3))
+        self.assertFalse(match_unordered_window([[6], [2]], 3))
+        self.assertTrue(match_unordered_window([[1, 30], [9, 28], [15, 32]], 4))
+        self.assertFalse(match_unordered_window([[1, 30], [9, 28], [15, 40]], 4))
+
+        # confere com a busca exaustiva
+        rnd = random.Random(5)
+        for _ in range(200):
+            lst_term_positions = [sorted(rnd.sample(range(40), rnd.randint(1, 6))) for _ in range(rnd.randint(2, 3))]
+            lst_offsets = list(range(len(lst_term_positions)))
+            int_slop = rnd.randint(0, 4)
+            lst_combinations = [[]]
+            for lst_positions in lst_term_positions:
+                lst_combinations = [combination+[position] for combination in lst_combinations for position in lst_positions]
+            self.assertEqual(
+                match_phrase(lst_term_positions, lst_offsets),
+                any(all(combination[i] == combination[0]+i for i in lst_offsets) for combination in lst_combinations),
+            )
+            self.assertEqual(
+                match_ordered_window(lst_term_positions, lst_offsets, int_slop),
+                any(all(combination[i] < combination[i+1] for i in lst_offsets[:-1])
+                    and combination[-1]-combination[0]-lst_offsets[-1] <= int_slop for combination in lst_combinations),
+            )
+            self.assertEqual(
+                match_unordered_window(lst_term_positions, int_slop),
+                any(max(combination)-min(combination) <= int_slop for combination in lst_combinations),
+            )
+
+    def test_phrase_expression(self):
+        # posições de cada termo nos documentos
+        dic_positions = {
+            ("casa", 1): [0, 5], ("verde", 1): [1],
+            ("casa", 4): [3], ("verde", 4): [0, 7],
+            ("casa", 9): [2], ("verde", 9): [3], ("azul", 9): [5],
+        }
+        lst_read = []
+        def get_positions(term, doc_id):
+            lst_read.append((term, doc_id))
+            return dic_positions.get((term, doc_id), [])
+
+        parser = BooleanQueryParser(get_positions=get_positions)
+        self.assertEqual(repr(parser.parse('"casa verde"~2 OR casa NEAR/3 azul')), '("casa verde"~2 OR (casa NEAR/3 azul))')
+        dic_expected = {
+            '"casa verde"': [1, 9],
+            '"verde casa"': [],
+            '"casa verde"~4': [1, 4, 9],
+            "casa NEAR/3 verde": [1, 4, 9],
+            "verde NEAR/1 casa": [1, 9],
+            '"casa verde" azul': [9],
+            '"casa verde" AND NOT azul': [1],
+            '"casa verde azul"': [],
+            '"casa verde azul"~1': [9],
+        }
+        for str_query, lst_expected in dic_expected.items():
+            expression = parser.parse(str_query)
+            self.assertListEqual(
+                list(expression.iter_doc_ids(self.map_lst_occurrences, lambda: self.lst_all_doc_ids)),
+                lst_expected,
+                msg=f"Resposta inesperada para '{str_query}'",
+            )
+
+        # as posições são lidas apenas para os candidatos (documentos com todos os termos)
+        lst_read.clear()
+        list(parser.parse('"verde azul"').iter_doc_ids(self.map_lst_occurrences))
+        self.assertSetEqual({doc_id for _, doc_id in lst_read}, {9})
+
+        # stop words contam na posição dos termos seguintes
+        parser = BooleanQueryParser(preprocess_term=lambda term: None if term == "de" else term, get_positions=get_positions)
+        self.assertListEqual(parser.parse('"casa de verde"').lst_offsets, [0, 2])
+        self.assertEqual(repr(parser.parse('"de casa"')), "casa")
+        self.assertEqual(repr(parser.parse("de NEAR/2 casa")), "casa")
+
+        self.assertTrue(BooleanQueryParser.is_expression('"casa verde"'))
+        self.assertTrue(BooleanQueryParser.has_positional_operator("casa NEAR/2 verde"))
+        self.assertFalse(BooleanQueryParser.has_positional_operator("casa AND verde"))
+        self.assertEqual(BooleanQueryParser.remove_positional_operators('"casa verde"~2 azul NEAR/3 casa'), "casa verde azul casa")
+        for str_query in ["casa NEAR/2", "casa NEAR/2 (verde OR azul)", "casa NEAR/2 verde NEAR/3 azul"]:
+            with self.assertRaises(ValueError, msg=f"A consulta '{str_query}' é inválida"):
+                BooleanQueryParser().parse(str_query)
+        with self.assertRaises(ValueError):
+            list(BooleanQueryParser().parse('"casa verde"').iter_doc_ids(self.map_lst_occurrences))
+
+    def test_unsorted_postings(self):
+        # listas que não estão ordenadas por doc_id são ordenadas antes da interseção
+        map_lst_occurrences = {
+            "casa": [TermOccurrence(doc_id, 1, 1) for doc_id in [9, 1, 4]],
+            "verde": [TermOccurrence(doc_id, 2, 1) for doc_id in [4, 3, 9]],
+        }
+        lst_response, _ = BooleanRankingModel(OPERATOR.AND).get_ordered_docs({}, map_lst_occurrences)
+        self.assertListEqual(lst_response, [4, 9])
+        lst_response, _ = BooleanRankingModel(OPERATOR.OR).get_ordered_docs({}, map_lst_occurrences)
+        self.assertListEqual(lst_response, [1, 3, 4, 9])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,15 @@
-from index.structure import FileIndex,TermOccurrence
-from query.processing import QueryRunner, VectorRankingModel, IndexPreComputedVals
+from index.structure import FileIndex,HashIndex,TermOccurrence
+from index.sharded_structure import ShardedIndex
+from index.mmap_structure import MmapIndex
+from query.processing import QueryRunner, ShardCoordinator, VectorRankingModel, IndexPreComputedVals
 from index.indexer import Cleaner
+from index.document_table import DocumentTable
+from index.positions import PositionsIndex
 from typing import Mapping
+import os
+import random
+import shutil
+import time
 import unittest
 class ProcessingTest(unittest.TestCase):
     def setUp(self):
@@ -21,6 +29,9 @@ class ProcessingTest(unittest.TestCase):
                         perform_stemming=False)
         precomp = IndexPreComputedVals(self.index)
         self.queryRunner = QueryRunner(VectorRankingModel(precomp), self.index, cleaner)
+
+    def tearDown(self):
+        self.index.remove_files()
     def test_count_top_n_relevant(self):
         arr_lists = [[1,2,3,4,5,30,23,234,32,32,3,2,10,20],
                     [-1,-2,-2],
@@ -141,5 +152,185 @@ class ProcessingTest(unittest.TestCase):
             print()
             self.assertListEqual(resposta, arr_expected_response[i],f"A resposta a consulta '{query}' deveria ser {arr_expected_response[i]} e não {resposta}")
 
+    def test_get_docs_term_top_k(self):
+        resposta,pesos = self.queryRunner.get_docs_term("vocês estejam", k=1)
+        self.assertListEqual(resposta, [3], f"A resposta top-1 da consulta deveria ser [3] e não {resposta}")
+
+    def test_create_ranking_model(self):
+        precomp = IndexPreComputedVals(self.index)
+        for str_model in ["vetorial","wand","bm25"]:
+            self.queryRunner.ranking_model = QueryRunner.create_ranking_model(str_model, self.index, precomp)
+            resposta,_ = self.queryRunner.get_docs_term("Vocês estejam", k=2)
+            self.assertListEqual(resposta, [3,2], f"O modelo {str_model} deveria responder [3, 2] e não {resposta}")
+        self.queryRunner.ranking_model = QueryRunner.create_ranking_model("booleano_and", self.index, precomp)
+        resposta,_ = self.queryRunner.get_docs_term("vocês estejam")
+        self.assertSetEqual(set(resposta), {3})
+        with self.assertRaises(ValueError):
+            QueryRunner.create_ranking_model("xuxu", self.index, precomp)
+
+    def test_get_docs_boolean_expression(self):
+        precomp = IndexPreComputedVals(self.index)
+        self.queryRunner.ranking_model = QueryRunner.create_ranking_model("booleano_and", self.index, precomp)
+        dic_expected = {"vocês AND NOT estejam":[2],
+                        "(adoro OR espero) Vocês":[2],
+                        "adoro OR (vocês AND que)":[1,3],
+                        "NOT vocês":[1]}
+        for query, expected in dic_expected.items():
+            resposta,_ = self.queryRunner.get_docs_term(query)
+            self.assertListEqual(resposta, expected, f"A resposta a consulta '{query}' deveria ser {expected} e não {resposta}")
+
+    def test_boolean_expression_mmap_index(self):
+        #o universo do NOT é obtido pelo indice (o MmapIndex não carrega set_documents)
+        mmap_index = MmapIndex.compile(self.index, "teste_idx.midx")
+        try:
+            precomp = IndexPreComputedVals(mmap_index)
+            query_runner = QueryRunner(QueryRunner.create_ranking_model("booleano_and", mmap_index, precomp), mmap_index, self.queryRunner.cleaner)
+            dic_expected = {"NOT vocês":[1], "NOT adoro":[2,3], "vocês AND NOT estejam":[2]}
+            for query, expected in dic_expected.items():
+                resposta,_ = query_runner.get_docs_term(query)
+                self.assertListEqual(resposta, expected, f"A resposta a consulta '{query}' deveria ser {expected} e não {resposta}")
+            lst_responses, _ = query_runner.run_batch(list(dic_expected.keys()))
+            self.assertListEqual(lst_responses, list(dic_expected.values()))
+        finally:
+            mmap_index.close()
+            os.remove("teste_idx.midx")
+
+    def test_run_batch(self):
+        precomp = IndexPreComputedVals(self.index)
+        lst_queries = ["vocês estejam", "adoro", "xuxu", "Vocês espero", "vocês estejam"]
+        for str_model in ["vetorial", "wand", "bm25", "wand_bm25"]:
+            self.queryRunner.ranking_model = QueryRunner.create_ranking_model(str_model, self.index, precomp)
+            lst_expected = [self.queryRunner.get_docs_term(query, k=2)[0] for query in lst_queries]
+            for num_workers in [1, 2]:
+                lst_responses, dic_stats = self.queryRunner.run_batch(lst_queries, k=2, num_workers=num_workers, chunk_size=2)
+                self.assertListEqual(lst_responses, lst_expected, f"Respostas do lote diferentes das consultas individuais ({str_model}, {num_workers} processos)")
+        #os termos repetidos no lote são lidos do indice uma única vez
+        self.assertEqual(dic_stats["num_queries"], 5)
+        self.assertEqual(dic_stats["num_terms"], 7)
+        self.assertEqual(dic_stats["num_unique_terms"], 4)
+        self.assertEqual(len(dic_stats["latencies"]), 5)
+        self.assertLessEqual(dic_stats["latency_p50"], dic_stats["latency_max"])
+
+        #expressões booleanas também podem ser executadas em lote
+        self.queryRunner.ranking_model = QueryRunner.create_ranking_model("booleano_and", self.index, precomp)
+        lst_responses, _ = self.queryRunner.run_batch(["vocês AND NOT estejam", "NOT vocês", "adoro OR (vocês AND que)", "vocês estejam"])
+        self.assertListEqual(lst_responses, [[2], [1], [1, 3], [3]])
+
+    def test_get_docs_term_until(self):
+        precomp = IndexPreComputedVals(self.index)
+        for str_model in ["vetorial", "wand", "bm25", "booleano_and"]:
+            self.queryRunner.ranking_model = QueryRunner.create_ranking_model(str_model, self.index, precomp)
+            lst_expected, _ = self.queryRunner.get_docs_term("vocês estejam", k=2)
+            resposta, bol_parcial = self.queryRunner.get_docs_term_until("vocês estejam", k=2, deadline=time.monotonic()+10)
+            self.assertListEqual(resposta, lst_expected, f"Resposta inesperada do modelo {str_model}")
+            self.assertFalse(bol_parcial)
+        #com o prazo esgotado, apenas os termos já processados são considerados
+        self.queryRunner.ranking_model = QueryRunner.create_ranking_model("bm25", self.index, precomp)
+        resposta, bol_parcial = self.queryRunner.get_docs_term_until("vocês estejam", k=2, deadline=time.monotonic()-1)
+        self.assertTrue(bol_parcial)
+        self.assertListEqual(resposta, [])
+
+    def test_get_docs_phrase_query(self):
+        #posições dos termos de cada documento do indice
+        self.index.positions = PositionsIndex("teste_positions.idx")
+        self.index.positions.add_document(1, {"adoro":[0], "divertindo":[1,2,3,4]})
+        self.index.positions.add_document(2, {"vocês":[0,2,4], "espero":[1]})
+        self.index.positions.add_document(3, {"que":[0], "vocês":[1], "estejam":[2], "se":[3]})
+        self.index.positions.finish_indexing()
+        precomp = IndexPreComputedVals(self.index)
+        dic_expected = {'"Vocês estejam"':[3],
+                        '"estejam vocês"':[],
+                        '"estejam vocês"~2':[],
+                        '"que estejam"~1':[3],
+                        "estejam NEAR/1 vocês":[3],
+                        "vocês NEAR/1 espero":[2],
+                        #nos modelos com pesos, os demais termos apenas ranqueiam os documentos da frase
+                        '"vocês espero" estejam':[2],
+                        '"adoro divertindo" OR "que vocês"':[1,3]}
+        try:
+            for str_model in ["vetorial", "wand", "bm25", "booleano_and"]:
+                self.queryRunner.ranking_model = QueryRunner.create_ranking_model(str_model, self.index, precomp)
+                for query, expected in dic_expected.items():
+                    if str_model != "booleano_and" and " OR " in query:
+                        continue
+                    if str_model == "booleano_and" and query == '"vocês espero" estejam':
+                        expected = []
+                    resposta,_ = self.queryRunner.get_docs_term(query)
+                    self.assertListEqual(sorted(resposta), expected, f"{str_model}: a resposta a consulta '{query}' deveria ser {expected} e não {resposta}")
+                lst_queries = list(dic_expected.keys())[:-1]
+                lst_responses, _ = self.queryRunner.run_batch(lst_queries, num_workers=2, chunk_size=2)
+                self.assertListEqual(lst_responses, [self.queryRunner.get_docs_term(query)[0] for query in lst_queries])
+            #o indice compilado mantém a camada de posições
+            mmap_index = MmapIndex.compile(self.index, "teste_idx.midx")
+            try:
+                query_runner = QueryRunner(QueryRunner.create_ranking_model("booleano_and", mmap_index, IndexPreComputedVals(mmap_index)),
+                                           mmap_index, self.queryRunner.cleaner)
+                for query in ['"Vocês estejam"', '"estejam vocês"', "vocês NEAR/1 espero"]:
+                    self.assertListEqual(query_runner.get_docs_term(query)[0], dic_expected[query])
+            finally:
+                mmap_index.close()
+                os.remove("teste_idx.midx")
+        finally:
+            self.index.positions.close()
+            os.remove("teste_positions.idx")
+            os.remove("teste_positions.idx.dir")
+
+    def test_shard_coordinator(self):
+        #mesma coleção em um indice único e particionada em 3 shards (consultados por 3 processos)
+        random.seed(7)
+        lst_words = ["adoro","vocês","espero","que","estejam","se","divertindo","muito"]
+        index = HashIndex()
+        sharded_index = ShardedIndex(3, "teste_shards", lambda shard_number: HashIndex())
+        for doc_id in range(60):
+            for word in random.sample(lst_words, random.randint(1,5)):
+                int_freq = random.randint(1,4)
+                index.index(word,doc_id,int_freq)
+                sharded_index.index(word,doc_id,int_freq)
+        index.finish_indexing()
+        sharded_index.finish_indexing()
+        precomp = IndexPreComputedVals(index)
+        lst_queries = ["vocês estejam", "adoro adoro muito", "xuxu", "Que se divertindo"]
+        try:
+            for str_model in ["vetorial", "wand", "bm25", "booleano_and", "booleano_or"]:
+                query_runner = QueryRunner(QueryRunner.create_ranking_model(str_model, index, precomp), index, self.queryRunner.cleaner)
+                with ShardCoordinator(sharded_index, str_model, self.queryRunner.cleaner) as coordinator:
+                    sharded_runner = QueryRunner(None, sharded_index, self.queryRunner.cleaner, shard_coordinator=coordinator)
+                    for query in lst_queries:
+                        for k in [5, None]:
+                            lst_expected, dic_expected_weights = query_runner.get_docs_term(query, k)
+                            resposta, dic_weights = sharded_runner.get_docs_term(query, k)
+                            if dic_expected_weights is None:
+                                self.assertListEqual(resposta, list(lst_expected), f"{str_model}: '{query}' (k={k})")
+                                continue
+                            #os pesos são os mesmos do indice único (a ordem dos empates pode variar)
+                            self.assertEqual(len(resposta), len(lst_expected), f"{str_model}: '{query}' (k={k})")
+                            for doc_id, expected_doc_id in zip(resposta, lst_expected):
+                                self.assertAlmostEqual(dic_weights[doc_id], dic_expected_weights[doc_id])
+                                self.assertAlmostEqual(dic_weights[doc_id], dic_expected_weights[expected_doc_id])
+        finally:
+            shutil.rmtree("teste_shards", ignore_errors=True)
+
+    def test_relevance_key(self):
+        self.assertEqual(QueryRunner.get_relevance_key("São Paulo"), "sao_paulo")
+        self.assertEqual(QueryRunner.get_relevance_key(" Belo  Horizonte"), "belo_horizonte")
+
+    def test_relevance_per_query(self):
+        #sem tabela de documentos, os ids dos arquivos de relevantes são os proprios doc_ids (inteiros)
+        map_relevance = self.queryRunner.get_relevance_per_query()
+        self.assertSetEqual(set(map_relevance.keys()), {"belo_horizonte", "irlanda", "sao_paulo"})
+        self.assertIn(1034, map_relevance["irlanda"])
+        self.assertTrue(all(type(doc_id) == int for doc_id in map_relevance["irlanda"]))
+
+        #com a tabela, são convertidos nos doc_ids internos; os que não estão no indice são ignorados
+        document_table = DocumentTable()
+        document_table.add_document("9918", "Irlanda")
+        document_table.add_document("1034", "Dublin")
+        mmap_table = document_table.compile("teste_docs.dat")
+        query_runner = QueryRunner(self.queryRunner.ranking_model, self.index, self.queryRunner.cleaner, mmap_table)
+        self.assertSetEqual(query_runner.get_relevance_per_query()["irlanda"], {0, 1})
+        self.assertEqual(query_runner.format_doc(1), "Dublin (doc 1034)")
+        mmap_table.close()
+        os.remove("teste_docs.dat")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
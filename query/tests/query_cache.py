@@ -0,0 +1,105 @@
+from query.query_cache import *
+from query.processing import QueryRunner, IndexPreComputedVals
+from index.structure import HashIndex, FileIndex
+from index.compressed_structure import CompressedFileIndex
+from index.indexer import Cleaner
+from util.cache import ByteBudgetLRUCache
+import unittest
+
+
+class ByteBudgetLRUCacheTest(unittest.TestCase):
+    def test_budget(self):
+        cache = ByteBudgetLRUCache(max_bytes=10, size_of=len)
+        cache.put("a", "xxxx")
+        cache.put("b", "xxxx")
+        self.assertEqual(cache.get("a"), "xxxx")
+        #"b" é a entrada usada há mais tempo e é removida para caber "c"
+        cache.put("c", "xxx")
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["bytes"], 7)
+        #substituir uma entrada atualiza o total de bytes
+        cache.put("a", "x")
+        self.assertEqual(cache.stats()["bytes"], 4)
+        #entradas maiores que o limite não são armazenadas
+        cache.put("d", "x"*11)
+        self.assertNotIn("d", cache)
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+
+class QueryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cleaner = Cleaner(stop_words_file="stopwords.txt",language="portuguese",
+                        perform_stop_words_removal=False,perform_accents_removal=False,
+                        perform_stemming=False)
+
+    def create_index(self, index):
+        for doc_id, lst_terms in enumerate([["casa", "verde"], ["casa"], ["verde", "amarela"], ["casa", "amarela", "casa"]], 1):
+            for term in set(lst_terms):
+                index.index(term, doc_id, lst_terms.count(term))
+        index.finish_indexing()
+        self.addCleanup(index.remove_files)
+        return index
+
+    def create_runner(self, index, str_model="bm25", **kwargs):
+        model = QueryRunner.create_ranking_model(str_model, index, IndexPreComputedVals(index))
+        return QueryRunner(model, index, self.cleaner, cache=QueryCache(**kwargs))
+
+    def test_result_cache(self):
+        index = self.create_index(FileIndex())
+        query_runner = self.create_runner(index)
+        lst_expected, _ = query_runner.get_docs_term("casa verde")
+        #a consulta normalizada (caixa e espaços) é a mesma
+        for query in ["casa verde", "Casa  Verde", "CASA verde"]:
+            self.assertListEqual(query_runner.get_docs_term(query)[0], lst_expected)
+        dic_stats = query_runner.cache.stats()
+        self.assertEqual(dic_stats["results"]["hits"], 3)
+        self.assertEqual(dic_stats["results"]["misses"], 1)
+        self.assertEqual(dic_stats["postings"]["misses"], 2)
+        #k faz parte da chave
+        self.assertListEqual(query_runner.get_docs_term("casa verde", k=1)[0], lst_expected[:1])
+        self.assertEqual(query_runner.cache.stats()["results"]["misses"], 2)
+        #alterar a resposta retornada não altera o cache
+        query_runner.get_docs_term("casa verde")[0].clear()
+        self.assertListEqual(query_runner.get_docs_term("casa verde")[0], lst_expected)
+        dic_weights = query_runner.get_docs_term("casa verde")[1]
+        dic_expected_weights = dict(dic_weights)
+        dic_weights.clear()
+        self.assertDictEqual(query_runner.get_docs_term("casa verde")[1], dic_expected_weights)
+        #operadores booleanos não são normalizados para caixa baixa
+        self.assertEqual(query_runner.normalize_query("Casa AND (NOT Verde)"), "casa AND ( NOT verde )")
+
+    def test_postings_cache(self):
+        for index in [HashIndex(), FileIndex(), CompressedFileIndex()]:
+            index = self.create_index(index)
+            for str_model in ["vetorial", "wand", "booleano_and"]:
+                query_runner = self.create_runner(index, str_model)
+                lst_expected, _ = QueryRunner(query_runner.ranking_model, index, self.cleaner).get_docs_term("casa amarela")
+                self.assertListEqual(query_runner.get_docs_term("casa amarela")[0], lst_expected)
+                #consultas diferentes com os mesmos termos aproveitam as ocorrencias em cache (os cursores são copiados)
+                self.assertListEqual(query_runner.get_docs_term("amarela casa")[0], lst_expected)
+                dic_stats = query_runner.cache.stats()["postings"]
+                self.assertEqual((dic_stats["hits"], dic_stats["misses"]), (2, 2), f"{type(index).__name__} {str_model}")
+                self.assertGreater(dic_stats["bytes"], 0)
+
+    def test_generation(self):
+        index = self.create_index(HashIndex())
+        query_runner = self.create_runner(index, "booleano_and")
+        self.assertListEqual(query_runner.get_docs_term("casa verde")[0], [1])
+        #o cache é invalidado quando o indice é alterado
+        index.index("casa", 5, 1)
+        index.index("verde", 5, 1)
+        index.finish_indexing()
+        self.assertListEqual(query_runner.get_docs_term("casa verde")[0], [1, 5])
+        self.assertEqual(query_runner.cache.stats()["results"]["size"], 1)
+
+    def test_postings_budget(self):
+        index = self.create_index(FileIndex())
+        query_runner = self.create_runner(index, "vetorial", postings_cache_bytes=1)
+        query_runner.get_docs_term("casa verde")
+        self.assertEqual(len(query_runner.cache.postings), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,16 @@ from query.ranking_models import (
     IndexPreComputedVals,
     VectorRankingModel,
     BooleanRankingModel,
+    WANDRankingModel,
+    BM25RankingModel,
     OPERATOR,
 )
 from index.structure import HashIndex, FileIndex, TermOccurrence
+from index.compressed_structure import CompressedFileIndex
+from util.performance import CheckPerformance
+import math
+import os
+import random
 import unittest
 
 
@@ -58,6 +65,7 @@ class RankingModelTest(unittest.TestCase):
 
     def test_precomputed_vals(self):
         index = FileIndex()
+        self.addCleanup(index.remove_files)
         index.index("new", 1, 4)
         index.index("york", 1, 1)
         index.index("times", 1, 1)
@@ -82,6 +90,265 @@ class RankingModelTest(unittest.TestCase):
                 msg=f"Norma inesperada do documento {doc_id}",
             )
 
+    def test_precomputed_vals_file(self):
+        index = HashIndex()
+        index.index("new", 1, 4)
+        index.index("york", 1, 1)
+        index.index("new", 2, 1)
+        index.index("post", 2, 1)
+        index.finish_indexing()
+
+        precomp = IndexPreComputedVals(index, "teste_precomp.dat")
+        self.addCleanup(os.remove, "teste_precomp.dat")
+        self.assertAlmostEqual(precomp.idf["new"], 0, places=5)
+        self.assertAlmostEqual(precomp.idf["york"], 1, places=5)
+
+        # valores lidos do arquivo, sem recalcular
+        precomp_lido = IndexPreComputedVals.__new__(IndexPreComputedVals)
+        precomp_lido.index = index
+        self.assertTrue(precomp_lido.read("teste_precomp.dat"))
+        self.assertDictEqual(precomp_lido.document_norm, precomp.document_norm)
+        self.assertDictEqual(precomp_lido.idf, precomp.idf)
+        self.assertDictEqual(precomp_lido.document_length, precomp.document_length)
+        self.assertEqual(precomp_lido.avg_document_length, precomp.avg_document_length)
+
+        # o arquivo não corresponde mais ao indice: os valores são recalculados
+        index.index("los", 3, 1)
+        precomp_novo = IndexPreComputedVals(index, "teste_precomp.dat")
+        self.assertEqual(precomp_novo.doc_count, 3)
+        self.assertIn(3, precomp_novo.document_norm)
+
+        # mesma quantidade de documentos e de termos, mas com outras ocorrencias: os valores também são recalculados
+        index_outro = HashIndex()
+        index_outro.index("new", 1, 1)
+        index_outro.index("york", 2, 1)
+        index_outro.index("post", 2, 3)
+        index_outro.index("los", 3, 2)
+        index_outro.finish_indexing()
+        self.assertEqual(
+            (index_outro.document_count, index_outro.vocabulary_size),
+            (index.document_count, index.vocabulary_size),
+        )
+        precomp_outro = IndexPreComputedVals(index_outro, "teste_precomp.dat")
+        self.assertAlmostEqual(precomp_outro.idf["new"], math.log2(3), places=5)
+        self.assertEqual(precomp_outro.document_length[2], 4)
+
+    def test_top_k(self):
+        model = VectorRankingModel(None)
+        documents_weight = {doc_id: (doc_id * 7) % 11 for doc_id in range(1, 11)}
+        lst_todos = model.rank_document_ids(documents_weight)
+        for k in [0, 1, 3, 10, 20]:
+            self.assertListEqual(
+                model.rank_document_ids(documents_weight, k),
+                lst_todos[:k],
+                msg=f"Top-{k} inesperado",
+            )
+        # a geração sob demanda continua a ordenação após os top-k
+        self.assertListEqual(list(model.iter_ranked_document_ids(documents_weight)), lst_todos)
+
+        map_index = self.arr_indexes[0]
+        map_query = self.arr_queries_per_idx[0][0]
+        precomp = IndexPreComputedVals(FileIndex())
+        precomp.document_norm = {1: 1.44, 2: 1.16, 3: 2.08, 4: 1.3}
+        precomp.doc_count = 4
+        lst_response, _ = VectorRankingModel(precomp).get_ordered_docs(
+            map_query, self.obtem_index_for_query(map_query, map_index), k=2
+        )
+        self.assertListEqual(lst_response, [2, 4])
+        lst_response, _ = BooleanRankingModel(OPERATOR.OR).get_ordered_docs(
+            map_query, self.obtem_index_for_query(map_query, map_index), k=2
+        )
+        self.assertListEqual(lst_response, [1, 2])
+
+    def test_bm25_model(self):
+        index = HashIndex()
+        map_index = self.arr_indexes[1]
+        for term, lst_occur in map_index.items():
+            for occur in lst_occur:
+                index.index(term, occur.doc_id, occur.term_freq)
+        index.finish_indexing()
+        precomp = IndexPreComputedVals(index)
+        self.assertDictEqual(precomp.document_length, {1: 6, 2: 3, 3: 3})
+        self.assertAlmostEqual(precomp.avg_document_length, 4)
+
+        map_query = self.arr_queries_per_idx[1][0]
+        map_index_for_query = self.obtem_index_for_query(map_query, map_index)
+        peso_por_doc_esperado = [
+            ({}, {1: 1.122, 2: 0.524, 3: 0.524}),
+            ({"b": 0}, {1: 1.265, 2: 0.470, 3: 0.470}),
+        ]
+        for params, dic_peso_esperado in peso_por_doc_esperado:
+            lst_response, doc_weights = BM25RankingModel(
+                precomp, **params
+            ).get_ordered_docs(map_query, map_index_for_query)
+            self.assertListEqual(lst_response, [1, 2, 3], msg=f"Resposta inesperada ({params})")
+            for doc_id, peso in dic_peso_esperado.items():
+                self.assertAlmostEqual(
+                    peso,
+                    doc_weights[doc_id],
+                    places=3,
+                    msg=f"Peso inesperado do documento {doc_id} ({params})",
+                )
+
+        lst_response, _ = BM25RankingModel(precomp).get_ordered_docs(
+            map_query, map_index_for_query, k=1
+        )
+        self.assertListEqual(lst_response, [1])
+        lst_response, doc_weights = BM25RankingModel(precomp).get_ordered_docs(
+            {"crocodilo": TermOccurrence(None, 7, 1)}, {}
+        )
+        self.assertListEqual(lst_response, [])
+        self.assertDictEqual(doc_weights, {})
+
+    def create_zipf_index(self, num_docs: int, num_terms: int, seed: int = 42, index=None):
+        # indice sintético: o termo de posição r ocorre em ~num_docs/r documentos (Zipf)
+        rnd = random.Random(seed)
+        index = index if index is not None else HashIndex()
+        for rank in range(1, num_terms + 1):
+            num_docs_with_term = max(1, num_docs // rank)
+            for doc_id in sorted(rnd.sample(range(1, num_docs + 1), num_docs_with_term)):
+                index.index(f"termo{rank}", doc_id, rnd.randint(1, 10))
+        index.finish_indexing()
+        return index
+
+    def test_wand(self):
+        index = self.create_zipf_index(2000, 200)
+        precomp = IndexPreComputedVals(index)
+        vector_model = VectorRankingModel(precomp)
+        wand_model = WANDRankingModel(vector_model, index)
+
+        rnd = random.Random(7)
+        for query_position in range(30):
+            lst_terms = rnd.sample(range(1, 201), rnd.randint(1, 5))
+            map_query = {
+                f"termo{rank}": TermOccurrence(None, rank, rnd.randint(1, 2))
+                for rank in lst_terms
+            }
+            map_occur = {
+                term: index.get_occurrence_list(term) for term in map_query
+            }
+            _, dic_weights = vector_model.get_ordered_docs(map_query, map_occur)
+            for k in [1, 10, 50]:
+                lst_wand, dic_wand_weights = wand_model.get_ordered_docs(
+                    map_query, map_occur, k
+                )
+                lst_esperado = vector_model.rank_document_ids(dic_weights, k)
+                # os empates são resolvidos da mesma forma (ver RankingModel.document_order)
+                self.assertListEqual(
+                    lst_wand,
+                    lst_esperado,
+                    msg=f"Top-{k} do WAND difere do exaustivo na consulta {query_position}",
+                )
+                for doc_id in lst_wand:
+                    self.assertEqual(dic_wand_weights[doc_id], dic_weights[doc_id])
+                self.assertLessEqual(wand_model.num_scored_docs, len(dic_weights))
+
+        # sem k, todos os documentos são avaliados
+        lst_wand, _ = wand_model.get_ordered_docs(map_query, map_occur)
+        self.assertListEqual(lst_wand, vector_model.rank_document_ids(dic_weights))
+
+        # empates: WAND e o modelo exaustivo retornam os mesmos documentos (menor doc_id primeiro)
+        tie_index = HashIndex()
+        for doc_id, lst_doc_terms in {0: ["b"], 1: ["x"], 2: ["a"], 3: ["a", "b"]}.items():
+            for term in lst_doc_terms:
+                tie_index.index(term, doc_id, 1)
+        tie_index.finish_indexing()
+        tie_vector_model = VectorRankingModel(IndexPreComputedVals(tie_index))
+        map_query = {"a": TermOccurrence(None, 0, 1), "b": TermOccurrence(None, 1, 1)}
+        map_occur = {term: tie_index.get_occurrence_list(term) for term in map_query}
+        lst_esperado, _ = tie_vector_model.get_ordered_docs(map_query, map_occur, 2)
+        self.assertListEqual(lst_esperado, [3, 0])
+        self.assertListEqual(WANDRankingModel(tie_vector_model, tie_index).get_ordered_docs(map_query, map_occur, 2)[0], lst_esperado)
+        self.assertListEqual(tie_vector_model.get_ordered_docs(map_query, map_occur)[0], [3, 0, 2])
+
+        # com k=0, nenhum documento é retornado (como no modelo vetorial)
+        self.assertEqual(wand_model.get_ordered_docs(map_query, map_occur, 0), ([], {}))
+        self.assertListEqual(vector_model.get_ordered_docs(map_query, map_occur, 0)[0], [])
+
+    def test_wand_bm25(self):
+        # o WAND também seleciona os top-k do BM25, com os mesmos pesos do modelo exaustivo
+        index = self.create_zipf_index(2000, 200)
+        precomp = IndexPreComputedVals(index)
+        bm25_model = BM25RankingModel(precomp)
+        wand_model = WANDRankingModel(bm25_model, index)
+
+        rnd = random.Random(11)
+        int_scored_docs = int_total_docs = 0
+        for query_position in range(30):
+            lst_terms = rnd.sample(range(1, 201), rnd.randint(1, 5))
+            map_query = {
+                f"termo{rank}": TermOccurrence(None, rank, rnd.randint(1, 2))
+                for rank in lst_terms
+            }
+            map_occur = {
+                term: index.get_occurrence_list(term) for term in map_query
+            }
+            _, dic_weights = bm25_model.get_ordered_docs(map_query, map_occur)
+            # o limite superior de cada termo não é ultrapassado pelo seu peso em nenhum documento
+            for term, query_occur in map_query.items():
+                score, upper_bound = bm25_model.get_term_scorer(
+                    query_occur, len(map_occur[term]), index.max_term_freq(term)
+                )
+                for occur in map_occur[term]:
+                    self.assertLessEqual(score(occur.doc_id, occur.term_freq), upper_bound)
+            for k in [1, 10]:
+                lst_wand, dic_wand_weights = wand_model.get_ordered_docs(
+                    map_query, map_occur, k
+                )
+                self.assertListEqual(
+                    lst_wand,
+                    bm25_model.rank_document_ids(dic_weights, k),
+                    msg=f"Top-{k} do WAND difere do BM25 na consulta {query_position}",
+                )
+                for doc_id in lst_wand:
+                    self.assertEqual(dic_wand_weights[doc_id], dic_weights[doc_id])
+                int_scored_docs += wand_model.num_scored_docs
+                int_total_docs += len(dic_weights)
+        self.assertLess(int_scored_docs, int_total_docs)
+
+    def test_posting_cursors(self):
+        # os modelos que aceitam cursores (Index.get_posting_cursor) obtêm o mesmo resultado que com as listas
+        index = self.create_zipf_index(2000, 50, index=CompressedFileIndex())
+        self.addCleanup(index.remove_files)
+        precomp = IndexPreComputedVals(index)
+        wand_model = WANDRankingModel(VectorRankingModel(precomp), index)
+        map_query = {f"termo{rank}": TermOccurrence(None, rank, 1) for rank in [1, 3, 20]}
+        for model, k in [(wand_model, 10), (wand_model, None),
+                         (BooleanRankingModel(OPERATOR.AND), None), (BooleanRankingModel(OPERATOR.OR), 30)]:
+            self.assertTrue(model.ACCEPTS_POSTING_CURSORS)
+            lst_esperado, _ = model.get_ordered_docs(
+                map_query, {term: index.get_occurrence_list(term) for term in map_query}, k
+            )
+            lst_response, _ = model.get_ordered_docs(
+                map_query, {term: index.get_posting_cursor(term) for term in map_query}, k
+            )
+            self.assertListEqual(lst_response, lst_esperado, msg=f"{type(model).__name__} k={k}")
+
+    def test_wand_performance(self):
+        index = self.create_zipf_index(20000, 300)
+        precomp = IndexPreComputedVals(index)
+        vector_model = VectorRankingModel(precomp)
+        wand_model = WANDRankingModel(vector_model, index)
+        lst_queries = [
+            {f"termo{rank}": TermOccurrence(None, rank, 1) for rank in lst_ranks}
+            for lst_ranks in [[1, 2, 50], [1, 3, 120], [2, 5, 10, 200], [1, 250]]
+        ]
+
+        for map_query in lst_queries:
+            map_occur = {term: index.get_occurrence_list(term) for term in map_query}
+            _, tempo_exaustivo, _ = CheckPerformance.measure(
+                vector_model.get_ordered_docs, map_query, map_occur, 10
+            )
+            _, tempo_wand, _ = CheckPerformance.measure(
+                wand_model.get_ordered_docs, map_query, map_occur, 10
+            )
+            num_candidatos = len({occur.doc_id for lst in map_occur.values() for occur in lst})
+            print(
+                f"Consulta {list(map_query.keys())}: documentos avaliados exaustivo: {num_candidatos} "
+                f"WAND: {wand_model.num_scored_docs} | tempo exaustivo: {tempo_exaustivo:.4f}s WAND: {tempo_wand:.4f}s"
+            )
+            self.assertLess(wand_model.num_scored_docs, num_candidatos)
+
     def obtem_index_for_query(self, map_query, map_index):
         map_index_for_query = {}
         for term, list_ocur in map_index.items():
@@ -167,6 +434,37 @@ class RankingModelTest(unittest.TestCase):
                             msg=f"Peso inesperado do documento {doc_id} consulta {query_position} índice {idx}. Peso calculado:{doc_weights[doc_id]} deveria ser: {peso}",
                         )
 
+    def test_vector_model_normalization(self):
+        # a norma de cada documento é obtida uma única vez, após somadas as contribuições dos termos
+        class CountingDict(dict):
+            num_gets = 0
+
+            def get(self, key, default=None):
+                CountingDict.num_gets += 1
+                return super().get(key, default)
+
+        index = self.create_zipf_index(200, 20)
+        precomp = IndexPreComputedVals(index)
+        map_query = {
+            f"termo{rank}": TermOccurrence(None, rank, 1) for rank in [2, 3, 4]
+        }
+        map_occur = {term: index.get_occurrence_list(term) for term in map_query}
+        dic_expected = {}
+        for term, lst_occur in map_occur.items():
+            idf = VectorRankingModel.idf(precomp.doc_count, len(lst_occur))
+            for occur in lst_occur:
+                dic_expected[occur.doc_id] = dic_expected.get(occur.doc_id, 0) + (
+                    VectorRankingModel.tf(occur.term_freq) * idf * idf
+                ) / precomp.document_norm[occur.doc_id]
+        precomp.document_norm = CountingDict(precomp.document_norm)
+        _, dic_weights = VectorRankingModel(precomp).get_ordered_docs(
+            map_query, map_occur
+        )
+        self.assertEqual(dic_weights.keys(), dic_expected.keys())
+        for doc_id, weight in dic_expected.items():
+            self.assertAlmostEqual(dic_weights[doc_id], weight)
+        self.assertEqual(CountingDict.num_gets, len(dic_weights))
+
 
 if __name__ == "__main__":
     unittest.main()
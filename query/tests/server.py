@@ -0,0 +1,102 @@
+from query.server import *
+from query.processing import QueryRunner, IndexPreComputedVals
+from index.structure import HashIndex
+from index.indexer import Cleaner
+from index.document_table import DocumentTable
+import asyncio
+import os
+import random
+import unittest
+
+
+class QueryServerTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(5)
+        self.index = HashIndex()
+        lst_vocabulary = ["casa", "verde", "azul", "amarela", "carro", "rua", "sol"]
+        document_table = DocumentTable()
+        for doc_id in range(200):
+            document_table.add_document(f"{1000+doc_id}", f"Documento {doc_id}")
+            for term in rnd.sample(lst_vocabulary, rnd.randint(1, 4)):
+                self.index.index(term, doc_id, rnd.randint(1, 5))
+        self.index.finish_indexing()
+        cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                          perform_stop_words_removal=False, perform_accents_removal=False,
+                          perform_stemming=False)
+        precomp = IndexPreComputedVals(self.index)
+        self.query_runner = QueryRunner(QueryRunner.create_ranking_model("bm25", self.index, precomp), self.index, cleaner,
+                                        document_table.compile("teste_docs.dat"))
+        self.lst_queries = ["casa verde", "azul", "carro rua sol", "amarela casa"]
+
+    def tearDown(self):
+        self.query_runner.document_table.close()
+        os.remove("teste_docs.dat")
+
+    def run_server(self, test, num_workers=2):
+        async def run():
+            server = QueryServer(self.query_runner, num_workers=num_workers)
+            str_host, int_port = await server.start()
+            try:
+                return await test(server, str_host, int_port)
+            finally:
+                await server.stop()
+        return asyncio.run(run())
+
+    def test_search(self):
+        async def test(server, str_host, int_port):
+            reader, writer = await asyncio.open_connection(str_host, int_port)
+            #a mesma conexão é usada em várias requisições (keep-alive)
+            for query in self.lst_queries:
+                dic_response = await http_request(reader, writer, str_host, "/search?"+urlencode({"q": query, "k": 5}))
+                lst_expected, _ = self.query_runner.get_docs_term(query, k=5)
+                self.assertListEqual(dic_response["docs"], lst_expected, f"Resposta inesperada para '{query}'")
+                self.assertFalse(dic_response["partial"])
+                self.assertListEqual(dic_response["titles"], [f"Documento {doc_id}" for doc_id in lst_expected])
+            with self.assertRaises(ValueError):
+                await http_request(reader, writer, str_host, "/search?k=5")
+            writer.close()
+            return await server.search("casa", timeout=0)
+        #com o prazo esgotado, a resposta é parcial
+        self.assertTrue(self.run_server(test)["partial"])
+
+    def test_coalescing(self):
+        async def test(server, str_host, int_port):
+            return await asyncio.gather(*[server.search(query) for query in ["casa verde", "Casa  Verde", "casa verde", "azul"]])
+        lst_responses = self.run_server(test, num_workers=0)
+        self.assertListEqual([dic_response["coalesced"] for dic_response in lst_responses], [False, True, True, False])
+        self.assertListEqual(lst_responses[0]["docs"], lst_responses[1]["docs"])
+
+    def test_worker_error(self):
+        get_docs_term_until = self.query_runner.get_docs_term_until
+        def get_docs_term_until_error(query, k=None, deadline=None):
+            if query == "erro":
+                raise LookupError("falha no worker")
+            return get_docs_term_until(query, k, deadline)
+        #sem processos, o worker (uma thread) usa o próprio query_runner
+        self.query_runner.get_docs_term_until = get_docs_term_until_error
+        async def test(server, str_host, int_port):
+            reader, writer = await asyncio.open_connection(str_host, int_port)
+            with self.assertRaises(ValueError):
+                await http_request(reader, writer, str_host, "/search?q=erro")
+            #a conexão continua a responder as próximas requisições
+            dic_response = await http_request(reader, writer, str_host, "/search?q=casa")
+            writer.close()
+            return dic_response, server.dic_stats
+        dic_response, dic_server_stats = self.run_server(test, num_workers=0)
+        self.assertListEqual(dic_response["docs"], self.query_runner.get_docs_term("casa", k=10)[0])
+        self.assertEqual(dic_server_stats["errors"], 1)
+
+    def test_load(self):
+        async def test(server, str_host, int_port):
+            dic_stats = await run_load(str_host, int_port, self.lst_queries, num_requests=200, num_clients=8)
+            return dic_stats, server.dic_stats
+        dic_stats, dic_server_stats = self.run_server(test)
+        print(f"Carga: {dic_stats['queries_per_second']:.0f} consultas/s, p50 {dic_stats['latency_p50']*1000:.2f}ms, "
+              f"p99 {dic_stats['latency_p99']*1000:.2f}ms, {dic_stats['coalesced']} unidas")
+        self.assertEqual(dic_stats["num_queries"], 200)
+        self.assertEqual(dic_server_stats["requests"], 200)
+        self.assertLessEqual(dic_stats["latency_p50"], dic_stats["latency_p99"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+import sys
+
+
+class LRUCache(object):
+    """
+    Cache limitado a `max_size` entradas que remove a entrada usada há mais tempo (LRU)
+    e contabiliza os acertos (hits) e as faltas (misses)
+    """
+    MISSING = object()
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.dic_cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        value = self.dic_cache.get(key, LRUCache.MISSING)
+        if value is LRUCache.MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.dic_cache.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value):
+        self.dic_cache[key] = value
+        self.dic_cache.move_to_end(key)
+        while len(self.dic_cache) > self.max_size:
+            self.dic_cache.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable):
+        value = self.get(key, LRUCache.MISSING)
+        if value is LRUCache.MISSING:
+            value = compute(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self.dic_cache.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits+self.misses
+        return self.hits/total if total > 0 else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio, "size": len(self.dic_cache)}
+
+    def __contains__(self, key: Hashable):
+        return key in self.dic_cache
+
+    def __len__(self):
+        return len(self.dic_cache)
+
+    def __str__(self):
+        return f"LRUCache(max_size={self.max_size}, {self.stats()})"
+
+    def __repr__(self):
+        return str(self)
+
+
+class ByteBudgetLRUCache(LRUCache):
+    """
+    LRUCache limitado pela soma dos tamanhos (em bytes) das entradas, estimados por `size_of`,
+    ao invés da quantidade de entradas. Entradas maiores que `max_bytes` não são armazenadas
+    """
+    def __init__(self, max_bytes: int, size_of: Callable = sys.getsizeof):
+        super().__init__(max_size=None)
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.dic_sizes = {}
+        self.int_bytes = 0
+
+    def put(self, key: Hashable, value):
+        if key in self.dic_cache:
+            self.remove(key)
+        int_size = self.size_of(value)
+        if int_size > self.max_bytes:
+            return
+        self.dic_cache[key] = value
+        self.dic_sizes[key] = int_size
+        self.int_bytes += int_size
+        while self.int_bytes > self.max_bytes:
+            self.remove(next(iter(self.dic_cache)))
+
+    def remove(self, key: Hashable):
+        del self.dic_cache[key]
+        self.int_bytes -= self.dic_sizes.pop(key)
+
+    def clear(self):
+        super().clear()
+        self.dic_sizes.clear()
+        self.int_bytes = 0
+
+    def stats(self):
+        dic_stats = super().stats()
+        dic_stats["bytes"] = self.int_bytes
+        return dic_stats
+
+    def __str__(self):
+        return f"ByteBudgetLRUCache(max_bytes={self.max_bytes}, {self.stats()})"
@@ -0,0 +1,39 @@
+from IPython.display import clear_output
+from datetime import datetime
+import tracemalloc
+import time
+
+
+class CheckPerformance(object):
+    def __init__(self, count_total: int = None, clear_output: bool = False):
+        self.count_total = count_total
+        self.clear_output = clear_output
+        self.time = datetime.now()
+
+    def print_step(self, task: str, count: int):
+        delta = (datetime.now()-self.time).total_seconds()
+        if self.clear_output:
+            clear_output(wait=True)
+        if self.count_total:
+            print(f"{task}: {count}/{self.count_total} ({count/self.count_total*100:.1f}%) em {delta:.2f}s")
+        else:
+            print(f"{task}: {count} em {delta:.2f}s")
+
+    @staticmethod
+    def measure(func, *args, repeat: int = 1, trace_memory: bool = False, **kwargs):
+        """
+        Executa `func` `repeat` vezes e retorna (resultado da ultima execução, tempo medio em segundos, pico de memoria em bytes).
+        O pico de memória só é medido (e é None caso contrário) se `trace_memory` for verdadeiro, pois o tracemalloc deixa a execução mais lenta
+        """
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = None
+        for _ in range(repeat):
+            result = func(*args, **kwargs)
+        elapsed = (time.perf_counter()-start)/repeat
+        peak = None
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return result, elapsed, peak
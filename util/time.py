@@ -1,3 +1,6 @@
+from datetime import datetime
+
+
 class CheckTime(object):
     def __init__(self):
         self.time = datetime.now()
@@ -9,3 +12,6 @@ class CheckTime(object):
     def printDelta(self,task):
         delta = self.finishTime()
         print(task+" done in "+str(delta.total_seconds()))
+
+    def print_delta(self,task):
+        self.printDelta(task)